@@ -0,0 +1,232 @@
+"""Price alerts, evaluated by the market clock once per tick. Thresholds are
+kept per ticker in sorted lists, so a tick only bisects to the alerts whose
+threshold it crossed (cost follows the triggered alerts, not the watchers).
+
+Triggered alerts wait in the DB (status TRIGGERED) until /price_alerts or
+/stream drains them to DELIVERED, so web workers deliver what a clock in
+another process fired. The process that fired them also keeps them in memory,
+which saves the drain a ticker join."""
+import threading
+from bisect import bisect_left, bisect_right
+from decimal import Decimal
+
+from sqlalchemy import select, update
+
+from models import db, PriceAlert, Ticker
+from order_book import SYNC_LOOKBACK
+
+ABOVE = "ABOVE"
+BELOW = "BELOW"
+
+_MAX_ID = float("inf")
+
+
+def _cents(value) -> int:
+    return int((Decimal(value) * 100).to_integral_value())
+
+
+def threshold_for(direction: str, price: Decimal, pct: Decimal) -> Decimal:
+    """Absolute threshold for a % move away from `price`"""
+    factor = 1 + pct / 100 if direction == ABOVE else 1 - pct / 100
+    return (Decimal(price) * factor).quantize(Decimal("0.01"))
+
+
+class AlertEngine:
+    """ACTIVE alerts by ticker. The DB is the source of truth (alerts can be
+    deleted elsewhere), so whatever fires is re-checked before it's queued."""
+
+    def __init__(self, queue_size: int = 50, lookback: int = SYNC_LOOKBACK):
+        self.queue_size = queue_size
+        self.lookback = lookback
+        self._above = {}  # ticker_id -> sorted [(threshold cents, alert_id)]
+        self._below = {}
+        self._alerts = {}  # alert_id -> (user_id, ticker_id, direction, threshold cents)
+        self._last = {}  # ticker_id -> price cents at the previous tick
+        self._pending = {}  # user_id -> {alert_id: alert dict} fired here, not drained yet
+        self._last_seen_id = 0
+        self._lock = threading.Lock()
+        self.loaded = False
+
+    def __len__(self) -> int:
+        return len(self._alerts)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._above.clear()
+            self._below.clear()
+            self._alerts.clear()
+            self._last.clear()
+            self._pending.clear()
+            self._last_seen_id = 0
+            self.loaded = False
+
+    def load(self) -> None:
+        """Rebuild the thresholds from the DB (at startup). Keeps the last
+        prices and any pending alerts."""
+        with self._lock:
+            self._above.clear()
+            self._below.clear()
+            self._alerts.clear()
+            self._last_seen_id = 0
+        self.sync()
+        self.loaded = True
+
+    def sync(self) -> None:
+        """Pick up alerts created since the last sync (also by other processes),
+        re-scanning `lookback` ids below the highest seen like OrderBook.sync"""
+        since = max(0, self._last_seen_id - self.lookback)
+        rows = (
+            db.session.query(PriceAlert.id, PriceAlert.user_id, PriceAlert.ticker_id,
+                             PriceAlert.direction, PriceAlert.threshold)
+            .filter(PriceAlert.id > since, PriceAlert.status == "ACTIVE")
+            .order_by(PriceAlert.id)
+            .all()
+        )
+        for row in rows:
+            self.add(*row)
+
+    def add(self, alert_id: int, user_id: int, ticker_id: int, direction: str, threshold, price=None) -> None:
+        """`price` is the current price, so the very next tick can already cross"""
+        entry = (_cents(threshold), alert_id)
+        with self._lock:
+            self._last_seen_id = max(self._last_seen_id, alert_id)
+            if price is not None:
+                self._last.setdefault(ticker_id, _cents(price))
+            self._insert(alert_id, user_id, ticker_id, direction, entry[0])
+
+    def _insert(self, alert_id: int, user_id: int, ticker_id: int, direction: str, cents: int) -> None:
+        if alert_id in self._alerts:
+            return
+        side = self._above if direction == ABOVE else self._below
+        lst = side.setdefault(ticker_id, [])
+        entry = (cents, alert_id)
+        lst.insert(bisect_left(lst, entry), entry)
+        self._alerts[alert_id] = (user_id, ticker_id, direction, cents)
+
+    def remove(self, alert_ids) -> None:
+        with self._lock:
+            for alert_id in alert_ids:
+                found = self._alerts.pop(alert_id, None)
+                if found is None:
+                    continue
+                _, ticker_id, direction, cents = found
+                lst = (self._above if direction == ABOVE else self._below)[ticker_id]
+                lst.pop(bisect_left(lst, (cents, alert_id)))
+
+    def _crossed(self, snapshot):
+        """Pop every alert whose threshold was crossed since the last tick.
+        Returns [(alert_id, quote)], plus what _put_back needs to undo it:
+        the popped entries and the tickers' previous prices."""
+        fired, popped, prev_prices = [], {}, {}
+        with self._lock:
+            for ticker_id in self._above.keys() | self._below.keys():
+                quote = snapshot.by_id.get(ticker_id)
+                if quote is None:
+                    continue
+                now = _cents(quote.price)
+                prev = self._last.get(ticker_id)
+                self._last[ticker_id] = now
+                if prev is None or now == prev:
+                    continue
+                if now > prev:
+                    # prev < threshold <= now
+                    lst = self._above.get(ticker_id)
+                    lo, hi = (bisect_right(lst, (prev, _MAX_ID)), bisect_right(lst, (now, _MAX_ID))) if lst else (0, 0)
+                else:
+                    # now <= threshold < prev
+                    lst = self._below.get(ticker_id)
+                    lo, hi = (bisect_left(lst, (now, 0)), bisect_left(lst, (prev, 0))) if lst else (0, 0)
+                if lo == hi:
+                    continue
+                prev_prices[ticker_id] = prev
+                for _, alert_id in lst[lo:hi]:
+                    popped[alert_id] = self._alerts.pop(alert_id)
+                    fired.append((alert_id, quote))
+                del lst[lo:hi]
+        return fired, popped, prev_prices
+
+    def _put_back(self, popped: dict, prev_prices: dict) -> None:
+        """Undo _crossed when the trigger didn't commit (the alerts are still
+        ACTIVE in the DB): back in the lists, with the tickers' last prices
+        rewound so the next tick crosses them again"""
+        with self._lock:
+            self._last.update(prev_prices)
+            for alert_id, (user_id, ticker_id, direction, cents) in popped.items():
+                self._insert(alert_id, user_id, ticker_id, direction, cents)
+
+    def on_tick(self, snapshot) -> set:
+        """Fire crossed alerts: mark them TRIGGERED (one statement), which is
+        what drain delivers from. Returns the user ids that got something."""
+        fired, popped, prev_prices = self._crossed(snapshot)
+        if not fired:
+            return set()
+
+        try:
+            # deleted elsewhere since we loaded them? then they don't fire
+            alerts = {
+                a.id: a for a in
+                PriceAlert.query.filter(PriceAlert.id.in_([alert_id for alert_id, _ in fired]),
+                                        PriceAlert.status == "ACTIVE")
+            }
+            fired = [(alerts[alert_id], quote) for alert_id, quote in fired if alert_id in alerts]
+            if not fired:
+                return set()
+            items = [(alert.user_id, {
+                "id": alert.id,
+                "symbol": quote.symbol,
+                "price": float(quote.price),
+                "direction": "up" if alert.direction == ABOVE else "down",
+                "threshold": float(alert.threshold),
+            }) for alert, quote in fired]
+            db.session.execute(update(PriceAlert), [
+                {"id": alert.id, "status": "TRIGGERED", "triggered_price": quote.price}
+                for alert, quote in fired
+            ])
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            self._put_back(popped, prev_prices)
+            raise
+
+        with self._lock:
+            for user_id, item in items:
+                pending = self._pending.setdefault(user_id, {})
+                pending[item["id"]] = item
+                if len(pending) > self.queue_size:  # only a cache, drain falls back to the DB
+                    del pending[next(iter(pending))]
+        return {user_id for user_id, _ in items}
+
+    def drain(self, user_id: int) -> list:
+        """Triggered alerts for a user, oldest first, each handed out once
+        (across processes too: the TRIGGERED -> DELIVERED update decides).
+        With nothing waiting it's one read on ix_alert_user_status."""
+        waiting = db.session.scalars(
+            select(PriceAlert.id).where(PriceAlert.user_id == user_id, PriceAlert.status == "TRIGGERED")
+        ).all()
+        with self._lock:
+            pending = self._pending.pop(user_id, {})
+        if not waiting:
+            return []
+        claimed = set(db.session.scalars(
+            update(PriceAlert)
+            .where(PriceAlert.id.in_(waiting), PriceAlert.status == "TRIGGERED")
+            .values(status="DELIVERED")
+            .returning(PriceAlert.id)
+        ))
+        items = {alert_id: pending[alert_id] for alert_id in claimed if alert_id in pending}
+        missing = claimed - items.keys()
+        if missing:  # fired by another process
+            for alert_id, symbol, price, direction, threshold in db.session.execute(
+                    select(PriceAlert.id, Ticker.symbol, PriceAlert.triggered_price, PriceAlert.direction,
+                           PriceAlert.threshold)
+                    .join(Ticker, Ticker.id == PriceAlert.ticker_id)
+                    .where(PriceAlert.id.in_(missing))):
+                items[alert_id] = {
+                    "id": alert_id,
+                    "symbol": symbol,
+                    "price": float(price),
+                    "direction": "up" if direction == ABOVE else "down",
+                    "threshold": float(threshold),
+                }
+        db.session.commit()
+        return [items[alert_id] for alert_id in sorted(items)]
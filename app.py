@@ -1,47 +1,276 @@
-import base64
-from datetime import datetime, date
-from decimal import Decimal
+from collections import namedtuple
+from datetime import date
+from decimal import Decimal, InvalidOperation
+import os
 import random
+import time
+import zlib
 from functools import wraps
-import re
-import feedparser
-import io
-import matplotlib
-matplotlib.use("Agg")  # non-GUI backend
-import matplotlib.pyplot as plt
 
 # Our entire back end and DB stuff
-from flask import Flask, render_template, request, redirect, url_for, session, abort, render_template_string, make_response, send_file, flash
-from models import db, User, Ticker, Account, Order, Position, Trade, WatchlistItem, ScheduledTransaction
+from flask import Flask, render_template, request, redirect, url_for, session, abort, render_template_string, make_response, send_file, flash, Response, stream_with_context, g
+from werkzeug.local import LocalProxy
+import click
+from sqlalchemy import insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import contains_eager, joinedload
+from models import db, User, Ticker, Account, Order, Position, Trade, WatchlistItem, ScheduledTransaction, PriceAlert
+from market import MarketClock
+from pricing import PriceEngine
+from order_book import OrderBook
+from fills import execute_fills, with_retry, stats as fill_stats
+import events
+from scheduler import DailyJob
+from leaderboard import Leaderboard
+from pnl import compute_pnls
+from perf_series import update_series, catch_up_series, load_series, delete_series, chart_png_b64, chart_cache
+from news import NewsStore, NewsIngestor
+import migrations
+import storage
+from instrumentation import Instrumentation
+from fragments import FragmentCache
+from search import TickerSearch
+from provisioning import ImportJobs, ProvisioningError, provision, read_users
+from cohorts import Cohort, reset_cohort
+from alerts import AlertEngine, ABOVE, BELOW, threshold_for
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'dev-insecure-key'  # fine for this project, normally would do some security stuff
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///paper.db'
+# sqlite:///paper.db unless DATABASE_URL says otherwise (e.g. postgresql://...), see storage.py
+app.config['SQLALCHEMY_DATABASE_URI'] = storage.database_url()
+app.config['DB_POOL_SIZE'] = int(os.environ.get('DB_POOL_SIZE', 5))
+app.config['SQLITE_BUSY_TIMEOUT_MS'] = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000))
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-db.init_app(app)
-
-@app.before_request
-def ensure_db():
-    """Create tables on first request (simple dev setup)"""
-    with app.app_context():
-        db.create_all()
+app.config['MARKET_TICK_SECONDS'] = float(os.environ.get('MARKET_TICK_SECONDS', 5))
+# how prices move: walk / gbm / sector (see pricing.py), MARKET_SEED makes the path reproducible
+app.config['MARKET_MODEL'] = os.environ.get('MARKET_MODEL', 'walk')
+app.config['MARKET_SEED'] = int(os.environ['MARKET_SEED']) if os.environ.get('MARKET_SEED') else None
+app.config['STREAM_MAX_SECONDS'] = 300  # browsers reconnect on their own after this
+# trust the signed session cookie for identity instead of checking the DB on every request
+app.config['SESSION_IDENTITY'] = os.environ.get('SESSION_IDENTITY') == '1'
+app.config['LEADERBOARD_SIZE'] = 100
+# draw the performance chart in the browser from /performance.json instead of a PNG
+app.config['CLIENT_SIDE_CHART'] = os.environ.get('CLIENT_SIDE_CHART') == '1'
+app.config['NEWS_POLL_SECONDS'] = float(os.environ.get('NEWS_POLL_SECONDS', 300))
+app.config['NEWS_MAX_AGE'] = 60  # browser cache for /news/tiles
+app.config['FRAGMENT_CACHE_SIZE'] = 64  # rendered shared partials kept (a few per tick)
+app.config['SEARCH_LIMIT'] = 20  # results per search box query
+app.config['FEED_PAGE_SIZE'] = 50  # rows per page of /transactions and /open_orders
+# password hashing processes for /admin/users/import (None = one per core)
+app.config['PROVISION_WORKERS'] = int(os.environ['PROVISION_WORKERS']) if os.environ.get('PROVISION_WORKERS') else None
+# usernames allowed on the admin pages (/metrics), comma separated
+app.config['ADMIN_USERNAMES'] = {u.strip() for u in os.environ.get('ADMIN_USERNAMES', '').split(',') if u.strip()}
+# per-request query/render/CPU timing + /metrics, off unless asked for (see instrumentation.py)
+app.config['METRICS_ENABLED'] = os.environ.get('METRICS_ENABLED') == '1'
+app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN')  # lets a Prometheus scraper in without a login
+app.config['PROFILE_SLOW_MS'] = os.environ.get('PROFILE_SLOW_MS')  # dump stacks of requests slower than this
+storage.init_app(app, db)
+metrics = Instrumentation()
+metrics.init_app(app, db)
+
+# one clock per deployment, moves the prices (see market.py)
+market_clock = MarketClock(app, tick_seconds=app.config['MARKET_TICK_SECONDS'],
+                           engine=PriceEngine(app.config['MARKET_MODEL'], seed=app.config['MARKET_SEED']))
+# resting LMT orders by limit price, only used where the clock runs
+order_book = OrderBook()
+# wakes up the open /stream connections
+broker = events.Broker()
+# equity per user, kept up to date on fills / cash changes / ticks
+rankings = Leaderboard()
+# admin bulk imports running in the background, see provisioning.py
+import_jobs = ImportJobs()
+# shared partials (prices, order form), rendered once per clock version
+fragment_cache = FragmentCache(maxsize=app.config['FRAGMENT_CACHE_SIZE'])
+# symbol / company name index for the search box, top SEARCH_LIMIT results
+ticker_search = TickerSearch(market_clock, limit=app.config['SEARCH_LIMIT'])
+# price alert thresholds per ticker, checked on every tick
+alert_engine = AlertEngine()
+# RSS articles, filled by a background poller (see news.py)
+news_store = NewsStore()
+news_ingestor = NewsIngestor(news_store, interval=app.config['NEWS_POLL_SECONDS'])
+
+def current_user_id():
+    """Id of the logged in user, straight from the (signed) session. No DB."""
+    return session.get('user_id')
 
 def current_user():
-    """Get current User"""
-    uid = session.get('user_id')
+    """Get current User. Looked up once per request and cached on g."""
+    if 'current_user' not in g:
+        uid = current_user_id()
+        g.current_user = _load_user(uid) if uid else None
+    return g.current_user
+
+def _load_user(uid: int):
+    g.user_lookups = g.get('user_lookups', 0) + 1
+    # base.html shows user.account.cash on every page
+    return db.session.get(User, uid, options=[joinedload(User.account)])
+
+def forget_current_user() -> None:
+    """Drop the cached User (e.g. after db.session.remove() in a stream)"""
+    g.pop('current_user', None)
+
+def remember_identity(user: User) -> None:
+    """Put who is logged in into the session cookie"""
+    session['user_id'] = user.id
+    session['username'] = user.username
+    session['watchlist_name'] = user.watchlist_name
+
+SessionUser = namedtuple('SessionUser', 'id username watchlist_name')
+
+def session_user():
+    """Identity from the session cookie only (id, username, watchlist name),
+    for fragments that don't need anything else off the User row"""
+    uid = current_user_id()
     if not uid:
         return None
-    return User.query.get(uid)
+    if 'watchlist_name' not in session:  # cookie from before it was stored there
+        remember_identity(current_user())
+    return SessionUser(uid, session.get('username'), session.get('watchlist_name'))
 
 def login_required(fn):
-    """Login is requied to use this function, if not then send back to login page"""
+    """Login is requied to use this function, if not then send back to login page.
+       With SESSION_IDENTITY on, the signed session is enough (no User lookup)."""
     @wraps(fn)
     def wrapper(*args, **kwargs):
-        if not current_user():
+        if app.config['SESSION_IDENTITY']:
+            ok = current_user_id() is not None
+        else:
+            ok = current_user() is not None
+        if not ok:
             return redirect(url_for('login'))
         return fn(*args, **kwargs)
     return wrapper
 
+def is_admin() -> bool:
+    return session.get('username') in app.config['ADMIN_USERNAMES']
+
+def admin_required(fn):
+    """login_required, plus the user has to be in ADMIN_USERNAMES (403 if not)"""
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        if current_user_id() is None:
+            return redirect(url_for('login'))
+        if not is_admin():
+            abort(403)
+        return fn(*args, **kwargs)
+    return wrapper
+
+@app.after_request
+def report_user_lookups(response):
+    """Debug only: how many times this request loaded the User row"""
+    if app.debug:
+        lookups = g.get('user_lookups', 0)
+        response.headers['X-User-Lookups'] = str(lookups)
+        app.logger.debug("%s %s: %d User lookups", request.method, request.path, lookups)
+    return response
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus text format. Admins, or a scraper sending METRICS_TOKEN."""
+    if not metrics.enabled:
+        abort(404)
+    token = app.config['METRICS_TOKEN']
+    if not (token and request.headers.get('Authorization') == f'Bearer {token}'):
+        if current_user_id() is None:
+            return redirect(url_for('login'))
+        if not is_admin():
+            abort(403)
+
+    extra = [
+        ('papertrader_fills_total', 'counter', 'Orders filled by the fill engine', fill_stats.filled),
+        ('papertrader_fills_cancelled_total', 'counter', 'BUYs cancelled for lack of cash', fill_stats.cancelled),
+        ('papertrader_fill_batches_total', 'counter', 'Fill batches committed', fill_stats.batches),
+        ('papertrader_fill_seconds_total', 'counter', 'Time spent in the fill engine', fill_stats.seconds),
+        ('papertrader_fill_batch_fills_per_second', 'gauge', 'Fills/sec of the last fill batch',
+         fill_stats.last.fills_per_sec if fill_stats.last else 0.0),
+        ('papertrader_stream_subscribers', 'gauge', 'Open /stream connections', broker.subscriber_count()),
+        ('papertrader_market_version', 'gauge', 'Market clock snapshot version',
+         market_clock.snapshot().version),
+        ('papertrader_fragment_cache_hits_total', 'counter', 'Shared partials served from cache',
+         fragment_cache.hits),
+        ('papertrader_fragment_cache_misses_total', 'counter', 'Shared partials rendered', fragment_cache.misses),
+    ]
+    return Response(metrics.prometheus(extra), mimetype='text/plain; version=0.0.4')
+
+@app.route('/admin/users/import', methods=['POST'])
+@admin_required
+def import_users():
+    """Bulk-create users from an uploaded CSV/JSON file (field "file") or a
+    JSON body, see provisioning.py. Existing usernames are skipped. Answers
+    202 right away, poll the status_url for progress."""
+    upload = request.files.get('file')
+    try:
+        if upload is not None:
+            users = read_users(upload.read())
+        else:
+            users = read_users(request.get_data(), fmt='json')
+    except ProvisioningError as exc:
+        return {'error': str(exc)}, 400
+
+    def add_to_rankings(report):
+        for user_id, username, cash in report.created:
+            rankings.add_user(user_id, username, cash)
+
+    # hashing thousands of passwords takes minutes: run it in the background
+    job = import_jobs.start(app, users, workers=app.config['PROVISION_WORKERS'], on_done=add_to_rankings)
+    status_url = url_for('import_status', job_id=job.id)
+    return {**job.to_dict(), 'status_url': status_url}, 202, {'Location': status_url}
+
+@app.route('/admin/users/import/<job_id>')
+@admin_required
+def import_status(job_id):
+    """Progress / result of an import started above (this process only)"""
+    job = import_jobs.get(job_id)
+    if job is None:
+        abort(404)
+    return job.to_dict()
+
+def after_cohort_reset(user_ids=None, cash=Decimal('100000.00')) -> None:
+    """After a cohort reset: bring this process's in-memory state in line
+    (None = everyone) and tell the open streams"""
+    rankings.reset_users(user_ids, cash)
+    if order_book.loaded:
+        order_book.load()
+    if user_ids is None:
+        chart_cache.clear()
+    else:
+        chart_cache.invalidate(user_ids)
+    broker.publish(events.ACCOUNT, user_ids)
+
+def _cohort_from(params) -> Cohort:
+    usernames = params.get('usernames') or ()
+    if isinstance(usernames, str):
+        usernames = [u.strip() for u in usernames.split(',') if u.strip()]
+    return Cohort(usernames=tuple(usernames), username_prefix=params.get('prefix') or None)
+
+@app.route('/admin/reset', methods=['POST'])
+@admin_required
+def admin_reset():
+    """Portfolio reset for a cohort: "usernames" (list or comma separated)
+    and/or a username "prefix", or scope=all for everyone. "archive" (a label)
+    keeps a copy of what gets deleted, "cash" overrides the starting cash.
+    Form fields or a JSON body."""
+    params = request.get_json(silent=True) or request.form
+    cohort = _cohort_from(params)
+    if cohort.everyone and params.get('scope') != 'all':
+        return {'error': 'pick a cohort (usernames / prefix) or scope=all'}, 400
+    try:
+        cash = Decimal(str(params.get('cash') or '100000.00')).quantize(Decimal('0.01'))
+    except InvalidOperation:
+        return {'error': f"bad cash {params.get('cash')!r}"}, 400
+    label = (params.get('archive') or '').strip()[:64] or None
+
+    report = reset_cohort(cohort, cash, archive_label=label)
+    after_cohort_reset(report.user_ids, cash)
+    return {
+        'accounts': report.accounts,
+        'orders': report.orders,
+        'trades': report.trades,
+        'positions': report.positions,
+        'archive': label,
+        'seconds': round(report.seconds, 3),
+    }
+
 # -------- Auth --------
 
 @app.route('/signup', methods=['GET', 'POST'])
@@ -58,13 +287,14 @@ def signup():
         user = User(username=username)
         user.set_password(password) 
         db.session.add(user)
-        db.session.commit()
+        db.session.flush()  # user.id for the account, both go in one commit
 
         # starting cash
         db.session.add(Account(user_id=user.id, cash=Decimal('100000.00')))
         db.session.commit()
+        rankings.add_user(user.id, user.username)
 
-        session['user_id'] = user.id
+        remember_identity(user)
         return redirect(url_for('dashboard'))
 
     return render_template('login.html', mode='signup')
@@ -82,7 +312,7 @@ def login():
         if not user or not user.check_password(password):
             return render_template('login.html', error='Invalid credentials')
 
-        session['user_id'] = user.id
+        remember_identity(user)
         return redirect(url_for('dashboard'))
 
     # GET
@@ -95,56 +325,322 @@ def logout():
     return redirect(url_for('login'))
 
 # -------- Ticker sync ------------------
-def _tick_prices():
-    """This is the random walk in the change of the ticker price.
-       We use this because using the stock market would have been not so fun
-       for grading purposes."""
-    # Random walk and update DM
-    for t in Ticker.query.all():
-        drift = Decimal(random.randrange(-50, 51)) / Decimal('100')  # -0.50..+0.50
-        t.price = max(Decimal('1.00'), (t.price + drift).quantize(Decimal('0.01')))
-    db.session.commit()
-
-    # IF LIMIT ORDER, CHECK IF WE CAN EXECUTE NOW
-    open_orders = Order.query.filter_by(status="PENDING", order_type="LMT").all()
-    for order in open_orders:
-        ticker = Ticker.query.get(order.ticker_id)
-        current_price = ticker.price
+@market_clock.on_tick
+def _match_limit_orders(snapshot):
+    """Runs after every market clock tick.
+       IF LIMIT ORDER, CHECK IF WE CAN EXECUTE NOW. The order book hands back
+       only the orders whose limit this tick crossed."""
+    if not order_book.loaded:
+        order_book.load()
+    else:
+        order_book.sync()
+
+    crossed = []
+    for quote in snapshot.tickers:
+        crossed.extend(order_book.pop_crossed(quote.id, quote.price))
+    if not crossed:
+        return
 
-        if order.side == "BUY" and current_price <= order.limit_price:
-            acct = Account.query.filter_by(user_id=order.user_id).first()
-            execute_order(order, current_price, acct)
+    def fill_crossed():
+        # book entries can be stale (reset/cancelled elsewhere), so re-check status
+        orders = (
+            Order.query
+            .filter(Order.id.in_(crossed), Order.status == "PENDING")
+            .order_by(Order.id)
+            .all()
+        )
+        return execute_fills([(order, snapshot.by_id[order.ticker_id].price) for order in orders])
 
-        elif order.side == "SELL" and current_price >= order.limit_price:
-            acct = Account.query.filter_by(user_id=order.user_id).first()
-            execute_order(order, current_price, acct)
+    try:
+        report = with_retry(fill_crossed)
+    except Exception:
+        # still PENDING in the DB, so they have to go back in the book or they never fill
+        db.session.rollback()
+        order_book.restore(crossed)
+        raise
+    _after_fills(report)
+    broker.publish(events.ACCOUNT, report.cash.keys())
+
+
+@market_clock.on_tick
+def _mark_leaderboard(snapshot):
+    """Re-mark holdings at the new prices (one multiply per holder)"""
+    rankings.apply_prices({q.id: q.price for q in snapshot.tickers})
+
+
+@market_clock.on_tick
+def _fire_price_alerts(snapshot):
+    """Only the alerts whose threshold this tick crossed are looked at"""
+    if not alert_engine.loaded:
+        alert_engine.load()
+    else:
+        alert_engine.sync()
+    user_ids = alert_engine.on_tick(snapshot)
+    if user_ids:
+        broker.publish(events.ALERTS, user_ids)
+
+
+def _after_fills(report) -> None:
+    """Keep the leaderboard and the PnL chart series in step with a batch of fills"""
+    for user_id, cash in report.cash.items():
+        rankings.set_cash(user_id, cash)
+    for (user_id, ticker_id), qty in report.positions.items():
+        rankings.set_position(user_id, ticker_id, qty)
+    if report.filled:
+        update_series(report.cash.keys())
+
+
+@market_clock.on_tick
+def _push_prices(snapshot):
+    """Let every open stream know the prices moved"""
+    broker.publish(events.PRICES)
+
+
+@app.cli.command('market-clock')
+def run_market_clock():
+    """Run the market clock in its own process (use this when serving with
+    several workers so the market only moves once per tick)."""
+    init_db()
+    market_clock.start()
+    try:
+        while market_clock.running:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        market_clock.stop()
 
 
 @app.route('/dash_tick')
 @login_required
 def dash_tick():
     """Meant for synchronizing the price mnovement in the UI.
-       may be used in other places too."""
-    user = current_user()
-    # move prices exactly once per tick
-    _tick_prices()
-
-    # render both fragments and send them OOB
-    prices_html = render_template('_prices.html', 
-                                  tickers=Ticker.query.order_by(Ticker.symbol).all())
-    # reuse existing builder for watchlist content
-    watchlist_html = watchlist_partial()  # returns the <table> HTML
-
-    # wrap each with the correct target id + hx-swap-oob
-    combined = f'''
-      <div id="prices" hx-swap-oob="innerHTML">
-        {prices_html}
-      </div>
-      <div id="watchlist" hx-swap-oob="innerHTML">
-        {watchlist_html}
-      </div>
-    '''
-    return combined
+       Only reads the market clock snapshot, prices move in the clock.
+
+       Clients that send back the `since` / `watch` values of the last
+       #tick-version marker only get the price and watchlist cells that
+       changed since then; everyone else gets both fragments in full."""
+    snapshot = market_clock.snapshot()
+    since = request.args.get('since')
+    items = WatchlistItem.query.filter_by(user_id=current_user_id()).all()
+    watch = watchlist_signature(items)
+
+    changed = tick_changes(since, snapshot)
+    prices_delta = None
+    if changed is not None and request.args.get('watch') == watch:
+        prices_delta = price_cells_delta(changed, snapshot, since)
+    if prices_delta is not None:
+        combined = prices_delta + watchlist_delta(changed, items)
+    else:
+        # render both fragments and send them OOB (the price table once per tick for everyone)
+        prices_html = prices_fragment(snapshot)
+        # reuse existing builder for watchlist content
+        watchlist_html = watchlist_partial(items)  # returns the <table> HTML
+
+        # wrap each with the correct target id + hx-swap-oob
+        combined = f'''
+          <div id="prices" hx-swap-oob="innerHTML">
+            {prices_html}
+          </div>
+          <div id="watchlist" hx-swap-oob="innerHTML">
+            {watchlist_html}
+          </div>
+        '''
+    token = market_clock.version_token(snapshot)
+    combined += f'<span id="tick-version" data-since="{token}" data-watch="{watch}" hx-swap-oob="true"></span>'
+
+    resp = make_response(combined)
+    resp.headers['Cache-Control'] = 'private, no-cache'
+    # same tick + same watchlist = same bytes, so a re-poll can be answered with a 304
+    resp.set_etag(f"tick-{snapshot.version}-{zlib.crc32(combined.encode()):08x}")
+    return resp.make_conditional(request)
+
+
+def prices_fragment(snapshot) -> str:
+    return fragment_cache.render('_prices.html', snapshot.version, tickers=snapshot.tickers)
+
+
+def tick_changes(since, snapshot):
+    """Ticker ids that moved since the `since` token, or None when the client
+    needs everything again (unknown / too old token, tickers added or removed)"""
+    return market_clock.changes_since(since) if since else None
+
+
+def price_cells_delta(changed, snapshot, since):
+    """OOB price cells for just the changed tickers, rendered once per (since,
+    version). None when the full table would be smaller, which can only
+    happen once most of it moved. The default random walk moves ~all prices
+    every tick, the cells still beat whole rows there."""
+    if not changed:
+        return ''
+    html = fragment_cache.render('_price_cells_oob.html', snapshot.version, variant=since,
+                                 tickers=[q for q in snapshot.tickers if q.id in changed])
+    if len(changed) * 2 > len(snapshot.tickers) and len(html) >= len(prices_fragment(snapshot)):
+        return None
+    return html
+
+
+def watchlist_delta(changed, items) -> str:
+    """OOB price cells for the watchlist items whose ticker moved"""
+    quotes = market_clock.quotes(item.symbol for item in items)
+    cells = [(item, quotes[item.symbol]) for item in items
+             if item.symbol in quotes and quotes[item.symbol].id in changed]
+    return render_template('_watch_prices_oob.html', cells=cells) if cells else ''
+
+
+def watchlist_signature(items) -> str:
+    """Changes when items are added or removed (deltas only patch cells)"""
+    return f"{zlib.crc32(','.join(str(item.id) for item in items).encode()):08x}"
+
+
+@app.route('/prices')
+@login_required
+def prices_partial():
+    """Just the price table, with an ETag of its content"""
+    html = prices_fragment(market_clock.snapshot())
+    resp = make_response(html)
+    resp.headers['Cache-Control'] = 'private, no-cache'
+    resp.set_etag(fragment_cache.etag('_prices.html', html))
+    return resp.make_conditional(request)
+
+# -------- Live updates (SSE) --------
+
+# which fragments each page gets re-rendered when a topic fires
+# ACCOUNT and ALERTS are only published in-process. When the clock runs in its
+# own process (flask market-clock) limit fills and triggered alerts only show up
+# here as a PRICES tick, so the fragments they change are re-checked on every
+# tick too (and only sent if the html changed / there are alerts)
+STREAM_PAGES = {
+    'dashboard': {
+        events.PRICES: ('prices', 'watchlist', 'positions', 'cash-balance', 'alerts'),
+        events.ACCOUNT: ('positions', 'cash-balance'),
+        events.ALERTS: ('alerts',),
+    },
+    'portfolio': {
+        events.PRICES: ('positions', 'open-orders', 'transactions-table', 'cash-balance'),
+        events.ACCOUNT: ('positions', 'open-orders', 'transactions-table', 'cash-balance'),
+    },
+}
+
+
+def _render_fragment(name: str) -> str:
+    """Render one live fragment, already wrapped for an OOB swap"""
+    if name == 'prices':
+        html = prices_fragment(market_clock.snapshot())
+    elif name == 'watchlist':
+        html = watchlist_partial()
+    elif name == 'positions':
+        html = positions_partial()
+    elif name == 'open-orders':
+        html = open_orders_partial()
+    elif name == 'transactions-table':
+        html = transactions_table(current_user_id())[0]
+    elif name == 'alerts':
+        return price_alerts()  # has its own hx-swap-oob="beforeend" wrapper
+    elif name == 'cash-balance':
+        return render_template('_cash_balance_oob.html', user=current_user())
+    else:
+        raise KeyError(name)
+    return f'<div id="{name}" hx-swap-oob="innerHTML">{html}</div>'
+
+
+def _sse_message(html: str) -> str:
+    # every line of the payload needs its own data: prefix
+    return ''.join(f'data: {line}\n' for line in html.splitlines()) + '\n'
+
+
+@app.route('/stream')
+@login_required
+def stream():
+    """Server-Sent Events channel for the dashboard / portfolio.
+       Replaces the htmx polling: fragments are only sent when the clock ticks
+       or this user's orders/positions/alerts change, and only if the html
+       actually differs from what this connection last sent."""
+    page = STREAM_PAGES.get(request.args.get('page', 'dashboard'))
+    if page is None:
+        abort(400)
+    user_id = current_user_id()
+    q = broker.subscribe(user_id)
+
+    def generate():
+        sent = {}  # fragment -> html last sent on this connection
+        version = None
+        token = None  # market version the client's price / watchlist cells are at
+        watch = None  # and the watchlist items they were rendered for
+        newest_trade = None  # top row of the client's transactions table
+        deadline = time.monotonic() + app.config['STREAM_MAX_SECONDS']
+        topics = set(page)  # first message renders everything
+        try:
+            while time.monotonic() < deadline:
+                # the clock may live in another process, so check the version too
+                snap_version = market_clock.snapshot().version
+                if snap_version != version:
+                    version = snap_version
+                    topics.add(events.PRICES)
+
+                names = []
+                for topic in topics:
+                    names.extend(n for n in page.get(topic, ()) if n not in names)
+
+                # once the client has the full tables, only patch the rows that moved
+                delta = {}
+                if 'prices' in names or 'watchlist' in names:
+                    snapshot = market_clock.snapshot()
+                    items = WatchlistItem.query.filter_by(user_id=user_id).all()
+                    changed = tick_changes(token, snapshot)
+                    if changed is not None:
+                        prices_delta = price_cells_delta(changed, snapshot, token)
+                        if prices_delta is not None:
+                            delta['prices'] = prices_delta
+                        if watchlist_signature(items) == watch:
+                            delta['watchlist'] = watchlist_delta(changed, items)
+                    for name, html in delta.items():
+                        if html:
+                            sent.pop(name, None)  # the full table no longer matches the page
+                    token = market_clock.version_token(snapshot)
+                    watch = watchlist_signature(items)
+                # trades are append-only, so after the first page just prepend the new ones
+                if 'transactions-table' in names:
+                    trades = trades_since(user_id, newest_trade) if newest_trade is not None else None
+                    if trades is None:
+                        html, newest_trade = transactions_table(user_id)
+                        html = f'<div id="transactions-table" hx-swap-oob="innerHTML">{html}</div>'
+                        delta['transactions-table'] = '' if sent.get('transactions-table') == html else html
+                        sent['transactions-table'] = html
+                    elif trades:
+                        newest_trade = trades[0].id
+                        sent.pop('transactions-table', None)
+                        rows = render_template('_transaction_rows.html', trades=trades)
+                        delta['transactions-table'] = f'<tbody id="transactions-rows" hx-swap-oob="afterbegin">{rows}</tbody>'
+                    else:
+                        delta['transactions-table'] = ''
+
+                parts = []
+                for name in names:
+                    if name in delta:
+                        if delta[name]:
+                            parts.append(delta[name])
+                        continue
+                    html = _render_fragment(name)
+                    if name == 'alerts':
+                        if html.strip():  # drained: new every time, or nothing at all
+                            parts.append(html)
+                        continue
+                    if sent.get(name) == html:
+                        continue
+                    sent[name] = html
+                    parts.append(html)
+                db.session.remove()  # don't sit on a connection between events
+                forget_current_user()
+
+                yield _sse_message(''.join(parts)) if parts else ': keepalive\n\n'
+                topics = events.wait_for_topics(q, timeout=market_clock.tick_seconds)
+        finally:
+            broker.unsubscribe(user_id, q)
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
 
 # -------- App pages / fragments --------
 
@@ -170,11 +666,11 @@ def dashboard():
             price = Decimal(random.randrange(80, 250))
             db.session.add(Ticker(symbol=symbol, name=name, price=price))
         db.session.commit()
+        market_clock.refresh()
 
     user = current_user()
-    positions = Position.query.filter_by(user_id=user.id).join(Ticker).all()
-    tickers = Ticker.query.order_by(Ticker.symbol).all()
-    return render_template('dashboard.html', tickers=tickers, positions=positions)
+    positions = positions_with_tickers(user.id)
+    return render_template('dashboard.html', tickers=market_clock.snapshot().tickers, positions=positions)
 
 
 @app.route('/search')
@@ -185,34 +681,47 @@ def search_stocks():
     if not query:
         return render_template('_search_results.html', tickers=[], query='')
     
-    # Search by symbol or name
-    tickers = Ticker.query.filter(
-        (Ticker.symbol.like(f'%{query}%')) | 
-        (Ticker.name.like(f'%{query}%'))
-    ).order_by(Ticker.symbol).all()
-    
+    # ranked symbol / name-word matches from the in-memory index (see search.py)
+    tickers = ticker_search.search(query)
+
     return render_template('_search_results.html', tickers=tickers, query=query)
 
 @app.route('/positions')
 @login_required
 def positions_partial():
     """Gets our current positions"""
-    user = current_user()
-    positions = Position.query.filter_by(user_id=user.id).join(Ticker).all()
+    positions = positions_with_tickers(current_user_id())
     return render_template('_positions.html', positions=positions)
 
+
+def positions_with_tickers(user_id):
+    """A user's positions with pos.ticker filled in by the same query"""
+    return (
+        Position.query
+        .filter_by(user_id=user_id)
+        .join(Position.ticker)
+        .options(contains_eager(Position.ticker))
+        .all()
+    )
+
 @app.route('/open_orders')
 @login_required
 def open_orders_partial():
-    """Gets our Open Orders"""
-    user = current_user()
-    orders = (
+    """Gets our Open Orders, newest first, FEED_PAGE_SIZE at a time.
+       ?before=<order id> returns just the next page's rows (for "Load more")."""
+    user_id = current_user_id()
+    before = request.args.get('before', type=int)
+    size = app.config['FEED_PAGE_SIZE']
+    query = (
         Order.query
-        .filter_by(user_id=user.id, status='PENDING')
-        .order_by(Order.id.desc())
-        .all()
+        .filter_by(user_id=user_id, status='PENDING')
+        .options(joinedload(Order.ticker))
     )
-    return render_template('_open_orders.html', orders=orders)
+    if before is not None:
+        query = query.filter(Order.id < before)
+    orders, next_before = _page(query.order_by(Order.id.desc()), size)
+    template = '_open_order_rows.html' if before is not None else '_open_orders.html'
+    return render_template(template, orders=orders, next_before=next_before)
 
 @app.route('/reset', methods=['POST'])
 @login_required
@@ -220,18 +729,24 @@ def reset_portfolio():
     '''Allows us to reset the portfolio to a default amount'''
     user = current_user()
 
-    # Delete all positions and trades for the user
-    Position.query.filter_by(user_id=user.id).delete()
-    Trade.query.filter(Trade.order_id.in_(db.session.query(Order.id).filter_by(user_id=user.id))).delete()
-    Order.query.filter_by(user_id=user.id).delete()
+    def reset():
+        # Delete all positions and trades for the user
+        order_book.discard(order_id for (order_id,) in db.session.query(Order.id).filter_by(user_id=user.id))
+        Position.query.filter_by(user_id=user.id).delete()
+        Trade.query.filter(Trade.order_id.in_(db.session.query(Order.id).filter_by(user_id=user.id))).delete()
+        Order.query.filter_by(user_id=user.id).delete()
+        delete_series([user.id])
 
+        #Reset account balance to 100000.0
+        account = Account.query.filter_by(user_id=user.id).first()
+        if account:
+            account.cash = Decimal('100000.00')
 
-    #Reset account balance to 100000.0
-    account = Account.query.filter_by(user_id=user.id).first()
-    if account:
-        account.cash = Decimal('100000.00')
+        db.session.commit()
 
-    db.session.commit()
+    with_retry(reset)
+    rankings.reset_user(user.id)
+    broker.publish(events.ACCOUNT, [user.id])
     return redirect(url_for('dashboard'))
 
 @app.route('/portfolio', methods=['GET', 'POST'])
@@ -239,13 +754,7 @@ def reset_portfolio():
 def portfolio():
     '''Gets our entire portfolio'''
     user = current_user()
-    positions = (
-        Position.query
-        .filter_by(user_id=user.id)
-        .join(Ticker)
-        .all()
-    )
-    return render_template('portfolio.html', positions=positions)
+    return render_template('portfolio.html', positions=positions_with_tickers(user.id))
 
 @app.route('/order', methods=['POST'])
 @login_required
@@ -269,7 +778,8 @@ def place_order():
         abort(400)
 
     # Error not found
-    ticker = Ticker.query.filter_by(symbol=symbol).first()
+    quote = market_clock.quotes([symbol]).get(symbol)
+    ticker = db.session.get(Ticker, quote.id) if quote else None  # fill at the DB price
     if not ticker:
         abort(400)
 
@@ -281,89 +791,107 @@ def place_order():
             # Error not found
             abort(400)
 
-    order = Order(
-        user_id=user.id,
-        ticker_id=ticker.id,
-        side=side,
-        order_type=order_type,
-        qty=qty,
-        status='PENDING',
-        limit_price=limit_price
-    )
-    db.session.add(order)
-    db.session.commit()
-
-    # with_for_update is a no-op on SQLite (fine for demo)
-    acct = Account.query.filter_by(user_id=user.id).with_for_update().first()
-    price = ticker.price
-    should_fill = False
-    if order_type == 'MKT':
-        should_fill = True
-    elif order_type == 'LMT' and limit_price is not None:
-        if side == 'BUY' and price <= limit_price:
-            should_fill = True
-        if side == 'SELL' and price >= limit_price:
+    def place():
+        """Insert the order and fill it (if it can) in one transaction"""
+        order = Order(
+            user_id=user.id,
+            ticker_id=ticker.id,
+            side=side,
+            order_type=order_type,
+            qty=qty,
+            status='PENDING',
+            limit_price=limit_price
+        )
+        db.session.add(order)
+
+        price = ticker.price
+        should_fill = False
+        if order_type == 'MKT':
             should_fill = True
+        elif order_type == 'LMT' and limit_price is not None:
+            if side == 'BUY' and price <= limit_price:
+                should_fill = True
+            if side == 'SELL' and price >= limit_price:
+                should_fill = True
 
-    if should_fill:
-        execute_order(order, price, acct)
+        if not should_fill:
+            db.session.commit()
+            return order, None
+        db.session.flush()  # the Trade needs order.id
+        return order, execute_fills([(order, price)])
+
+    order, report = with_retry(place)
+    if report is not None:
+        _after_fills(report)
+    elif order_type == 'LMT':
+        order_book.add(order.id, ticker.id, side, limit_price)
+    broker.publish(events.ACCOUNT, [user.id])
 
     # return a fresh form fragment
-    order_form_html = render_template('_order_form.html',
-                                  tickers=Ticker.query.order_by(Ticker.symbol).all(),
-                                  success=True)
+    snapshot = market_clock.snapshot()
+    order_form_html = fragment_cache.render('_order_form.html', snapshot.version, variant='success',
+                                            tickers=snapshot.tickers, success=True)
     cash_html = render_template('_cash_balance_oob.html', user=user)
     return order_form_html + cash_html
 
-def execute_order(order: Order, price: Decimal, account: Account) -> None:
-    """Execute an Order that has been placed"""
-    # record trade
-    db.session.add(Trade(order_id=order.id, price=price, qty=order.qty))
-
-    pos = Position.query.filter_by(user_id=order.user_id, ticker_id=order.ticker_id).first()
-    if not pos:
-        pos = Position(user_id=order.user_id, ticker_id=order.ticker_id, qty=0, avg_price=Decimal('0'))
-        db.session.add(pos)
-
-    if order.side == 'BUY':
-        cost = (price * order.qty).quantize(Decimal('0.01'))
-        if account.cash < cost:
-            order.status = 'CANCELLED'
-            db.session.commit()
-            return
-        new_qty = pos.qty + order.qty
-        if new_qty <= 0:
-            pos.qty = 0
-            pos.avg_price = Decimal('0.00')
-        else:
-            pos.avg_price = ((Decimal(pos.qty) * pos.avg_price) + (Decimal(order.qty) * price)) / Decimal(new_qty)
-            pos.qty = new_qty
-        account.cash = (account.cash - cost).quantize(Decimal('0.01'))
-    else:  # SELL (no shorting)
-        sell_qty = min(pos.qty, order.qty)  # can't sell more than you hold
-        proceeds = (price * sell_qty).quantize(Decimal('0.01'))
-
-        new_qty = pos.qty - sell_qty
-        if new_qty <= 0:
-            # remove the row so it won't show up in the positions list
-            db.session.delete(pos)
-        else:
-            pos.qty = new_qty
-            # avg price unchanged when partially selling
+@app.route('/transactions', methods=['GET', 'POST'])
+@login_required
+def transactions_partial():
+    '''Get transactions, newest first, FEED_PAGE_SIZE at a time.
+       ?before=<trade id>: just the next page's rows (for "Load more").
+       ?after=<trade id>: just the rows newer than that, to prepend to
+       #transactions-rows; the whole table instead if that can't be done.'''
+    user_id = current_user_id()
+    before = request.args.get('before', type=int)
+    after = request.args.get('after', type=int)
+
+    if after is not None:
+        trades = trades_since(user_id, after)
+        if trades is not None:
+            return render_template('_transaction_rows.html', trades=trades)
+        resp = make_response(transactions_table(user_id)[0])
+        resp.headers['HX-Retarget'] = '#transactions-table'
+        resp.headers['HX-Reswap'] = 'innerHTML'
+        return resp
+    if before is not None:
+        trades, next_before = _page(_trades_query(user_id).filter(Trade.id < before), app.config['FEED_PAGE_SIZE'])
+        return render_template('_transaction_rows.html', trades=trades, next_before=next_before)
+    return transactions_table(user_id)[0]
+
+
+def _page(query, size):
+    """(first `size` rows, id to continue from or None) for an id-desc query"""
+    rows = query.limit(size + 1).all()
+    return rows[:size], (rows[size - 1].id if len(rows) > size else None)
+
+
+def _trades_query(user_id):
+    # the join doubles as the eager load of trade.order, plus order.ticker
+    return (
+        Trade.query
+        .join(Trade.order)
+        .filter(Order.user_id == user_id)
+        .options(contains_eager(Trade.order).joinedload(Order.ticker))
+        .order_by(Trade.id.desc())
+    )
 
-        account.cash = (account.cash + proceeds).quantize(Decimal('0.01'))
 
+def transactions_table(user_id):
+    """(the table with the newest page of trades, id of the newest trade or None)"""
+    trades, next_before = _page(_trades_query(user_id), app.config['FEED_PAGE_SIZE'])
+    html = render_template('_transactions.html', trades=trades, next_before=next_before)
+    return html, (trades[0].id if trades else None)
 
-    order.status = 'FILLED'
-    db.session.commit()
 
-@app.route('/transactions', methods=['GET', 'POST'])
-@login_required
-def transactions_partial():
-    '''Get transactions'''
-    user = current_user()
-    trades = Trade.query.join(Order).filter(Order.user_id == user.id).order_by(Trade.id.desc()).all()
-    return render_template('_transactions.html', trades=trades)
+def trades_since(user_id, newest: int):
+    """Trades newer than `newest`, or None when the client's table can't just
+    be prepended to: `newest` is gone (portfolio reset) or more than a page
+    came in since."""
+    size = app.config['FEED_PAGE_SIZE']
+    rows = _trades_query(user_id).filter(Trade.id >= newest).limit(size + 2).all()
+    if not rows or rows[-1].id != newest or len(rows) > size + 1:
+        return None
+    return rows[:-1]
 
 
 @app.route('/watchlist', methods=['GET', 'POST'])
@@ -373,104 +901,67 @@ def watchlist():
     user = current_user()
 
     if request.method == 'POST':
-        symbol = (request.form.get('symbol') or '').strip().upper()
-        if symbol:
-            alreadyWatched = WatchlistItem.query.filter_by(user_id=user.id, symbol=symbol).first()
-            if not alreadyWatched:
-                newWatched = WatchlistItem(user_id=user.id, symbol=symbol)
-                db.session.add(newWatched)
-                db.session.commit()
+        add_to_watchlist(user.id, request.form.get('symbol'))
         if request.headers.get('HX-Request'):
             return watchlist_partial()
 
     items = WatchlistItem.query.filter_by(user_id=user.id).all()
+    quotes = market_clock.quotes(item.symbol for item in items)
     prices = {}
     for item in items:
-        ticker = Ticker.query.filter_by(symbol=item.symbol).first()
-        if ticker:
-            prices[item.symbol] = ticker.price
-        else:
-            prices[item.symbol] = 'N/A'
+        quote = quotes.get(item.symbol)
+        prices[item.symbol] = quote.price if quote else 'N/A'
+
+    alerts = (
+        PriceAlert.query
+        .filter_by(user_id=user.id, status="ACTIVE")
+        .join(PriceAlert.ticker)
+        .options(contains_eager(PriceAlert.ticker))
+        .all()
+    )
+    return render_template('watchlist.html', user=user, items=items, prices=prices, alerts=alerts)
 
-    return render_template('watchlist.html', user=user, items=items, prices=prices)
+def add_to_watchlist(user_id: int, symbol) -> None:
+    """Watch a symbol once. Listed tickers are unique per user in the DB
+    (uix_watch_user_ticker), so a double submit can't insert twice."""
+    symbol = (symbol or '').strip().upper()
+    if not symbol:
+        return
+    if WatchlistItem.query.filter_by(user_id=user_id, symbol=symbol).first():
+        return
+    quote = market_clock.quotes([symbol]).get(symbol)
+    db.session.add(WatchlistItem(user_id=user_id, symbol=symbol, ticker_id=quote.id if quote else None))
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()  # lost the race, it's already there
 
 @app.route('/remove_watch', methods=['POST'])
 @login_required
 def remove_watch():
     symbol = (request.form.get('symbol') or '').strip().upper()
-    item = WatchlistItem.query.filter_by(user_id=current_user().id, symbol=symbol).first()
-    if item:
-        db.session.delete(item)
-        db.session.commit()
+    WatchlistItem.query.filter_by(user_id=current_user_id(), symbol=symbol).delete()
+    db.session.commit()
     return watchlist_partial()  # return only the table fragment
 
 
 @app.route('/watchlist_partial')
 @login_required
-def watchlist_partial():
-    user = current_user()
-    items = WatchlistItem.query.filter_by(user_id=user.id).all()
-    tickers = Ticker.query.all()
-    tickers_map = {t.symbol: t for t in tickers}
+def watchlist_partial(items=None):
+    if items is None:
+        items = WatchlistItem.query.filter_by(user_id=current_user_id()).all()
+    tickers_map = market_clock.quotes(item.symbol for item in items)
     return render_template('_watchlist.html', items=items, tickers_map=tickers_map)
 
 
 @app.route('/add_watchlist_item', methods=['POST'])
 @login_required
 def add_watchlist_item():
-    user = current_user()
-    symbol = (request.form.get('symbol') or '').strip().upper()
-
-    if symbol:
-        exists = WatchlistItem.query.filter_by(user_id=user.id, symbol=symbol).first()
-        if not exists:
-            db.session.add(WatchlistItem(user_id=user.id, symbol=symbol))
-            db.session.commit()
-
+    add_to_watchlist(current_user_id(), request.form.get('symbol'))
     return watchlist_partial()
 
-# news section, maybe refactor if we have time
 # ----------------- Financial News -----------------
 
-NEWS_FEEDS = [
-    {
-        "source": "MarketWatch",
-        "url": "https://feeds.marketwatch.com/marketwatch/topstories/"
-    }
-]
-
-
-def _strip_html(text: str) -> str:
-    if not text:
-        return ""
-    return re.sub(r"<.*?>", "", text)
-
-
-def fetch_financial_news(per_feed_limit: int = 40):
-    """Fetch and normalize financial news from multiple RSS feeds."""
-    articles = []
-
-    for feed in NEWS_FEEDS:
-        parsed = feedparser.parse(feed["url"])
-        for entry in parsed.entries[:per_feed_limit]:
-            summary_raw = entry.get("summary") or entry.get("description") or ""
-            summary_clean = _strip_html(summary_raw).strip()
-            if len(summary_clean) > 260:
-                summary_clean = summary_clean[:257] + "..."
-
-            articles.append(
-                {
-                    "source": feed["source"],
-                    "title": (entry.get("title") or "").strip(),
-                    "summary": summary_clean,
-                    "link": entry.get("link"),
-                    "published": entry.get("published", ""),
-                }
-            )
-
-    # NO slicing here – we return every article we got
-    return articles
-
 @app.route("/news")
 @login_required
 def news_page():
@@ -481,69 +972,87 @@ def news_page():
 @app.route("/news/tiles")
 @login_required
 def news_tiles():
-    """Return ALL news articles on one page (no pagination)."""
-    articles = fetch_financial_news(per_feed_limit=40)
-    fetched_at = datetime.utcnow().strftime("%H:%M:%S UTC")
+    """Return ALL news articles on one page (no pagination), from the store."""
+    news_ingestor.start()
+    if news_store.updated_at is None:
+        # cold start: the ingestor's first poll is under way, the placeholder asks again shortly
+        resp = make_response(render_template("_news_tiles.html", loading=True))
+        resp.headers["Cache-Control"] = "no-store"
+        return resp
 
     html = render_template(
         "_news_tiles.html",
-        articles=articles,
-        fetched_at=fetched_at,
+        articles=news_store.articles(),
+        fetched_at=news_store.updated_at.strftime("%H:%M:%S UTC"),
     )
 
     resp = make_response(html)
-    resp.headers["Cache-Control"] = "no-store, no-cache, must-revalidate, max-age=0"
-    resp.headers["Pragma"] = "no-cache"
-    return resp
+    resp.headers["Cache-Control"] = f"private, max-age={app.config['NEWS_MAX_AGE']}"
+    resp.set_etag(f"news-{news_store.version}")
+    return resp.make_conditional(request)
 
 @app.context_processor
 def inject_user():
-    return {"user": current_user()}
+    # lazy, so fragments that never touch `user` don't load it
+    return {"user": LocalProxy(current_user), "session_user": LocalProxy(session_user)}
 
 @app.route("/price_alerts")
 @login_required
 def price_alerts():
-    user = current_user()
+    """Alerts the market clock (in any process) triggered for this user since the last call"""
+    alerts = alert_engine.drain(current_user_id())
+    return render_template("_price_alerts_oob.html", alerts=alerts)
 
-    PRICE_DELTA = 0.01  # min price change to trigger alert (e.g. $0.01)
 
-    alerts = []
-    items = WatchlistItem.query.filter_by(user_id=user.id).all()
+@app.route("/alerts", methods=["POST"])
+@login_required
+def create_price_alert():
+    """Alert when a price crosses a level, either absolute or a % move from now"""
+    user_id = current_user_id()
+    symbol = (request.form.get("symbol") or "").strip().upper()
+    direction = (request.form.get("direction") or "").strip().upper()
+    mode = request.form.get("mode", "price")
+
+    quote = market_clock.quotes([symbol]).get(symbol)
+    if quote is None:
+        flash("Unknown symbol", "error")
+        return redirect(url_for("watchlist"))
+    if direction not in (ABOVE, BELOW) or mode not in ("price", "pct"):
+        flash("Invalid alert", "error")
+        return redirect(url_for("watchlist"))
+    try:
+        value = Decimal(request.form.get("value", "").strip())
+        assert value > 0
+    except Exception:
+        flash("Invalid alert value", "error")
+        return redirect(url_for("watchlist"))
 
-    for item in items:
-        # WatchlistItem stores symbol, not ticker_id
-        ticker = Ticker.query.filter_by(symbol=item.symbol).first()
-        if not ticker:
-            continue
-
-        current_price = float(ticker.price)
-        last_notified = item.last_notified_price
-
-        # First time OR significant change
-        if last_notified is None or abs(current_price - last_notified) >= PRICE_DELTA:
-            direction = None
-            if last_notified is not None:
-                direction = "up" if current_price > last_notified else "down"
-
-            alerts.append({
-                "symbol": ticker.symbol,
-                "price": current_price,
-                "direction": direction,
-            })
-
-            # Update so we don't alert again for the same price
-            item.last_notified_price = current_price
-
-    if alerts:
-        db.session.commit()
+    pct = value if mode == "pct" else None
+    threshold = threshold_for(direction, quote.price, pct) if pct is not None else value
+    if (direction == ABOVE and threshold <= quote.price) or (direction == BELOW and threshold >= quote.price):
+        flash(f"{symbol} is already {direction.lower()} {threshold}", "error")
+        return redirect(url_for("watchlist"))
+
+    alert = PriceAlert(user_id=user_id, ticker_id=quote.id, direction=direction, threshold=threshold, pct=pct)
+    db.session.add(alert)
+    db.session.commit()
+    alert_engine.add(alert.id, user_id, quote.id, direction, threshold, price=quote.price)
+
+    flash(f"Alert set: {symbol} {direction.lower()} ${threshold}", "success")
+    return redirect(url_for("watchlist"))
 
-    # alerts is a list: one entry per stock that moved
-    return render_template("_price_alerts_oob.html", alerts=alerts)
+
+@app.route("/alerts/<int:alert_id>/delete", methods=["POST"])
+@login_required
+def delete_price_alert(alert_id):
+    PriceAlert.query.filter_by(id=alert_id, user_id=current_user_id()).delete()
+    db.session.commit()
+    alert_engine.remove([alert_id])
+    return redirect(url_for("watchlist"))
 
 @app.route("/watchlist/name", methods=["POST"])
 @login_required
 def update_watchlist_name():
-    user = current_user()
     new_name = (request.form.get("name") or "").strip()
 
     if not new_name:
@@ -552,77 +1061,26 @@ def update_watchlist_name():
     # enforce max length
     new_name = new_name[:64]
 
-    user.watchlist_name = new_name
+    # by id, the User row itself isn't needed
+    db.session.execute(update(User).where(User.id == current_user_id()).values(watchlist_name=new_name))
     db.session.commit()
+    session['watchlist_name'] = new_name
 
     # return just the header fragment
-    return render_template("_watchlist_header.html", user=user)
+    return render_template("_watchlist_header.html")
 
 def render_performance_chart_html(user):
-    # Get all trades for this user in chronological order
-    trades = (
-        Trade.query
-        .join(Order, Trade.order_id == Order.id)
-        .filter(Order.user_id == user.id)
-        .order_by(Trade.id)
-        .all()
-    )
+    """Chart fragment. The series is persisted (perf_series.py) and the PNG is
+    cached per (user, last trade), so this only re-renders after a new trade."""
+    last_trade_id, points = load_series(user.id)
 
     img_b64 = None
-
-    if trades:
-        START_EQUITY = float(Decimal("100000.00"))
-        cash = START_EQUITY
-        positions = {}  # ticker_id -> {"qty": int, "last_price": float}
-
-        xs = []
-        ys = []
-
-        for idx, trade in enumerate(trades, start=1):
-            order = trade.order
-            ticker_id = order.ticker_id
-            side = order.side  # "BUY" or "SELL"
-            price = float(trade.price)
-            qty = trade.qty
-
-            if ticker_id not in positions:
-                positions[ticker_id] = {"qty": 0, "last_price": price}
-
-            if side == "BUY":
-                cash -= price * qty
-                positions[ticker_id]["qty"] += qty
-            elif side == "SELL":
-                cash += price * qty
-                positions[ticker_id]["qty"] -= qty
-
-            positions[ticker_id]["last_price"] = price
-
-            equity = cash + sum(
-                pos["qty"] * pos["last_price"] for pos in positions.values()
-            )
-            pnl = equity - START_EQUITY
-
-            xs.append(idx)   # t = 1, 2, ...
-            ys.append(pnl)
-
-        # Build matplotlib figure into PNG in memory
-        fig, ax = plt.subplots(figsize=(6, 3))
-        ax.plot(xs, ys, marker="o", linewidth=1.5)
-        ax.axhline(0, linewidth=0.8)
-        ax.set_title("Portfolio PnL vs Trades")
-        ax.set_xlabel("Trade # (t)")
-        ax.set_ylabel("PnL ($)")
-        fig.tight_layout()
-
-        buf = io.BytesIO()
-        fig.savefig(buf, format="png")
-        plt.close(fig)
-        buf.seek(0)
-
-        img_b64 = base64.b64encode(buf.read()).decode("ascii")
+    if points and not app.config['CLIENT_SIDE_CHART']:
+        img_b64 = chart_png_b64(user.id, last_trade_id, points)
 
     # Render HTML fragment (this is the template render you were expecting)
-    return render_template("_performance_chart_wrapper.html", img_b64=img_b64)
+    return render_template("_performance_chart_wrapper.html", img_b64=img_b64,
+                           has_points=bool(points), client_side=app.config['CLIENT_SIDE_CHART'])
 
 
 @app.route("/performance_chart.png")
@@ -632,15 +1090,29 @@ def performance_chart_png():
     # This returns HTML, not raw PNG – by design
     return render_performance_chart_html(user)
 
+
+@app.route("/performance.json")
+@login_required
+def performance_json():
+    """The PnL series as compact JSON, for drawing the chart in the browser"""
+    last_trade_id, points = load_series(current_user_id())
+    return {
+        "last_trade_id": last_trade_id,
+        "t": [seq for seq, _ in points],
+        "pnl": [float(pnl) for _, pnl in points],
+    }
+
 @app.route("/account")
 @login_required
 def account_page():
     user = current_user()
 
     # This makes sure anything with date <= today has occurred
-    process_due_scheduled_transactions(user.id)
+    # (e.g. scheduled for today after the day's rollover already ran)
+    process_due_scheduled_transactions(user_ids=[user.id])
 
     account = Account.query.filter_by(user_id=user.id).first()
+    pnl = compute_user_pnl(user)
 
     upcoming = (
         ScheduledTransaction.query
@@ -661,41 +1133,68 @@ def account_page():
         "account.html",
         user=user,
         account=account,
+        pnl=pnl,
         upcoming=upcoming,
         processed=processed,
     )
 
-def process_due_scheduled_transactions(user_id: int) -> None:
-    """Apply all PENDING scheduled transactions for this user
-    whose scheduled_date is today or earlier.
+def process_due_scheduled_transactions(user_ids=None, today: date = None) -> int:
+    """Apply all PENDING scheduled transactions whose scheduled_date is today
+    or earlier, for every user (or just user_ids) in one pass and one commit.
+    Returns how many were applied.
     """
-    today = date.today()
+    today = today or date.today()
+
+    def apply():
+        q = (
+            ScheduledTransaction.query
+            .filter_by(status="PENDING")
+            .filter(ScheduledTransaction.scheduled_date <= today)
+        )
+        if user_ids is not None:
+            q = q.filter(ScheduledTransaction.user_id.in_(user_ids))
+        txns = q.order_by(ScheduledTransaction.id).all()
+        if not txns:
+            return 0, {}
+
+        accounts = {
+            a.user_id: a
+            for a in Account.query.filter(Account.user_id.in_({tx.user_id for tx in txns}))
+        }
+
+        applied = 0
+        for tx in txns:
+            account = accounts.get(tx.user_id)
+            if not account:
+                continue
+            amt = Decimal(tx.amount)
+
+            if tx.tx_type == "DEPOSIT":
+                account.cash = account.cash + amt
+            elif tx.tx_type == "WITHDRAW":
+                account.cash = account.cash - amt
+
+            tx.status = "PROCESSED"
+            tx.processed_at = today
+            applied += 1
 
-    # Get user's account
-    account = Account.query.filter_by(user_id=user_id).first()
-    if not account:
-        return
+        db.session.commit()
+        return applied, {a.user_id: a.cash for a in accounts.values()}
 
-    txns = (
-        ScheduledTransaction.query
-        .filter_by(user_id=user_id, status="PENDING")
-        .filter(ScheduledTransaction.scheduled_date <= today)
-        .all()
-    )
+    # account rows are versioned, a concurrent fill makes this start over
+    applied, cash = with_retry(apply)
+    for user_id, balance in cash.items():
+        rankings.set_cash(user_id, balance)
+    return applied
 
-    for tx in txns:
-        amt = Decimal(tx.amount)
 
-        if tx.tx_type == "DEPOSIT":
-            account.cash = account.cash + amt
-        elif tx.tx_type == "WITHDRAW":
-            account.cash = account.cash - amt
+# runs once per day rollover (checked on every clock tick) and at startup
+scheduled_transactions_job = DailyJob(lambda today: process_due_scheduled_transactions(today=today))
 
-        tx.status = "PROCESSED"
-        tx.processed_at = today
 
-    if txns:
-        db.session.commit()
+@market_clock.on_tick
+def _daily_rollover(snapshot):
+    scheduled_transactions_job.run_if_due()
 
 @app.route("/schedule-transaction", methods=["POST"])
 @login_required
@@ -735,63 +1234,131 @@ def schedule_transaction():
     db.session.add(tx)
     db.session.commit()
 
+    # today's rollover has already run, apply it now instead of tomorrow
+    if sched_date <= date.today():
+        process_due_scheduled_transactions(user_ids=[user.id])
+
     flash("Scheduled transaction created.", "success")
     return redirect(url_for("dashboard"))
 
-@app.before_request
-def apply_scheduled_for_logged_in_user():
-    user = current_user()
-    if user is None:
-        return  # no one logged in, nothing to do
-    process_due_scheduled_transactions(current_user().id)
+def compute_user_pnl(user: User) -> Decimal:
+    """Compute current PnL for a user based on cash + marked-to-market positions.
+    One SQL statement, see pnl.py (use compute_pnls directly for many users)."""
+    return compute_pnls([user.id]).get(user.id, Decimal("0.00"))
 
+@app.route("/leaderboard")
+@login_required
+def leaderboard():
+    """Top of the ranking plus where you are, served from the in-memory
+    leaderboard (top-K is a partial sort, your rank a count)"""
+    rankings.ensure_loaded()
+    rankings.start(app)
+    user_id = current_user_id()
+
+    leaderboard_rows = rankings.top(app.config['LEADERBOARD_SIZE'])
+    my_row = None
+    for row in leaderboard_rows:
+        row["is_current"] = row["user_id"] == user_id
+    if not any(row["is_current"] for row in leaderboard_rows):
+        my_row = rankings.rank_of(user_id)
+
+    return render_template("leaderboard.html", leaderboard=leaderboard_rows,
+                           my_row=my_row, total=len(rankings))
+
+def init_db() -> None:
+    """One-time startup step: create/upgrade the tables and catch up on any
+    scheduled transactions that came due while the app was down (and on PnL
+    series that missed trades)."""
+    with app.app_context():
+        db.create_all()
+        migrations.upgrade()
+        scheduled_transactions_job.run_if_due()
+        catch_up_series()
 
-START_EQUITY = Decimal("100000.00")
 
-def compute_user_pnl(user: User) -> Decimal:
-    """Compute current PnL for a user based on cash + marked-to-market positions."""
-    account = Account.query.filter_by(user_id=user.id).first()
-    if not account:
-        return Decimal("0.00")
+@app.cli.command('init-db')
+def init_db_command():
+    """Create the tables (run once before serving with flask/gunicorn)"""
+    init_db()
 
-    equity = Decimal(account.cash or 0)
 
-    positions = Position.query.filter_by(user_id=user.id).all()
-    for pos in positions:
-        if pos.qty == 0:
-            continue
-        ticker = pos.ticker  # relationship is already on Position
-        if not ticker or ticker.price is None:
-            continue
-        equity += Decimal(pos.qty) * Decimal(ticker.price)
+@app.cli.command('migrate-db')
+def migrate_db_command():
+    """Upgrade an existing paper.db to the current schema (columns + indexes)"""
+    with app.app_context():
+        migrations.upgrade()
 
-    return equity - START_EQUITY
 
-@app.route("/leaderboard")
-@login_required
-def leaderboard():
-    users = User.query.all()
+@app.cli.command('seed-tickers')
+@click.argument('count', type=int)
+def seed_tickers_command(count):
+    """Add COUNT synthetic tickers (SIM00001...) to simulate a bigger market"""
+    init_db()
+    with app.app_context():
+        existing = set(db.session.scalars(select(Ticker.symbol)))
+        rng = random.Random(app.config['MARKET_SEED'])
+        rows = [{"symbol": f"SIM{i:05d}", "name": f"Simulated {i}",
+                 "price": Decimal(rng.randrange(100, 50000)) / 100}
+                for i in range(1, count + 1) if f"SIM{i:05d}" not in existing]
+        if rows:
+            db.session.execute(insert(Ticker), rows)
+            db.session.commit()
+        click.echo(f"added {len(rows)} tickers")
+
+
+@app.cli.command('provision-users')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--workers', type=int, default=None, help='hashing processes (default: all cores)')
+@click.option('--batch-size', type=int, default=1000, help='rows per INSERT executemany')
+def provision_users_command(path, workers, batch_size):
+    """Create the users in PATH (CSV with username,password[,cash] columns, or
+    JSON). Safe to re-run: existing usernames are skipped."""
+    init_db()
+    fmt = 'json' if path.lower().endswith('.json') else 'csv' if path.lower().endswith('.csv') else None
+    with open(path, 'rb') as f:
+        try:
+            users = read_users(f, fmt)
+        except ProvisioningError as exc:
+            raise click.ClickException(str(exc))
 
-    rows = []
-    for u in users:
-        pnl = compute_user_pnl(u)
-        rows.append((u, pnl))
+    started = time.perf_counter()
 
-    # sort by PnL descending
-    rows.sort(key=lambda tup: tup[1], reverse=True)
+    def progress(stage, done, total):
+        elapsed = time.perf_counter() - started
+        click.echo(f"{stage} {done}/{total} ({done / elapsed if elapsed else 0:.0f}/s)")
 
-    leaderboard_rows = []
-    current = current_user()
-    for rank, (u, pnl) in enumerate(rows, start=1):
-        leaderboard_rows.append({
-            "rank": rank,
-            "username": u.username,
-            "pnl": pnl,
-            "is_current": (current is not None and u.id == current.id),
-        })
+    with app.app_context():
+        report = provision(users, workers=workers, batch_size=batch_size, progress=progress)
+    click.echo(f"created {len(report.created)}, skipped {report.skipped}, "
+               f"accounts added {report.accounts_added} in {report.seconds:.2f}s "
+               f"(hashing {report.hash_seconds:.2f}s, {report.users_per_sec:.0f} users/s)")
+
+
+@app.cli.command('reset-cohort')
+@click.option('--all', 'everyone', is_flag=True, help='every user')
+@click.option('--prefix', default=None, help='usernames starting with this')
+@click.option('--users', default='', help='comma separated usernames')
+@click.option('--archive', default=None, help='label to archive the old orders/trades/positions under')
+@click.option('--cash', type=click.FLOAT, default=100000.0, help='starting cash')
+def reset_cohort_command(everyone, prefix, users, archive, cash):
+    """Reset the portfolios of a cohort (--prefix / --users) or --all users.
+    Running web processes only catch up on their next leaderboard resync,
+    prefer POST /admin/reset while serving."""
+    init_db()
+    cohort = Cohort(usernames=tuple(u.strip() for u in users.split(',') if u.strip()), username_prefix=prefix)
+    if cohort.everyone != everyone:
+        raise click.UsageError('use --all, or --prefix / --users (not both)')
+    with app.app_context():
+        report = reset_cohort(cohort, Decimal(str(cash)).quantize(Decimal('0.01')), archive_label=archive)
+    click.echo(f"reset {report.accounts} accounts: deleted {report.orders} orders, {report.trades} trades, "
+               f"{report.positions} positions{' (archived as ' + archive + ')' if archive else ''} "
+               f"in {report.seconds:.2f}s")
 
-    return render_template("leaderboard.html", leaderboard=leaderboard_rows)
 
 if __name__ == '__main__':
+    init_db()
+    # the debug reloader runs this file twice, only start the clock in the child
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        market_clock.start()
     app.run(debug=True)
 
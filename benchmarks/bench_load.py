@@ -0,0 +1,220 @@
+"""Load test for the polling / htmx endpoints. Seeds a throwaway DB, then N
+client threads each log in as a seeded user and replay dashboard traffic
+through the Flask test client (the same WSGI stack gunicorn would call).
+
+    python -m benchmarks.bench_load                       # defaults below
+    python -m benchmarks.bench_load --clients 16 --rounds 50 --tick 0.5
+    python -m benchmarks.bench_load --save small          # write baselines/small.json
+    python -m benchmarks.bench_load --compare small       # diff against it
+
+Reports p50/p95/p99 latency, SQL queries per request and requests/sec per
+endpoint. Baselines are machine specific, compare runs from the same box.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+BASELINES = Path(__file__).parent / "baselines"
+
+# what an open dashboard / portfolio tab asks for every round
+POLL_ROUTES = ["/dash_tick", "/price_alerts", "/positions", "/open_orders", "/transactions"]
+# and every `--every` rounds
+OCCASIONAL_ROUTES = ["/leaderboard", "POST /order"]
+
+
+def _percentile(sorted_values, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * pct / 100
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def summarize(samples: dict, seconds: float) -> dict:
+    """samples: route -> [(latency seconds, queries)] -> the report dict"""
+    endpoints = {}
+    for route, rows in sorted(samples.items()):
+        if not rows:  # e.g. the occasional routes when rounds < --every
+            continue
+        latencies = sorted(lat * 1000 for lat, _ in rows)
+        endpoints[route] = {
+            "requests": len(rows),
+            "p50_ms": round(_percentile(latencies, 50), 3),
+            "p95_ms": round(_percentile(latencies, 95), 3),
+            "p99_ms": round(_percentile(latencies, 99), 3),
+            "queries_per_req": round(statistics.fmean(q for _, q in rows), 2),
+            "rps": round(len(rows) / seconds, 1) if seconds else 0.0,
+        }
+    total = sum(len(rows) for rows in samples.values())
+    return {"endpoints": endpoints,
+            "total": {"requests": total, "seconds": round(seconds, 3),
+                      "rps": round(total / seconds, 1) if seconds else 0.0}}
+
+
+def run(args) -> dict:
+    fd, db_path = tempfile.mkstemp(prefix="papertrader-load-", suffix=".db")
+    os.close(fd)
+    # the real app, pointed at the throwaway DB (must happen before importing it)
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+    from app import app, db, market_clock
+    from benchmarks.seed import seed
+    from models import Ticker
+
+    # seed() starts with drop_all: never let it near a DB that isn't ours
+    with app.app_context():
+        bound = db.engine.url.database
+    if os.path.abspath(bound or "") != os.path.abspath(db_path):
+        os.remove(db_path)
+        raise SystemExit(f"app was imported before bench_load could point it at a throwaway DB "
+                         f"(it is bound to {bound!r}), run it as python -m benchmarks.bench_load")
+
+    try:
+        with app.app_context():
+            seed(args.users, n_tickers=args.tickers, positions_per_user=args.positions,
+                 trades_per_user=args.trades, open_orders_per_user=args.open_orders,
+                 watchlist_per_user=args.watchlist, rng_seed=args.seed)
+            symbols = [s for (s,) in db.session.query(Ticker.symbol)]
+
+        local = threading.local()
+
+        def count_query(*_):
+            local.queries = getattr(local, "queries", 0) + 1
+
+        with app.app_context():
+            engine = db.engine
+        db.event.listen(engine, "before_cursor_execute", count_query)
+
+        if args.tick > 0:
+            market_clock.tick_seconds = args.tick
+            market_clock.start()
+
+        samples = {route: [] for route in POLL_ROUTES + OCCASIONAL_ROUTES}
+        samples_lock = threading.Lock()
+        errors = []
+        start = threading.Barrier(args.clients + 1)
+
+        def client_thread(user_id: int):
+            rng = random.Random(args.seed + user_id)
+            client = app.test_client()
+            with client.session_transaction() as sess:
+                sess["user_id"] = user_id
+                sess["username"] = f"user{user_id}"
+                sess["watchlist_name"] = None
+            mine = []
+            start.wait()
+            for n in range(args.rounds):
+                routes = list(POLL_ROUTES)
+                if n % args.every == args.every - 1:
+                    routes += OCCASIONAL_ROUTES
+                for route in routes:
+                    local.queries = 0
+                    t0 = time.perf_counter()
+                    if route == "POST /order":
+                        r = client.post("/order", data={"side": "BUY", "order_type": "MKT",
+                                                        "symbol": rng.choice(symbols), "qty": "1"})
+                    else:
+                        r = client.get(route)
+                    elapsed = time.perf_counter() - t0
+                    if r.status_code >= 400:
+                        errors.append((route, r.status_code))
+                    mine.append((route, elapsed, local.queries))
+            with samples_lock:
+                for route, elapsed, queries in mine:
+                    samples[route].append((elapsed, queries))
+
+        threads = [threading.Thread(target=client_thread, args=(uid,))
+                   for uid in range(1, args.clients + 1)]
+        for t in threads:
+            t.start()
+        start.wait()
+        t0 = time.perf_counter()
+        for t in threads:
+            t.join()
+        seconds = time.perf_counter() - t0
+
+        market_clock.stop()
+        db.event.remove(engine, "before_cursor_execute", count_query)
+        if errors:
+            raise SystemExit(f"{len(errors)} failed requests, e.g. {errors[:3]}")
+    finally:
+        os.remove(db_path)
+        for suffix in ("-wal", "-shm"):
+            if os.path.exists(db_path + suffix):
+                os.remove(db_path + suffix)
+
+    report = summarize(samples, seconds)
+    report["config"] = {k: getattr(args, k) for k in
+                        ("users", "tickers", "positions", "trades", "open_orders", "watchlist",
+                         "clients", "rounds", "every", "tick", "seed")}
+    return report
+
+
+def print_report(report: dict, baseline: dict = None) -> list:
+    """Print the table; returns the routes whose p95 regressed past the tolerance"""
+    regressions = []
+    print(f"{'endpoint':<16} {'reqs':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'q/req':>6} {'req/s':>8}"
+          + ("   p95 vs baseline" if baseline else ""))
+    for route, r in report["endpoints"].items():
+        line = (f"{route:<16} {r['requests']:>6} {r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} "
+                f"{r['p99_ms']:>8.2f} {r['queries_per_req']:>6.1f} {r['rps']:>8.1f}")
+        base = (baseline or {}).get("endpoints", {}).get(route)
+        if base and base["p95_ms"]:
+            change = (r["p95_ms"] - base["p95_ms"]) / base["p95_ms"]
+            line += f"   {change:+.0%}"
+            if change > report["tolerance"]:
+                line += "  REGRESSION"
+                regressions.append(route)
+            if r["queries_per_req"] > base["queries_per_req"]:
+                line += f"  (queries {base['queries_per_req']} -> {r['queries_per_req']})"
+        print(line)
+    t = report["total"]
+    print(f"{'total':<16} {t['requests']:>6} in {t['seconds']:.2f}s = {t['rps']:.1f} req/s")
+    return regressions
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.bench_load")
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--tickers", type=int, default=50)
+    parser.add_argument("--positions", type=int, default=5, help="positions per user")
+    parser.add_argument("--trades", type=int, default=20, help="filled orders (with a trade) per user")
+    parser.add_argument("--open-orders", type=int, default=3, help="resting LMT orders per user")
+    parser.add_argument("--watchlist", type=int, default=5, help="watchlist items per user")
+    parser.add_argument("--clients", type=int, default=8, help="concurrent simulated users")
+    parser.add_argument("--rounds", type=int, default=20, help="polling rounds per client")
+    parser.add_argument("--every", type=int, default=5, help="leaderboard + an order every N rounds")
+    parser.add_argument("--tick", type=float, default=0.0, help="run the market clock at this interval")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--save", metavar="NAME", help="store the result as baselines/NAME.json")
+    parser.add_argument("--compare", metavar="NAME", help="compare against baselines/NAME.json")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed p95 slowdown (0.25 = 25%%)")
+    args = parser.parse_args(argv)
+    if args.every < 1:
+        parser.error("--every must be at least 1")
+    args.clients = min(args.clients, args.users)
+
+    report = run(args)
+    report["tolerance"] = args.tolerance
+    baseline = None
+    if args.compare:
+        baseline = json.loads((BASELINES / f"{args.compare}.json").read_text())
+    regressions = print_report(report, baseline)
+
+    if args.save:
+        BASELINES.mkdir(exist_ok=True)
+        path = BASELINES / f"{args.save}.json"
+        path.write_text(json.dumps(report, indent=2, sort_keys=True) + "\n")
+        print(f"saved {path}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,59 @@
+"""Per-user PnL loop vs the set-based query in pnl.py.
+
+    python -m benchmarks.bench_pnl              # 1k / 10k / 100k users
+    python -m benchmarks.bench_pnl 1000 5000
+"""
+import os
+import sys
+import time
+from decimal import Decimal
+
+from benchmarks.seed import make_app, seed
+from models import User, Account, Position
+from pnl import START_EQUITY, compute_pnls
+
+
+def loop_pnl(user: User) -> Decimal:
+    """The old compute_user_pnl: two queries per user + a lazy ticker load per position"""
+    account = Account.query.filter_by(user_id=user.id).first()
+    if not account:
+        return Decimal("0.00")
+    equity = Decimal(account.cash or 0)
+    for pos in Position.query.filter_by(user_id=user.id).all():
+        if pos.qty == 0:
+            continue
+        ticker = pos.ticker
+        if not ticker or ticker.price is None:
+            continue
+        equity += Decimal(pos.qty) * Decimal(ticker.price)
+    return equity - START_EQUITY
+
+
+def run(n_users: int) -> dict:
+    bench_app = make_app()
+    with bench_app.app_context():
+        seed(n_users)
+
+        started = time.perf_counter()
+        looped = {u.id: loop_pnl(u) for u in User.query.all()}
+        loop_s = time.perf_counter() - started
+
+        started = time.perf_counter()
+        set_based = compute_pnls()
+        set_s = time.perf_counter() - started
+    os.remove(bench_app.config["BENCH_DB_PATH"])
+
+    assert looped == set_based, "set-based PnL disagrees with the loop"
+    return {"users": n_users, "loop_s": loop_s, "set_based_s": set_s, "speedup": loop_s / set_s}
+
+
+def main(argv):
+    sizes = [int(a) for a in argv] or [1_000, 10_000, 100_000]
+    print(f"{'users':>8} {'loop (s)':>10} {'set (s)':>10} {'speedup':>8}")
+    for n in sizes:
+        r = run(n)
+        print(f"{r['users']:>8} {r['loop_s']:>10.3f} {r['set_based_s']:>10.3f} {r['speedup']:>7.0f}x")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
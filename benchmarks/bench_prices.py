@@ -0,0 +1,70 @@
+"""Market clock tick: the old per-ORM-object Decimal walk vs the vectorised
+engine in pricing.py (read + step + bulk flush + snapshot, i.e. a full tick).
+
+    python -m benchmarks.bench_prices               # 1k / 10k symbols
+    python -m benchmarks.bench_prices 10000 50000
+"""
+import os
+import random
+import sys
+import time
+from decimal import Decimal
+
+from benchmarks.seed import make_app, seed
+from market import MarketClock
+from models import db, Ticker
+from pricing import MODELS, PriceEngine
+
+TICKS = 5
+
+
+def loop_tick() -> None:
+    """The old MarketClock.tick: load every Ticker, random.randrange per symbol"""
+    for t in Ticker.query.all():
+        drift = Decimal(random.randrange(-50, 51)) / Decimal('100')
+        t.price = max(Decimal('1.00'), (t.price + drift).quantize(Decimal('0.01')))
+    db.session.commit()
+
+
+def _per_tick(fn) -> float:
+    started = time.perf_counter()
+    for _ in range(TICKS):
+        fn()
+    return (time.perf_counter() - started) / TICKS
+
+
+def run(n_tickers: int) -> dict:
+    bench_app = make_app()
+    try:
+        with bench_app.app_context():
+            seed(1, n_tickers=n_tickers, positions_per_user=1)
+            result = {"tickers": n_tickers, "loop_ms": _per_tick(loop_tick) * 1000}
+        for model in MODELS:
+            engine = PriceEngine(model, seed=42)
+            clock = MarketClock(bench_app, engine=engine)
+            clock.tick()  # first tick loads the arrays
+            result[f"{model}_ms"] = _per_tick(clock.tick) * 1000
+
+            # just the vectorised step, no DB
+            started = time.perf_counter()
+            for _ in range(TICKS):
+                engine.step()
+            result[f"{model}_step_ms"] = (time.perf_counter() - started) / TICKS * 1000
+    finally:
+        os.remove(bench_app.config["BENCH_DB_PATH"])
+    return result
+
+
+def main(argv):
+    sizes = [int(a) for a in argv] or [1_000, 10_000]
+    header = f"{'tickers':>8} {'loop ms':>9}" + "".join(f" {m + ' ms':>10} {'(step)':>8}" for m in MODELS)
+    print(f"per tick, mean of {TICKS}; (step) = the NumPy step alone")
+    print(header)
+    for n in sizes:
+        r = run(n)
+        print(f"{r['tickers']:>8} {r['loop_ms']:>9.1f}"
+              + "".join(f" {r[m + '_ms']:>10.1f} {r[m + '_step_ms']:>8.3f}" for m in MODELS))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
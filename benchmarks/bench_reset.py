@@ -0,0 +1,65 @@
+"""Portfolio reset for a whole cohort: the old per-user /reset body in a loop vs
+cohorts.reset_cohort (a few set-based statements).
+
+    python -m benchmarks.bench_reset              # 10k / 100k users
+    python -m benchmarks.bench_reset 1000
+
+The loop is timed on the first 1000 users and scaled up. Then, on the same
+data, a prefix cohort ("user1": user1, user10.., ~11%) is reset with an
+archive, and finally everyone without one.
+"""
+import os
+import sys
+import time
+from decimal import Decimal
+
+from benchmarks.seed import make_app, seed
+from cohorts import Cohort, reset_cohort
+from models import db, Account, Order, Position, Trade
+from perf_series import delete_series
+
+LOOP_SAMPLE = 1000
+
+
+def loop_reset(user_id: int) -> None:
+    """What /reset did for one user"""
+    Position.query.filter_by(user_id=user_id).delete()
+    Trade.query.filter(Trade.order_id.in_(db.session.query(Order.id).filter_by(user_id=user_id))).delete()
+    Order.query.filter_by(user_id=user_id).delete()
+    delete_series([user_id])
+    account = Account.query.filter_by(user_id=user_id).first()
+    if account:
+        account.cash = Decimal("100000.00")
+    db.session.commit()
+
+
+def run(n_users: int) -> dict:
+    bench_app = make_app()
+    with bench_app.app_context():
+        seed(n_users, positions_per_user=5, trades_per_user=5, open_orders_per_user=1)
+
+        sample = min(n_users, LOOP_SAMPLE)
+        started = time.perf_counter()
+        for uid in range(1, sample + 1):
+            loop_reset(uid)
+        loop_s = (time.perf_counter() - started) * n_users / sample
+
+        prefix = reset_cohort(Cohort(username_prefix="user1"), archive_label="bench")
+        everyone = reset_cohort(Cohort())
+        assert Order.query.count() == Trade.query.count() == Position.query.count() == 0
+    os.remove(bench_app.config["BENCH_DB_PATH"])
+    return {"users": n_users, "loop_s": loop_s, "prefix": prefix, "everyone": everyone}
+
+
+def main(argv):
+    sizes = [int(a) for a in argv] or [10_000, 100_000]
+    print(f"{'users':>8} {'loop (s, est)':>14} {'prefix+archive (s)':>19} {'accounts':>9} "
+          f"{'all (s)':>8} {'accounts':>9}")
+    for n in sizes:
+        r = run(n)
+        print(f"{r['users']:>8} {r['loop_s']:>14.1f} {r['prefix'].seconds:>19.2f} {r['prefix'].accounts:>9} "
+              f"{r['everyone'].seconds:>8.2f} {r['everyone'].accounts:>9}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,71 @@
+"""Search box: the old linear scan over the snapshot vs search.SearchIndex.
+
+    python -m benchmarks.bench_search               # 50k instruments
+    python -m benchmarks.bench_search 5000 200000
+"""
+import random
+import string
+import sys
+import time
+from decimal import Decimal
+
+from market import Quote
+from search import SearchIndex
+
+WORDS = ["Apple", "Micro", "Devices", "Global", "Energy", "Holdings", "Capital", "Bio",
+         "Systems", "Pacific", "Networks", "Foods", "Motors", "Pharma", "Realty", "Trust"]
+SUFFIXES = ["Inc.", "Corp.", "Ltd", "PLC", "Group", "ETF"]
+# what someone typing "apple", "am", "micro d" sends, one request per keystroke
+KEYSTROKES = ["a", "ap", "app", "appl", "apple", "a", "am", "amd", "m", "mi", "mic", "micro",
+              "micro d", "micro dev", "zz", "x", "qqq", "global en", "t0", "hold"]
+
+
+def universe(n: int, rng_seed: int = 42) -> list:
+    rng = random.Random(rng_seed)
+    symbols = set()
+    while len(symbols) < n:
+        symbols.add("".join(rng.choices(string.ascii_uppercase, k=rng.randint(1, 5))))
+    return [Quote(i, s, " ".join(rng.sample(WORDS, rng.randint(1, 3)) + [rng.choice(SUFFIXES)]),
+                  Decimal("100.00"))
+            for i, s in enumerate(sorted(symbols), start=1)]
+
+
+def linear_search(quotes, query: str) -> list:
+    """The old search_stocks: substring match on symbol or name, every row"""
+    query = query.strip().upper()
+    return [q for q in quotes if query in q.symbol or query in (q.name or '').upper()]
+
+
+def _timings(fn, rounds: int = 20) -> list:
+    out = []
+    for _ in range(rounds):
+        for query in KEYSTROKES:
+            started = time.perf_counter()
+            fn(query)
+            out.append((time.perf_counter() - started) * 1e6)
+    return sorted(out)
+
+
+def run(n: int) -> dict:
+    quotes = universe(n)
+    started = time.perf_counter()
+    index = SearchIndex(quotes)
+    build_ms = (time.perf_counter() - started) * 1000
+    indexed = _timings(lambda q: index.search(q, 20))
+    linear = _timings(lambda q: linear_search(quotes, q), rounds=2)
+    return {"instruments": n, "build_ms": build_ms,
+            "index_mean_us": sum(indexed) / len(indexed), "index_max_us": indexed[-1],
+            "linear_mean_us": sum(linear) / len(linear)}
+
+
+def main(argv):
+    sizes = [int(a) for a in argv] or [50_000]
+    print(f"{'instruments':>11} {'build ms':>9} {'index mean us':>14} {'index max us':>13} {'scan mean us':>13}")
+    for n in sizes:
+        r = run(n)
+        print(f"{r['instruments']:>11} {r['build_ms']:>9.1f} {r['index_mean_us']:>14.1f} "
+              f"{r['index_max_us']:>13.1f} {r['linear_mean_us']:>13.1f}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
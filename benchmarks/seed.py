@@ -0,0 +1,85 @@
+"""Seeded data generator for the benchmarks. Builds a throwaway SQLite DB with
+N users, M tickers, P positions, K filled orders (with trades), open LMT orders
+and watchlist items per user, all with bulk inserts."""
+import os
+import random
+import tempfile
+from decimal import Decimal
+
+from flask import Flask
+from sqlalchemy import insert
+
+import storage
+from models import db, User, Account, Ticker, Position, Order, Trade, WatchlistItem
+
+
+def make_app(db_path: str = None) -> Flask:
+    """A bare Flask app bound to its own SQLite file (never paper.db)"""
+    if db_path is None:
+        fd, db_path = tempfile.mkstemp(prefix="papertrader-bench-", suffix=".db")
+        os.close(fd)
+    bench_app = Flask("benchmarks")
+    bench_app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{db_path}"
+    bench_app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    storage.init_app(bench_app, db)
+    bench_app.config["BENCH_DB_PATH"] = db_path
+    return bench_app
+
+
+def seed(n_users: int, n_tickers: int = 50, positions_per_user: int = 5, rng_seed: int = 42,
+         trades_per_user: int = 0, open_orders_per_user: int = 0, watchlist_per_user: int = 0) -> None:
+    """Fill the current app's DB. Same arguments + seed = same data."""
+    rng = random.Random(rng_seed)
+    db.drop_all()
+    db.create_all()
+
+    db.session.execute(insert(Ticker), [
+        {"id": i, "symbol": f"T{i:05d}", "name": f"Ticker {i}",
+         "price": Decimal(rng.randrange(100, 50000)) / 100}
+        for i in range(1, n_tickers + 1)
+    ])
+    db.session.execute(insert(User), [
+        {"id": i, "username": f"user{i}", "password_hash": "x"}
+        for i in range(1, n_users + 1)
+    ])
+    db.session.execute(insert(Account), [
+        {"user_id": i, "cash": Decimal(rng.randrange(1000000, 20000000)) / 100}
+        for i in range(1, n_users + 1)
+    ])
+    per_user = min(positions_per_user, n_tickers)
+    db.session.execute(insert(Position), [
+        {"user_id": uid, "ticker_id": tid, "qty": rng.randrange(1, 500),
+         "avg_price": Decimal(rng.randrange(100, 50000)) / 100}
+        for uid in range(1, n_users + 1)
+        for tid in rng.sample(range(1, n_tickers + 1), per_user)
+    ])
+
+    orders, trades = [], []
+    for uid in range(1, n_users + 1):
+        for _ in range(trades_per_user):
+            order_id = len(orders) + 1
+            price = Decimal(rng.randrange(100, 50000)) / 100
+            qty = rng.randrange(1, 50)
+            orders.append({"id": order_id, "user_id": uid, "ticker_id": rng.randrange(1, n_tickers + 1),
+                           "side": rng.choice(("BUY", "SELL")), "order_type": "MKT", "qty": qty,
+                           "status": "FILLED"})
+            trades.append({"order_id": order_id, "price": price, "qty": qty})
+        for _ in range(open_orders_per_user):
+            orders.append({"id": len(orders) + 1, "user_id": uid, "ticker_id": rng.randrange(1, n_tickers + 1),
+                           "side": "BUY", "order_type": "LMT", "qty": rng.randrange(1, 50),
+                           "limit_price": Decimal(rng.randrange(100, 1000)) / 100, "status": "PENDING"})
+    # limit_price only on the open orders, so insert the two shapes separately
+    for rows in ([o for o in orders if "limit_price" not in o], [o for o in orders if "limit_price" in o]):
+        if rows:
+            db.session.execute(insert(Order), rows)
+    if trades:
+        db.session.execute(insert(Trade), trades)
+
+    if watchlist_per_user:
+        per_user = min(watchlist_per_user, n_tickers)
+        db.session.execute(insert(WatchlistItem), [
+            {"user_id": uid, "symbol": f"T{tid:05d}", "ticker_id": tid}
+            for uid in range(1, n_users + 1)
+            for tid in rng.sample(range(1, n_tickers + 1), per_user)
+        ])
+    db.session.commit()
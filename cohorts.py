@@ -0,0 +1,121 @@
+"""Portfolio reset for a whole cohort (a class, a competition round) at once.
+
+Same effect as /reset for every user in the cohort: no orders, trades,
+positions or PnL series, starting cash. But instead of a handful of queries
+per user it's a handful of statements in total, each `... WHERE user_id IN
+(SELECT id FROM user WHERE <cohort filter>)` (or no WHERE for everyone), in
+one transaction. With an archive label the rows are first copied into the
+*_archive tables, so a round's results stay queryable.
+
+In-memory state (leaderboard, order book, chart cache) is the caller's job,
+using ResetReport.user_ids, see admin_reset in app.py."""
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from decimal import Decimal
+
+from sqlalchemy import delete, insert, literal, select, update
+
+from fills import with_retry
+from models import (db, User, Account, Order, Trade, Position, PnlPoint, PnlCheckpoint,
+                    OrderArchive, TradeArchive, PositionArchive, AccountArchive)
+from pnl import START_EQUITY
+
+
+@dataclass(frozen=True)
+class Cohort:
+    """Who to reset: everyone (no arguments), or the users matching any of
+    user_ids / usernames / username_prefix"""
+    user_ids: tuple = ()
+    usernames: tuple = ()
+    username_prefix: str = None
+
+    @property
+    def everyone(self) -> bool:
+        return not (self.user_ids or self.usernames or self.username_prefix)
+
+    def ids(self):
+        """SELECT of the cohort's user ids (None for everyone)"""
+        if self.everyone:
+            return None
+        conditions = []
+        if self.user_ids:
+            conditions.append(User.id.in_(self.user_ids))
+        if self.usernames:
+            conditions.append(User.username.in_(self.usernames))
+        if self.username_prefix:
+            conditions.append(User.username.startswith(self.username_prefix, autoescape=True))
+        return select(User.id).where(db.or_(*conditions))
+
+
+@dataclass(frozen=True)
+class ResetReport:
+    accounts: int
+    orders: int
+    trades: int
+    positions: int
+    archived: bool
+    seconds: float
+    user_ids: tuple = None  # who was reset, read in the same transaction (None = everyone)
+
+
+def _where(stmt, column, ids):
+    return stmt if ids is None else stmt.where(column.in_(ids))
+
+
+def _archive(ids, label: str, now: datetime) -> None:
+    """Copy what's about to be deleted (INSERT ... SELECT, one per table)"""
+    tag = [literal(label).label("label"), literal(now, db.DateTime).label("archived_at")]
+    db.session.execute(insert(OrderArchive).from_select(
+        ["label", "archived_at", "order_id", "user_id", "ticker_id", "side", "order_type",
+         "qty", "limit_price", "status"],
+        _where(select(*tag, Order.id, Order.user_id, Order.ticker_id, Order.side, Order.order_type,
+                      Order.qty, Order.limit_price, Order.status), Order.user_id, ids),
+    ))
+    db.session.execute(insert(TradeArchive).from_select(
+        ["label", "archived_at", "trade_id", "order_id", "user_id", "price", "qty"],
+        _where(select(*tag, Trade.id, Trade.order_id, Order.user_id, Trade.price, Trade.qty)
+               .join(Order, Order.id == Trade.order_id), Order.user_id, ids),
+    ))
+    db.session.execute(insert(PositionArchive).from_select(
+        ["label", "archived_at", "user_id", "ticker_id", "qty", "avg_price"],
+        _where(select(*tag, Position.user_id, Position.ticker_id, Position.qty, Position.avg_price),
+               Position.user_id, ids),
+    ))
+    db.session.execute(insert(AccountArchive).from_select(
+        ["label", "archived_at", "user_id", "cash"],
+        _where(select(*tag, Account.user_id, Account.cash), Account.user_id, ids),
+    ))
+
+
+def reset_cohort(cohort: Cohort, cash: Decimal = START_EQUITY, archive_label: str = None) -> ResetReport:
+    """Reset every portfolio in the cohort, in one transaction. Accounts get
+    their version bumped, so a fill that read the old balance retries."""
+    started = time.perf_counter()
+    ids = cohort.ids()
+    opts = {"synchronize_session": False}
+
+    def reset():
+        if archive_label:
+            _archive(ids, archive_label, datetime.utcnow())
+        order_ids = _where(select(Order.id), Order.user_id, ids)
+        trades = db.session.execute(
+            delete(Trade) if ids is None else delete(Trade).where(Trade.order_id.in_(order_ids)),
+            execution_options=opts).rowcount
+        orders = db.session.execute(_where(delete(Order), Order.user_id, ids), execution_options=opts).rowcount
+        positions = db.session.execute(_where(delete(Position), Position.user_id, ids),
+                                       execution_options=opts).rowcount
+        db.session.execute(_where(delete(PnlPoint), PnlPoint.user_id, ids), execution_options=opts)
+        db.session.execute(_where(delete(PnlCheckpoint), PnlCheckpoint.user_id, ids), execution_options=opts)
+        # read after the deletes began the transaction (and took the write lock),
+        # so no one can add or rename a user in between: these are the rows reset
+        user_ids = None if ids is None else tuple(db.session.scalars(ids))
+        accounts = db.session.execute(
+            _where(update(Account), Account.user_id, ids).values(cash=cash, version=Account.version + 1),
+            execution_options=opts).rowcount
+        db.session.commit()
+        return accounts, orders, trades, positions, user_ids
+
+    accounts, orders, trades, positions, user_ids = with_retry(reset)
+    return ResetReport(accounts, orders, trades, positions, bool(archive_label),
+                       time.perf_counter() - started, user_ids)
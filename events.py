@@ -0,0 +1,62 @@
+"""Tiny in-process pub/sub used by the /stream endpoint. Publishers say *what*
+changed (a topic), each open stream decides which fragments to re-render."""
+import queue
+import threading
+
+# topics
+PRICES = "prices"    # the market clock ticked
+ACCOUNT = "account"  # a user's orders / positions / cash changed
+ALERTS = "alerts"    # a user has price alerts waiting
+
+
+class Broker:
+    def __init__(self, maxsize: int = 64):
+        self.maxsize = maxsize
+        self._subs = {}  # user_id -> set of queues
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_id: int) -> queue.Queue:
+        q = queue.Queue(maxsize=self.maxsize)
+        with self._lock:
+            self._subs.setdefault(user_id, set()).add(q)
+        return q
+
+    def unsubscribe(self, user_id: int, q: queue.Queue) -> None:
+        with self._lock:
+            subs = self._subs.get(user_id)
+            if subs:
+                subs.discard(q)
+                if not subs:
+                    del self._subs[user_id]
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return sum(len(s) for s in self._subs.values())
+
+    def publish(self, topic: str, user_ids=None) -> None:
+        """Send topic to the given users, or to everyone when user_ids is None"""
+        with self._lock:
+            if user_ids is None:
+                targets = [q for subs in self._subs.values() for q in subs]
+            else:
+                targets = [q for uid in set(user_ids) for q in self._subs.get(uid, ())]
+        for q in targets:
+            try:
+                q.put_nowait(topic)
+            except queue.Full:
+                # slow client, it still has an unread event and will re-render anyway
+                pass
+
+
+def wait_for_topics(q: queue.Queue, timeout: float) -> set:
+    """Block until something is published (or timeout), then drain the queue"""
+    topics = set()
+    try:
+        topics.add(q.get(timeout=timeout))
+    except queue.Empty:
+        return topics
+    while True:
+        try:
+            topics.add(q.get_nowait())
+        except queue.Empty:
+            return topics
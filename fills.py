@@ -0,0 +1,228 @@
+"""Fill engine. Applies a batch of (order, price) fills with a handful of bulk
+queries and a single commit, instead of one lookup + commit per order.
+
+Account and Position rows carry a version column: every UPDATE/DELETE is
+`WHERE id = ? AND version = ?`, so a writer that read a row someone else has
+changed since fails instead of overwriting it. `with_retry` rolls back and
+runs the whole transaction again."""
+import logging
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from decimal import Decimal
+
+from sqlalchemy import bindparam, delete, insert, select, tuple_, update
+from sqlalchemy.exc import IntegrityError, OperationalError
+from sqlalchemy.orm.exc import StaleDataError
+
+from models import db, Account, Position, Trade
+
+log = logging.getLogger(__name__)
+
+
+class ConcurrentUpdateError(Exception):
+    """Still conflicting with other writers after every retry"""
+
+
+def _is_conflict(exc) -> bool:
+    if isinstance(exc, (StaleDataError, IntegrityError)):
+        return True  # version moved / same position inserted twice
+    # SQLite: our read snapshot went stale before we could write
+    return isinstance(exc, OperationalError) and "locked" in str(exc)
+
+
+def with_retry(work, attempts: int = 8):
+    """Run work() (one transaction, ending in a commit) until it doesn't
+    conflict, rolling back in between. work must re-read what it needs."""
+    for attempt in range(attempts):
+        try:
+            return work()
+        except (StaleDataError, IntegrityError, OperationalError) as exc:
+            db.session.rollback()
+            if not _is_conflict(exc):
+                raise
+            if attempt == attempts - 1:
+                raise ConcurrentUpdateError(str(exc)) from exc
+            log.debug("write conflict, retrying (%d)", attempt + 1)
+            time.sleep(random.uniform(0, 0.002 * 2 ** attempt))
+
+
+@dataclass(frozen=True)
+class FillReport:
+    """What one batch did, and how fast"""
+    filled: int
+    cancelled: int
+    seconds: float
+    cash: dict = field(default_factory=dict)       # user_id -> cash after the batch
+    positions: dict = field(default_factory=dict)  # (user_id, ticker_id) -> qty after the batch
+
+    @property
+    def fills_per_sec(self) -> float:
+        if self.seconds <= 0:
+            return 0.0
+        return (self.filled + self.cancelled) / self.seconds
+
+
+class FillStats:
+    """Running totals across batches (read by the metrics endpoint)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.last = None
+        self.batches = 0
+        self.filled = 0
+        self.cancelled = 0
+        self.seconds = 0.0
+
+    def record(self, report: FillReport) -> None:
+        with self._lock:
+            self.last = report
+            self.batches += 1
+            self.filled += report.filled
+            self.cancelled += report.cancelled
+            self.seconds += report.seconds
+
+
+stats = FillStats()
+
+
+_account = Account.__table__
+_position = Position.__table__
+
+# executemany statements for the rows a batch changes, each guarded by the
+# version read at the start (bindparams are prefixed, they can't share a column's name)
+_update_account = (
+    update(_account)
+    .where(_account.c.id == bindparam("b_id"), _account.c.version == bindparam("b_version"))
+    .values(cash=bindparam("b_cash"), version=_account.c.version + 1)
+)
+_update_position = (
+    update(_position)
+    .where(_position.c.id == bindparam("b_id"), _position.c.version == bindparam("b_version"))
+    .values(qty=bindparam("b_qty"), avg_price=bindparam("b_avg_price"), version=_position.c.version + 1)
+)
+_delete_position = delete(_position).where(_position.c.id == bindparam("b_id"),
+                                           _position.c.version == bindparam("b_version"))
+
+
+def _versioned(stmt, rows) -> None:
+    """Run a versioned UPDATE/DELETE for every row (one executemany), and
+    raise StaleDataError if any of them had changed since we read it"""
+    if not rows:
+        return
+    result = db.session.execute(stmt, rows)
+    sane = result.supports_sane_multi_rowcount() if len(rows) > 1 else result.supports_sane_rowcount()
+    if sane and result.rowcount != len(rows):
+        raise StaleDataError(f"{stmt.table.name}: {len(rows) - result.rowcount} of {len(rows)} rows changed underneath us")
+
+
+def execute_fills(fills) -> FillReport:
+    """Fill every (order, price) pair in one transaction.
+
+    Orders are applied in the order given, so two fills for the same user see
+    each other's cash and position changes. BUYs the account can't afford are
+    CANCELLED, SELLs are capped at the held quantity (no shorting) and
+    CANCELLED when nothing is held.
+
+    Two SELECTs up front, then one executemany per kind of change (trades,
+    new/changed/emptied positions, accounts, orders) and one commit.
+    Raises StaleDataError/IntegrityError if another writer got there first,
+    run it under `with_retry`."""
+    started = time.perf_counter()
+    fills = [(order, Decimal(price)) for order, price in fills]
+    if not fills:
+        return FillReport(0, 0, 0.0)
+
+    user_ids = {order.user_id for order, _ in fills}
+    keys = {(order.user_id, order.ticker_id) for order, _ in fills}
+
+    # versioned rows make this safe without locks, on Postgres it also takes
+    # row locks so conflicting fills wait instead of retrying
+    accounts = {}  # user_id -> (id, version) as read
+    cash = {}      # user_id -> cash, updated as we go
+    for user_id, account_id, version, amount in db.session.execute(
+            select(Account.user_id, Account.id, Account.version, Account.cash)
+            .where(Account.user_id.in_(user_ids)).with_for_update()):
+        accounts[user_id] = (account_id, version)
+        cash[user_id] = amount
+    held = {}  # (user_id, ticker_id) -> (id, version) of the existing row
+    qtys, avgs = {}, {}
+    for user_id, ticker_id, pos_id, version, qty, avg_price in db.session.execute(
+            select(Position.user_id, Position.ticker_id, Position.id, Position.version, Position.qty,
+                   Position.avg_price)
+            .where(tuple_(Position.user_id, Position.ticker_id).in_(keys))):
+        held[(user_id, ticker_id)] = (pos_id, version)
+        qtys[(user_id, ticker_id)], avgs[(user_id, ticker_id)] = qty, avg_price
+
+    changed_cash, changed_positions = set(), set()
+    trades = []
+    filled = cancelled = 0
+
+    for order, price in fills:
+        key = (order.user_id, order.ticker_id)
+        balance = cash.get(order.user_id)
+        qty = qtys.get(key, 0)
+
+        if order.side == 'BUY':
+            cost = (price * order.qty).quantize(Decimal('0.01'))
+            if balance is None or balance < cost:
+                order.status = 'CANCELLED'
+                cancelled += 1
+                continue
+            new_qty = qty + order.qty
+            avgs[key] = ((Decimal(qty) * avgs.get(key, Decimal('0'))) + (Decimal(order.qty) * price)) / Decimal(new_qty)
+            qtys[key] = new_qty
+            cash[order.user_id] = (balance - cost).quantize(Decimal('0.01'))
+            changed_cash.add(order.user_id)
+            fill_qty = order.qty
+        else:  # SELL (no shorting)
+            if qty <= 0:  # nothing to sell
+                order.status = 'CANCELLED'
+                cancelled += 1
+                continue
+            fill_qty = min(qty, order.qty)  # can't sell more than you hold
+            proceeds = (price * fill_qty).quantize(Decimal('0.01'))
+            qtys[key] = qty - fill_qty  # avg price unchanged when partially selling
+            if balance is not None:
+                cash[order.user_id] = (balance + proceeds).quantize(Decimal('0.01'))
+                changed_cash.add(order.user_id)
+
+        changed_positions.add(key)
+        trades.append({"order_id": order.id, "price": price, "qty": fill_qty})
+        order.status = 'FILLED'
+        filled += 1
+
+    new_rows, updates, emptied = [], [], []
+    for key in changed_positions:
+        if key not in held:
+            if qtys[key] > 0:  # bought and sold back to nothing in one batch: never inserted
+                new_rows.append({"user_id": key[0], "ticker_id": key[1], "qty": qtys[key],
+                                 "avg_price": avgs[key], "version": 1})
+        elif qtys[key] > 0:
+            pos_id, version = held[key]
+            updates.append({"b_id": pos_id, "b_version": version, "b_qty": qtys[key], "b_avg_price": avgs[key]})
+        else:  # sold out: remove the row so it won't show up in the positions list
+            pos_id, version = held[key]
+            emptied.append({"b_id": pos_id, "b_version": version})
+
+    if trades:
+        db.session.execute(insert(Trade), trades)
+    if new_rows:
+        db.session.execute(insert(Position), new_rows)  # same position inserted twice -> IntegrityError
+    _versioned(_update_position, updates)
+    _versioned(_delete_position, emptied)
+    _versioned(_update_account, [
+        {"b_id": accounts[uid][0], "b_version": accounts[uid][1], "b_cash": cash[uid]} for uid in changed_cash
+    ])
+    # the order status changes go out as one executemany in the commit's flush
+    db.session.commit()
+
+    report = FillReport(
+        filled, cancelled, time.perf_counter() - started,
+        cash=cash,
+        positions={key: qtys[key] for key in held.keys() | changed_positions},
+    )
+    stats.record(report)
+    log.debug("fill batch: %d filled, %d cancelled, %.0f fills/s", filled, cancelled, report.fills_per_sec)
+    return report
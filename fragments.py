@@ -0,0 +1,62 @@
+"""Render cache for partials that are the same for every user between ticks
+(the price table, the order form). Keyed by template + variant + market
+clock version, so each one is rendered once per tick however many dashboards
+ask. Concurrent misses on the same key wait for one render."""
+import threading
+import zlib
+from collections import OrderedDict
+
+from flask import render_template
+
+
+class FragmentCache:
+    def __init__(self, maxsize: int = 64):
+        self.maxsize = maxsize
+        self._items = OrderedDict()  # key -> html
+        self._rendering = {}  # key -> lock held by whoever renders it
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def get_or_render(self, key, render) -> str:
+        with self._lock:
+            html = self._items.get(key)
+            if html is not None:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return html
+            key_lock = self._rendering.setdefault(key, threading.Lock())
+
+        with key_lock:
+            with self._lock:
+                html = self._items.get(key)
+                if html is not None:  # someone else rendered it while we waited
+                    self.hits += 1
+                    return html
+                self.misses += 1
+            html = render()
+            with self._lock:
+                self._items[key] = html
+                self._items.move_to_end(key)
+                while len(self._items) > self.maxsize:
+                    self._items.popitem(last=False)
+                self._rendering.pop(key, None)
+            return html
+
+    def render(self, template: str, version: int, variant=None, **context) -> str:
+        """render_template(template, **context), once per (template, variant, version)"""
+        return self.get_or_render((template, variant, version), lambda: render_template(template, **context))
+
+    @staticmethod
+    def etag(template: str, html: str) -> str:
+        """From the content: versions are per process, so the same version can
+        mean other prices after a restart or on another worker"""
+        return f"{template}-{zlib.crc32(html.encode()):08x}"
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+            self.hits = self.misses = 0
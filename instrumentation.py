@@ -0,0 +1,249 @@
+"""Opt-in request instrumentation (METRICS_ENABLED). Per endpoint it records
+SQL query count and time (engine events), template render time (Flask's
+render signals), Python CPU time and wall time. The totals are served in
+Prometheus text format and every response gets a Server-Timing header.
+
+With PROFILE_SLOW_MS set, a sampling profiler also watches each request's
+thread and dumps folded stacks (flamegraph.pl / speedscope format) for the
+requests slower than that."""
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+
+from flask import g, has_app_context, request, before_render_template, template_rendered
+
+log = logging.getLogger(__name__)
+
+# upper bounds (seconds) of the request duration histogram
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class _Request:
+    """What one request spent, filled in as it runs"""
+    __slots__ = ("started", "cpu_started", "queries", "sql", "render", "render_stack", "samples")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.cpu_started = time.thread_time()
+        self.queries = 0
+        self.sql = 0.0
+        self.render = 0.0
+        self.render_stack = []
+        self.samples = None
+
+
+class _Endpoint:
+    __slots__ = ("requests", "queries", "sql", "render", "cpu", "seconds", "buckets")
+
+    def __init__(self):
+        self.requests = 0
+        self.queries = 0
+        self.sql = 0.0
+        self.render = 0.0
+        self.cpu = 0.0
+        self.seconds = 0.0
+        self.buckets = [0] * len(BUCKETS)
+
+
+def _current():
+    if has_app_context():
+        return g.get("_metrics")
+    return None
+
+
+class SamplingProfiler:
+    """Samples the stacks of registered threads every `interval` seconds.
+    Only runs while at least one request is being watched."""
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self._watched = {}  # thread id -> Counter of folded stacks
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def watch(self, thread_id: int) -> Counter:
+        samples = Counter()
+        with self._lock:
+            self._watched[thread_id] = samples
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+                self._thread.start()
+        return samples
+
+    def unwatch(self, thread_id: int) -> None:
+        with self._lock:
+            self._watched.pop(thread_id, None)
+
+    def _run(self) -> None:
+        while True:
+            with self._lock:
+                if not self._watched:
+                    self._thread = None
+                    return
+                watched = dict(self._watched)
+            frames = sys._current_frames()
+            for thread_id, samples in watched.items():
+                frame = frames.get(thread_id)
+                if frame is not None:
+                    samples[_fold(frame)] += 1
+            time.sleep(self.interval)
+
+
+def _fold(frame) -> str:
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+        frame = frame.f_back
+    return ";".join(reversed(stack))
+
+
+class Instrumentation:
+    def __init__(self):
+        self.enabled = False
+        self.profiler = None
+        self.profile_dir = None
+        self.slow_seconds = None
+        self._endpoints = defaultdict(_Endpoint)
+        self._lock = threading.Lock()
+
+    def init_app(self, app, db) -> None:
+        """Hook into app + db.engine when METRICS_ENABLED is set. Reads
+        PROFILE_SLOW_MS / PROFILE_INTERVAL_MS / PROFILE_DIR for the profiler."""
+        if not app.config.get("METRICS_ENABLED"):
+            return
+        self.enabled = True
+        with app.app_context():
+            db.event.listen(db.engine, "before_cursor_execute", self._before_cursor)
+            db.event.listen(db.engine, "after_cursor_execute", self._after_cursor)
+        before_render_template.connect(self._before_render, app)
+        template_rendered.connect(self._after_render, app)
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+
+        slow_ms = app.config.get("PROFILE_SLOW_MS")
+        if slow_ms:
+            self.slow_seconds = float(slow_ms) / 1000
+            self.profiler = SamplingProfiler(float(app.config.get("PROFILE_INTERVAL_MS", 5)) / 1000)
+            self.profile_dir = app.config.get("PROFILE_DIR") or os.path.join(app.instance_path, "profiles")
+
+    # -------- hooks --------
+
+    def _before_cursor(self, conn, cursor, statement, parameters, context, executemany):
+        if _current() is not None:
+            conn.info.setdefault("metrics_started", []).append(time.perf_counter())
+
+    def _after_cursor(self, conn, cursor, statement, parameters, context, executemany):
+        rec = _current()
+        started = conn.info.get("metrics_started")
+        if rec is not None and started:
+            rec.queries += 1
+            rec.sql += time.perf_counter() - started.pop()
+
+    def _before_render(self, sender, template, context, **extra):
+        rec = _current()
+        if rec is not None:
+            rec.render_stack.append(time.perf_counter())
+
+    def _after_render(self, sender, template, context, **extra):
+        rec = _current()
+        if rec is not None and rec.render_stack:
+            started = rec.render_stack.pop()
+            if not rec.render_stack:  # don't count nested renders twice
+                rec.render += time.perf_counter() - started
+
+    def _before_request(self):
+        rec = g._metrics = _Request()
+        if self.profiler is not None:
+            rec.samples = self.profiler.watch(threading.get_ident())
+
+    def _after_request(self, response):
+        rec = g.pop("_metrics", None)
+        if rec is None:
+            return response
+        seconds = time.perf_counter() - rec.started
+        cpu = time.thread_time() - rec.cpu_started
+        endpoint = request.endpoint or "unmatched"
+
+        with self._lock:
+            e = self._endpoints[endpoint]
+            e.requests += 1
+            e.queries += rec.queries
+            e.sql += rec.sql
+            e.render += rec.render
+            e.cpu += cpu
+            e.seconds += seconds
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    e.buckets[i] += 1
+
+        response.headers["Server-Timing"] = ", ".join([
+            f'db;dur={rec.sql * 1000:.2f};desc="{rec.queries} queries"',
+            f"render;dur={rec.render * 1000:.2f}",
+            f"cpu;dur={cpu * 1000:.2f}",
+            f"total;dur={seconds * 1000:.2f}",
+        ])
+
+        if rec.samples is not None:
+            self.profiler.unwatch(threading.get_ident())
+            if seconds >= self.slow_seconds and rec.samples:
+                self._dump_profile(endpoint, seconds, rec.samples)
+        return response
+
+    def _dump_profile(self, endpoint: str, seconds: float, samples: Counter) -> None:
+        os.makedirs(self.profile_dir, exist_ok=True)
+        path = os.path.join(self.profile_dir, f"{time.strftime('%Y%m%d-%H%M%S')}-{endpoint}-{seconds * 1000:.0f}ms.folded")
+        with open(path, "w") as f:
+            for stack, count in samples.most_common():
+                f.write(f"{stack} {count}\n")
+        log.info("slow request %s (%.0f ms), stacks in %s", endpoint, seconds * 1000, path)
+
+    # -------- reading --------
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {name: {"requests": e.requests, "queries": e.queries, "sql": e.sql,
+                           "render": e.render, "cpu": e.cpu, "seconds": e.seconds,
+                           "buckets": list(e.buckets)}
+                    for name, e in self._endpoints.items()}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._endpoints.clear()
+
+    def prometheus(self, extra=()) -> str:
+        """Prometheus text exposition. extra: (name, type, help, value) tuples"""
+        stats = self.snapshot()
+        lines = []
+
+        def family(name, kind, help_text, rows):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(rows)
+
+        per_endpoint = [
+            ("papertrader_requests_total", "requests", "Requests handled"),
+            ("papertrader_sql_queries_total", "queries", "SQL statements executed"),
+            ("papertrader_sql_seconds_total", "sql", "Time spent in SQL"),
+            ("papertrader_render_seconds_total", "render", "Time spent rendering templates"),
+            ("papertrader_cpu_seconds_total", "cpu", "Python CPU time of the request thread"),
+        ]
+        for name, key, help_text in per_endpoint:
+            family(name, "counter", help_text,
+                   [f'{name}{{endpoint="{ep}"}} {s[key]:g}' for ep, s in sorted(stats.items())])
+
+        rows = []
+        for ep, s in sorted(stats.items()):
+            for bound, count in zip(BUCKETS, s["buckets"]):
+                rows.append(f'papertrader_request_seconds_bucket{{endpoint="{ep}",le="{bound:g}"}} {count}')
+            rows.append(f'papertrader_request_seconds_bucket{{endpoint="{ep}",le="+Inf"}} {s["requests"]}')
+            rows.append(f'papertrader_request_seconds_sum{{endpoint="{ep}"}} {s["seconds"]:g}')
+            rows.append(f'papertrader_request_seconds_count{{endpoint="{ep}"}} {s["requests"]}')
+        family("papertrader_request_seconds", "histogram", "Request wall time", rows)
+
+        for name, kind, help_text, value in extra:
+            family(name, kind, help_text, [f"{name} {value:g}"])
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,299 @@
+"""Materialized leaderboard. Keeps every user's equity in memory and updates
+it incrementally (fills, cash changes, ticks) instead of recomputing each
+user's PnL from the DB on every page view."""
+import logging
+import threading
+import time
+from decimal import Decimal
+
+import numpy as np
+
+from models import db, User, Account, Position, Ticker
+from pnl import START_EQUITY, compute_equities
+
+log = logging.getLogger(__name__)
+
+
+def _cents(amount) -> int:
+    return int((Decimal(amount) * 100).to_integral_value())
+
+
+class Leaderboard:
+    """Ranking by equity (cash + qty * price), best first, ties by user id.
+
+    Cash and equity are NumPy int64 arrays of cents, one slot per user.
+    Holdings are indexed per ticker ({user_id: qty}, plus cached slot/qty
+    arrays), so a tick is one vectorised add per ticker that moved. Nothing is
+    kept sorted: top-K is an argpartition and "my rank" counts the users
+    ahead of you, both a few ms at 100k users. Ticks and page reads only hold
+    the lock that long, and full reloads are built outside it."""
+
+    def __init__(self, resync_seconds: float = 60.0):
+        self.resync_seconds = resync_seconds
+        self._lock = threading.RLock()
+        self._load_lock = threading.RLock()  # one load at a time
+        self._journal = None  # updates made while a load is running, replayed onto it
+        self._stop = threading.Event()
+        self._thread = None
+        self._reset_state()
+
+    @staticmethod
+    def _empty_state() -> dict:
+        return {
+            "_names": {},     # user_id -> username
+            "_slot": {},      # user_id -> index into the arrays
+            "_uids": np.zeros(0, dtype=np.int64),
+            "_cash": np.zeros(0, dtype=np.int64),    # cents
+            "_equity": np.zeros(0, dtype=np.int64),  # cents
+            "_n": 0,          # slots in use
+            "_holdings": {},  # ticker_id -> {user_id: qty}
+            "_arrays": {},    # ticker_id -> (slots, qtys), dropped when its holdings change
+            "_prices": {},    # ticker_id -> cents
+            "loaded_at": None,
+        }
+
+    def _reset_state(self) -> None:
+        self.__dict__.update(self._empty_state())
+
+    @property
+    def loaded(self) -> bool:
+        return self.loaded_at is not None
+
+    def __len__(self) -> int:
+        return self._n
+
+    # -------- loading --------
+
+    def clear(self) -> None:
+        with self._lock:
+            self._reset_state()
+
+    def load(self) -> None:
+        """Full rebuild: one query per table, equity from the set-based PnL
+        query. Built off to the side and swapped in, updates that come in
+        meanwhile are replayed on top."""
+        with self._load_lock:
+            with self._lock:
+                self._journal = []
+            try:
+                state = self._build()
+            except Exception:
+                with self._lock:
+                    self._journal = None
+                raise
+            with self._lock:
+                journal, self._journal = self._journal, None
+                self.__dict__.update(state)
+                for name, args in journal:
+                    getattr(self, name)(*args)
+
+    def _build(self) -> dict:
+        state = self._empty_state()
+        state["_prices"] = {tid: _cents(p) for tid, p in db.session.query(Ticker.id, Ticker.price)}
+        names = dict(db.session.query(User.id, User.username))
+        uids = np.fromiter(names, dtype=np.int64, count=len(names))
+        slot = {uid: i for i, uid in enumerate(names)}
+        cash = np.full(len(uids), _cents(START_EQUITY), dtype=np.int64)  # no account yet: counts as flat
+        equity = cash.copy()
+        for uid, amount in db.session.query(Account.user_id, Account.cash):
+            if uid in slot:
+                cash[slot[uid]] = _cents(amount)
+        for uid, amount in compute_equities().items():
+            if uid in slot:
+                equity[slot[uid]] = _cents(amount)
+        holdings = state["_holdings"]
+        for uid, tid, qty in db.session.query(Position.user_id, Position.ticker_id, Position.qty):
+            if qty and uid in slot:
+                holdings.setdefault(tid, {})[uid] = qty
+        state["_arrays"] = {
+            tid: (np.fromiter((slot[uid] for uid in holders), dtype=np.int64, count=len(holders)),
+                  np.fromiter(holders.values(), dtype=np.int64, count=len(holders)))
+            for tid, holders in holdings.items()
+        }
+        state.update(_names=names, _slot=slot, _uids=uids, _cash=cash, _equity=equity,
+                     _n=len(uids), loaded_at=time.monotonic())
+        return state
+
+    def ensure_loaded(self) -> None:
+        """Load on first use (later changes from other processes are picked
+        up by the resync thread, see start)"""
+        if not self.loaded:
+            with self._load_lock:  # another request may be loading it already
+                if not self.loaded:
+                    self.load()
+
+    def start(self, app) -> None:
+        """Reload from the DB every resync_seconds in a background thread, to
+        pick up changes made by other processes"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, args=(app,), name="leaderboard-resync", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self, app) -> None:
+        while not self._stop.wait(self.resync_seconds):
+            try:
+                with app.app_context():
+                    self.load()
+                    db.session.remove()
+            except Exception:
+                log.exception("leaderboard resync failed")
+
+    # -------- incremental updates --------
+
+    def _journaled(self, name: str, args) -> bool:
+        """True if a load is running, the update is then kept for it instead"""
+        if self._journal is None:
+            return False
+        self._journal.append((name, args))
+        return True
+
+    def _add_slot(self, user_id: int) -> int:
+        i = self._n
+        if i == len(self._uids):
+            size = max(16, 2 * i)
+            for attr in ("_uids", "_cash", "_equity"):
+                grown = np.zeros(size, dtype=np.int64)
+                grown[:i] = getattr(self, attr)[:i]
+                setattr(self, attr, grown)
+        self._uids[i] = user_id
+        self._slot[user_id] = i
+        self._n = i + 1
+        return i
+
+    def _drop_holdings(self, user_ids) -> None:
+        for tid, holders in self._holdings.items():
+            gone = user_ids.intersection(holders)
+            if gone:
+                for uid in gone:
+                    del holders[uid]
+                self._arrays.pop(tid, None)
+
+    def add_user(self, user_id: int, username: str, cash: Decimal = START_EQUITY) -> None:
+        with self._lock:
+            if self._journaled("add_user", (user_id, username, cash)) or not self.loaded:
+                return
+            self._names[user_id] = username
+            i = self._slot.get(user_id)
+            if i is None:
+                i = self._add_slot(user_id)
+            self._cash[i] = self._equity[i] = _cents(cash)
+
+    def set_cash(self, user_id: int, cash: Decimal) -> None:
+        with self._lock:
+            if self._journaled("set_cash", (user_id, cash)) or not self.loaded:
+                return
+            i = self._slot.get(user_id)
+            if i is None:
+                return
+            cash = _cents(cash)
+            self._equity[i] += cash - self._cash[i]
+            self._cash[i] = cash
+
+    def set_position(self, user_id: int, ticker_id: int, qty: int) -> None:
+        with self._lock:
+            if self._journaled("set_position", (user_id, ticker_id, qty)) or not self.loaded:
+                return
+            i = self._slot.get(user_id)
+            if i is None:
+                return
+            holders = self._holdings.setdefault(ticker_id, {})
+            delta = qty - holders.get(user_id, 0)
+            if qty:
+                holders[user_id] = qty
+            else:
+                holders.pop(user_id, None)
+            self._arrays.pop(ticker_id, None)
+            self._equity[i] += delta * self._prices.get(ticker_id, 0)
+
+    def reset_user(self, user_id: int, cash: Decimal = START_EQUITY) -> None:
+        """Portfolio reset: no positions, starting cash"""
+        self.reset_users([user_id], cash)
+
+    def reset_users(self, user_ids=None, cash: Decimal = START_EQUITY) -> None:
+        """reset_user for a whole cohort (None = everyone)"""
+        user_ids = None if user_ids is None else list(user_ids)
+        with self._lock:
+            if self._journaled("reset_users", (user_ids, cash)) or not self.loaded:
+                return
+            cents = _cents(cash)
+            if user_ids is None:
+                self._holdings, self._arrays = {}, {}
+                self._cash[:self._n] = cents
+                self._equity[:self._n] = cents
+                return
+            user_ids = set(user_ids).intersection(self._slot)
+            self._drop_holdings(user_ids)
+            slots = [self._slot[uid] for uid in user_ids]
+            self._cash[slots] = cents
+            self._equity[slots] = cents
+
+    def _ticker_arrays(self, ticker_id: int):
+        arrays = self._arrays.get(ticker_id)
+        if arrays is None:
+            holders = self._holdings.get(ticker_id, {})
+            slots = np.fromiter((self._slot[uid] for uid in holders), dtype=np.int64, count=len(holders))
+            qtys = np.fromiter(holders.values(), dtype=np.int64, count=len(holders))
+            arrays = self._arrays[ticker_id] = (slots, qtys)
+        return arrays
+
+    def apply_prices(self, prices: dict) -> None:
+        """New prices ({ticker_id: price}). Only holders of tickers that moved
+        are touched, one array add per ticker."""
+        with self._lock:
+            if self._journaled("apply_prices", (prices,)) or not self.loaded:
+                return
+            for tid, price in prices.items():
+                price = _cents(price)
+                old = self._prices.get(tid)
+                self._prices[tid] = price
+                if old is None or old == price or tid not in self._holdings:
+                    continue
+                slots, qtys = self._ticker_arrays(tid)
+                self._equity[slots] += qtys * (price - old)  # a user holds a ticker once, no repeats
+
+    # -------- queries --------
+
+    def _row(self, rank: int, i: int) -> dict:
+        uid = int(self._uids[i])
+        return {
+            "rank": rank,
+            "user_id": uid,
+            "username": self._names.get(uid, "?"),
+            "pnl": Decimal(int(self._equity[i])).scaleb(-2) - START_EQUITY,
+        }
+
+    def top(self, k: int) -> list:
+        with self._lock:
+            n = self._n
+            k = min(k, n)
+            if k <= 0:
+                return []
+            equity, uids = self._equity[:n], self._uids[:n]
+            if k < n:
+                # everyone at or above the k-th best equity (more than k on a tie)
+                kth = np.partition(equity, n - k)[n - k]
+                candidates = np.flatnonzero(equity >= kth)
+            else:
+                candidates = np.arange(n)
+            order = candidates[np.lexsort((uids[candidates], -equity[candidates]))][:k]
+            return [self._row(rank, int(i)) for rank, i in enumerate(order, start=1)]
+
+    def rank_of(self, user_id: int):
+        """This user's row ({rank, username, pnl}) or None"""
+        with self._lock:
+            i = self._slot.get(user_id)
+            if i is None:
+                return None
+            equity, uids = self._equity[:self._n], self._uids[:self._n]
+            mine = equity[i]
+            ahead = np.count_nonzero(equity > mine) + np.count_nonzero((equity == mine) & (uids < user_id))
+            return self._row(int(ahead) + 1, i)
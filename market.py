@@ -0,0 +1,261 @@
+"""Market clock. Moves ticker prices exactly once per tick (in one background
+thread) and publishes a versioned snapshot that request handlers read from,
+so polling endpoints never write to the DB themselves."""
+import logging
+import secrets
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, replace
+from decimal import Decimal
+
+from sqlalchemy import bindparam, event, select, update
+
+from models import db, Ticker
+from pricing import PriceEngine
+
+log = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Quote:
+    """Read-only copy of a Ticker row (safe to share between threads)"""
+    id: int
+    symbol: str
+    name: str
+    price: Decimal
+
+
+@dataclass(frozen=True)
+class PriceSnapshot:
+    """All quotes as of one market clock version"""
+    version: int
+    tickers: tuple  # Quotes sorted by symbol
+    by_symbol: dict
+    by_id: dict
+    created_at: float
+    universe: int = 0  # version where the set of tickers last changed (not just prices)
+
+    @classmethod
+    def build(cls, version: int, quotes) -> "PriceSnapshot":
+        quotes = tuple(sorted(quotes, key=lambda q: q.symbol))
+        return cls(
+            version=version,
+            tickers=quotes,
+            by_symbol={q.symbol: q for q in quotes},
+            by_id={q.id: q for q in quotes},
+            created_at=time.monotonic(),
+        )
+
+
+_SET_PRICE = (
+    update(Ticker.__table__)
+    .where(Ticker.__table__.c.id == bindparam("tid"))
+    .values(price=bindparam("new_price"))
+)
+
+
+class MarketClock:
+    """Advances prices once every `tick_seconds` and keeps the latest snapshot.
+
+    Only one process should run the clock (see `flask market-clock`). Processes
+    that don't run it still get fresh prices: `snapshot()` re-reads the Ticker
+    table at most once per tick interval."""
+
+    def __init__(self, app, tick_seconds: float = 5.0, history: int = 20, engine: PriceEngine = None):
+        self.app = app
+        self.tick_seconds = tick_seconds
+        # how prices move (see pricing.py), a plain random walk unless told otherwise
+        self.engine = engine if engine is not None else PriceEngine()
+        self._snapshot = None
+        self._version = 0
+        # versions are per process, so tokens handed to clients carry this too
+        self.epoch = secrets.token_hex(4)
+        # (version, ids of the tickers whose quote changed, or None = tickers added/removed)
+        self._history = deque(maxlen=history)
+        self._tick_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._listeners = []
+        self._stale = False
+        self._misses = (0, frozenset())  # (snapshot version, symbols it doesn't have)
+        # added/removed tickers make the snapshot (and its symbol index) stale
+        event.listen(Ticker, "after_insert", self._tickers_changed)
+        event.listen(Ticker, "after_delete", self._tickers_changed)
+
+    # -------- lifecycle --------
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="market-clock", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.tick_seconds):
+            try:
+                self.tick()
+            except Exception:
+                log.exception("market clock tick failed")
+
+    def reset(self) -> None:
+        """Forget the published snapshot (tests, DB resets)"""
+        self._snapshot = None
+        self._stale = False
+        self._history.clear()
+
+    def invalidate(self) -> None:
+        """Reload the snapshot on the next read"""
+        self._stale = True
+
+    def _tickers_changed(self, mapper, connection, target) -> None:
+        self._stale = True
+
+    def on_tick(self, fn):
+        """Register fn(snapshot) to run inside the app context after every tick"""
+        self._listeners.append(fn)
+        return fn
+
+    # -------- ticking --------
+
+    def tick(self) -> PriceSnapshot:
+        """Move every price once, commit, publish the new snapshot and run the
+        tick listeners (limit order matching etc.)."""
+        with self._tick_lock, self.app.app_context():
+            # plain rows, no ORM objects; picks up prices edited outside the clock
+            rows = db.session.execute(
+                select(Ticker.id, Ticker.symbol, Ticker.name, Ticker.price).order_by(Ticker.id)
+            ).all()
+            engine = self.engine
+            engine.sync([r.id for r in rows], [int(r.price * 100) for r in rows])
+            changed = engine.step()
+            prices = [Decimal(int(c)).scaleb(-2) for c in engine.cents]
+            if len(changed):
+                # one Core executemany for the rows that moved (the ORM bulk
+                # path costs more than the step itself at this size)
+                db.session.execute(_SET_PRICE, [
+                    {"tid": int(engine.ids[i]), "new_price": prices[i]} for i in changed
+                ])
+            db.session.commit()
+
+            snap = self._publish(
+                [Quote(r.id, r.symbol, r.name, price) for r, price in zip(rows, prices)]
+            )
+            for fn in self._listeners:
+                try:
+                    fn(snap)
+                except Exception:
+                    # one failing listener mustn't cost the others their tick
+                    log.exception("tick listener %s failed", getattr(fn, "__name__", fn))
+                    db.session.rollback()
+            db.session.remove()
+            return snap
+
+    def refresh(self) -> PriceSnapshot:
+        """Reload the snapshot from the DB (e.g. after tickers are added)"""
+        self._stale = False
+        with self.app.app_context():
+            quotes = [Quote(t.id, t.symbol, t.name, t.price) for t in Ticker.query.all()]
+            return self._publish(quotes, keep_version_if_unchanged=True)
+
+    def _publish(self, quotes, keep_version_if_unchanged: bool = False) -> PriceSnapshot:
+        prev = self._snapshot
+        if keep_version_if_unchanged and prev is not None \
+                and prev.tickers == tuple(sorted(quotes, key=lambda q: q.symbol)):
+            # nothing moved, keep the version so clients don't re-render
+            version = prev.version
+        else:
+            self._version += 1
+            version = self._version
+        snap = PriceSnapshot.build(version, quotes)
+        universe = prev.universe if prev is not None else version
+        if version != getattr(prev, "version", None):
+            changed = self._changed(prev, snap)
+            if changed is None:
+                universe = version
+            self._history.append((version, changed))
+        snap = replace(snap, universe=universe)
+        self._snapshot = snap  # single assignment, readers never see a half-built snapshot
+        return snap
+
+    @staticmethod
+    def _changed(prev, snap):
+        if prev is None or prev.by_id.keys() != snap.by_id.keys():
+            return None
+        return frozenset(tid for tid, q in snap.by_id.items() if prev.by_id[tid] != q)
+
+    # -------- reading --------
+
+    def snapshot(self) -> PriceSnapshot:
+        """Latest published prices. Never writes to the DB."""
+        snap = self._snapshot
+        if snap is None or self._stale:
+            return self.refresh()
+        if not self.running and time.monotonic() - snap.created_at >= self.tick_seconds:
+            # another process owns the clock, pick up its prices
+            return self.refresh()
+        return snap
+
+    def quotes(self, symbols) -> dict:
+        """{symbol: Quote} for the symbols that exist. Dict lookups in the
+        snapshot; symbols it doesn't know cost one IN query per version."""
+        snap = self.snapshot()
+        found, missing = {}, set()
+        for symbol in symbols:
+            quote = snap.by_symbol.get(symbol)
+            if quote is not None:
+                found[symbol] = quote
+            else:
+                missing.add(symbol)
+
+        version, known_missing = self._misses
+        if version == snap.version:
+            missing -= known_missing
+        if missing:
+            rows = Ticker.query.filter(Ticker.symbol.in_(missing)).all()
+            for t in rows:
+                found[t.symbol] = Quote(t.id, t.symbol, t.name, t.price)
+            if rows:
+                # committed by someone we didn't hear from, pick it up next read
+                self.invalidate()
+            else:
+                known = known_missing if version == snap.version else frozenset()
+                self._misses = (snap.version, known | missing)
+        return found
+
+    # -------- deltas --------
+
+    def version_token(self, snapshot: PriceSnapshot) -> str:
+        """Opaque "what I've seen" marker for clients (see changes_since)"""
+        return f"{self.epoch}.{snapshot.version}"
+
+    def changes_since(self, token):
+        """Ids of the tickers whose quote changed after the version in `token`,
+        or None if the caller needs everything again (unknown / too old token,
+        other process, tickers added or removed)."""
+        try:
+            epoch, version = token.split(".")
+            version = int(version)
+        except (AttributeError, ValueError):
+            return None
+        snap = self.snapshot()
+        if epoch != self.epoch or version > snap.version:
+            return None
+        history = list(self._history)
+        newer = [changed for v, changed in history if v > version]
+        if version < snap.version and (not history or history[0][0] > version + 1):
+            return None  # fell out of the history
+        if any(changed is None for changed in newer):
+            return None
+        return frozenset().union(*newer)
@@ -0,0 +1,70 @@
+"""Schema upgrades for databases created before a model change. create_all()
+only creates missing tables, so columns and indexes added to existing tables
+are applied here. Every step checks first, so it's safe to run on every start
+(`flask migrate-db`, or init_db())."""
+import logging
+
+from sqlalchemy import inspect, text
+from sqlalchemy.schema import CreateTable
+
+from models import db, Order
+
+log = logging.getLogger(__name__)
+
+
+def _add_column(conn, table: str, column: str, ddl: str) -> None:
+    columns = {c["name"] for c in inspect(conn).get_columns(table)}
+    if column in columns:
+        return
+    log.info("adding %s.%s", table, column)
+    conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+
+
+def _backfill_watchlist_ticker_id(conn) -> None:
+    conn.execute(text(
+        "UPDATE watchlist_item SET ticker_id = "
+        "(SELECT ticker.id FROM ticker WHERE ticker.symbol = watchlist_item.symbol) "
+        "WHERE ticker_id IS NULL"
+    ))
+    # rows the old check-then-insert let through twice, keep the first
+    conn.execute(text(
+        "DELETE FROM watchlist_item WHERE ticker_id IS NOT NULL AND id NOT IN "
+        "(SELECT MIN(id) FROM watchlist_item WHERE ticker_id IS NOT NULL GROUP BY user_id, ticker_id)"
+    ))
+
+
+def _autoincrement_order_ids(conn) -> None:
+    """SQLite hands out the ids of deleted rows again unless the table is
+    AUTOINCREMENT, and OrderBook.sync relies on new orders getting higher ids.
+    That can't be ALTERed in, so copy the table (indexes come back below)."""
+    if conn.dialect.name != "sqlite":
+        return
+    ddl = conn.execute(text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'order'")).scalar()
+    if ddl is None or "AUTOINCREMENT" in ddl.upper():
+        return
+    log.info("rebuilding order with AUTOINCREMENT ids")
+    create = str(CreateTable(Order.__table__).compile(conn)).replace('TABLE "order"', "TABLE order_new", 1)
+    columns = ", ".join(c.name for c in Order.__table__.columns)
+    conn.execute(text(create))
+    conn.execute(text(f'INSERT INTO order_new ({columns}) SELECT {columns} FROM "order"'))
+    conn.execute(text('DROP TABLE "order"'))
+    conn.execute(text('ALTER TABLE order_new RENAME TO "order"'))
+
+
+def _create_indexes(conn) -> None:
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
+
+
+def upgrade(engine=None) -> None:
+    """Bring a database up to the current models. Defaults to the app's engine
+    (call in an app context)."""
+    with (engine or db.engine).begin() as conn:
+        _add_column(conn, "watchlist_item", "ticker_id", "INTEGER REFERENCES ticker(id)")
+        _add_column(conn, "account", "version", "INTEGER NOT NULL DEFAULT 1")
+        _add_column(conn, "position", "version", "INTEGER NOT NULL DEFAULT 1")
+        _add_column(conn, "pnl_checkpoint", "version", "INTEGER NOT NULL DEFAULT 1")
+        _backfill_watchlist_ticker_id(conn)
+        _autoincrement_order_ids(conn)
+        _create_indexes(conn)
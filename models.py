@@ -33,7 +33,10 @@ class Account(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     cash = db.Column(db.Numeric(14,2), nullable=False, default=Decimal('100000.00'))
+    # bumped on every ORM update, which only applies if nobody else bumped it first (see fills.py)
+    version = db.Column(db.Integer, nullable=False, default=1)
     user = db.relationship('User', backref=db.backref('account', uselist=False))
+    __mapper_args__ = {'version_id_col': version}
 
 class Order(db.Model):
     """User class is for creating a table of Orders"""
@@ -47,6 +50,12 @@ class Order(db.Model):
     status = db.Column(db.String(12), nullable=False, default='PENDING')
     user = db.relationship('User')
     ticker = db.relationship('Ticker')
+    __table_args__ = (
+        db.Index('ix_order_user_status', 'user_id', 'status'),            # open orders page
+        db.Index('ix_order_status_type_ticker', 'status', 'order_type', 'ticker_id'),  # LMT matching
+        # never reuse ids of deleted orders: OrderBook.sync only looks near and above the last id it saw
+        {'sqlite_autoincrement': True},
+    )
 
 class Position(db.Model):
     """User class is for creating a table of Positions"""
@@ -55,14 +64,16 @@ class Position(db.Model):
     ticker_id = db.Column(db.Integer, db.ForeignKey('ticker.id'), nullable=False)
     qty = db.Column(db.Integer, nullable=False, default=0)
     avg_price = db.Column(db.Numeric(12,2), nullable=False, default=Decimal('0.00'))
+    version = db.Column(db.Integer, nullable=False, default=1)
     user = db.relationship('User')
     ticker = db.relationship('Ticker')
     __table_args__ = (db.UniqueConstraint('user_id', 'ticker_id', name='uix_user_ticker'),)
+    __mapper_args__ = {'version_id_col': version}
 
 class Trade(db.Model):
     """User class is for creating a table of Trades"""
     id = db.Column(db.Integer, primary_key=True)
-    order_id = db.Column(db.Integer, db.ForeignKey('order.id'), nullable=False)
+    order_id = db.Column(db.Integer, db.ForeignKey('order.id'), nullable=False, index=True)
     price = db.Column(db.Numeric(12,2), nullable=False)
     qty = db.Column(db.Integer, nullable=False)
     order = db.relationship('Order')
@@ -72,8 +83,15 @@ class WatchlistItem(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     symbol = db.Column(db.String(64), nullable=False)
+    # NULL when the symbol isn't a listed ticker (the watchlist shows N/A for those)
+    ticker_id = db.Column(db.Integer, db.ForeignKey('ticker.id'), nullable=True)
     user = db.relationship('User')
+    ticker = db.relationship('Ticker')
     last_notified_price = db.Column(db.Float, nullable=True)
+    __table_args__ = (
+        db.Index('uix_watch_user_ticker', 'user_id', 'ticker_id', unique=True),
+        db.Index('ix_watch_user_symbol', 'user_id', 'symbol'),
+    )
 
 class ScheduledTransaction(db.Model):
     """User class is for creating a table of Scheduled Transactions"""
@@ -91,4 +109,91 @@ class ScheduledTransaction(db.Model):
     processed_at = db.Column(db.Date, nullable=True)
 
     user = db.relationship("User")
+    __table_args__ = (
+        db.Index("ix_sched_user_status_date", "user_id", "status", "scheduled_date"),
+    )
     
+
+class PnlPoint(db.Model):
+    """User class is for creating a table of performance chart points (one per trade)"""
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False, index=True)
+    seq = db.Column(db.Integer, nullable=False)        # t = 1, 2, ... on the chart
+    trade_id = db.Column(db.Integer, nullable=False)
+    pnl = db.Column(db.Numeric(14, 2), nullable=False)
+
+class PnlCheckpoint(db.Model):
+    """User class is for creating a table of where each user's PnL series replay left off"""
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), primary_key=True)
+    last_trade_id = db.Column(db.Integer, nullable=False, default=0)
+    seq = db.Column(db.Integer, nullable=False, default=0)
+    cash = db.Column(db.Numeric(14, 2), nullable=False)
+    # {ticker_id: [qty, last trade price]} as JSON
+    holdings = db.Column(db.Text, nullable=False, default="{}")
+    # concurrent replays of the same trades: only one of them commits
+    version = db.Column(db.Integer, nullable=False, default=1)
+    __mapper_args__ = {"version_id_col": version}
+
+class PriceAlert(db.Model):
+    """User class is for creating a table of price alerts (fire once when the price crosses the threshold)"""
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+    ticker_id = db.Column(db.Integer, db.ForeignKey("ticker.id"), nullable=False)
+    direction = db.Column(db.String(5), nullable=False)      # ABOVE/BELOW
+    threshold = db.Column(db.Numeric(12, 2), nullable=False)
+    pct = db.Column(db.Numeric(6, 2), nullable=True)          # set when it was entered as a % move
+    status = db.Column(db.String(10), nullable=False, default="ACTIVE")  # ACTIVE/TRIGGERED/DELIVERED
+    triggered_price = db.Column(db.Numeric(12, 2), nullable=True)
+    ticker = db.relationship("Ticker")
+    __table_args__ = (
+        db.Index("ix_alert_user_status", "user_id", "status"),
+    )
+
+# -------- archives (cohort resets with an archive label, see cohorts.py) --------
+
+class OrderArchive(db.Model):
+    """User class is for creating a table of orders moved out by a cohort reset"""
+    id = db.Column(db.Integer, primary_key=True)
+    label = db.Column(db.String(64), nullable=False)   # e.g. "round-1", names the reset
+    archived_at = db.Column(db.DateTime, nullable=False)
+    order_id = db.Column(db.Integer, nullable=False)   # Order.id before the reset
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+    ticker_id = db.Column(db.Integer, db.ForeignKey("ticker.id"), nullable=False)
+    side = db.Column(db.String(4), nullable=False)
+    order_type = db.Column(db.String(3), nullable=False)
+    qty = db.Column(db.Integer, nullable=False)
+    limit_price = db.Column(db.Numeric(12, 2), nullable=True)
+    status = db.Column(db.String(12), nullable=False)
+    __table_args__ = (db.Index("ix_order_archive_label_user", "label", "user_id"),)
+
+class TradeArchive(db.Model):
+    """User class is for creating a table of trades moved out by a cohort reset"""
+    id = db.Column(db.Integer, primary_key=True)
+    label = db.Column(db.String(64), nullable=False)
+    archived_at = db.Column(db.DateTime, nullable=False)
+    trade_id = db.Column(db.Integer, nullable=False)
+    order_id = db.Column(db.Integer, nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+    price = db.Column(db.Numeric(12, 2), nullable=False)
+    qty = db.Column(db.Integer, nullable=False)
+    __table_args__ = (db.Index("ix_trade_archive_label_user", "label", "user_id"),)
+
+class PositionArchive(db.Model):
+    """User class is for creating a table of positions as they were at a cohort reset"""
+    id = db.Column(db.Integer, primary_key=True)
+    label = db.Column(db.String(64), nullable=False)
+    archived_at = db.Column(db.DateTime, nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+    ticker_id = db.Column(db.Integer, db.ForeignKey("ticker.id"), nullable=False)
+    qty = db.Column(db.Integer, nullable=False)
+    avg_price = db.Column(db.Numeric(12, 2), nullable=False)
+    __table_args__ = (db.Index("ix_position_archive_label_user", "label", "user_id"),)
+
+class AccountArchive(db.Model):
+    """User class is for creating a table of cash balances as they were at a cohort reset"""
+    id = db.Column(db.Integer, primary_key=True)
+    label = db.Column(db.String(64), nullable=False)
+    archived_at = db.Column(db.DateTime, nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+    cash = db.Column(db.Numeric(14, 2), nullable=False)
+    __table_args__ = (db.Index("ix_account_archive_label_user", "label", "user_id"),)
@@ -0,0 +1,156 @@
+"""Financial news ingestion. A background worker polls the RSS feeds on a
+schedule (conditional GETs, feeds fetched concurrently) into a deduplicated
+in-memory store, so /news/tiles never waits on outbound HTTP."""
+import logging
+import re
+import threading
+from calendar import timegm
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import feedparser
+
+log = logging.getLogger(__name__)
+
+NEWS_FEEDS = [
+    {
+        "source": "MarketWatch",
+        "url": "https://feeds.marketwatch.com/marketwatch/topstories/"
+    }
+]
+
+
+def _strip_html(text: str) -> str:
+    if not text:
+        return ""
+    return re.sub(r"<.*?>", "", text)
+
+
+def normalize_entry(source: str, entry) -> dict:
+    """One feed entry -> the dict _news_tiles.html renders"""
+    summary_raw = entry.get("summary") or entry.get("description") or ""
+    summary_clean = _strip_html(summary_raw).strip()
+    if len(summary_clean) > 260:
+        summary_clean = summary_clean[:257] + "..."
+
+    published_parsed = entry.get("published_parsed")
+    return {
+        "key": entry.get("id") or entry.get("link") or (entry.get("title") or "").strip(),
+        "source": source,
+        "title": (entry.get("title") or "").strip(),
+        "summary": summary_clean,
+        "link": entry.get("link"),
+        "published": entry.get("published", ""),
+        "published_ts": timegm(published_parsed) if published_parsed else 0,
+    }
+
+
+class NewsStore:
+    """Deduplicated articles, newest first. `version` changes whenever the
+    content does (used as the ETag)."""
+
+    def __init__(self, max_articles: int = 500):
+        self.max_articles = max_articles
+        self._lock = threading.Lock()
+        self._articles = {}  # key -> article
+        self._ordered = []
+        self.version = 0
+        self.updated_at = None  # last successful poll (UTC datetime)
+
+    def add(self, articles) -> int:
+        """Insert/refresh articles, returns how many were new"""
+        added = 0
+        with self._lock:
+            changed = False
+            for article in articles:
+                key = article["key"]
+                if not key:
+                    continue
+                old = self._articles.get(key)
+                if old is None:
+                    added += 1
+                if old != article:
+                    self._articles[key] = article
+                    changed = True
+            if changed:
+                ordered = sorted(self._articles.values(), key=lambda a: -a["published_ts"])
+                self._ordered = ordered[:self.max_articles]
+                self._articles = {a["key"]: a for a in self._ordered}
+                self.version += 1
+        return added
+
+    def touch(self) -> None:
+        self.updated_at = datetime.utcnow()
+
+    def articles(self) -> list:
+        return self._ordered
+
+    def clear(self) -> None:
+        with self._lock:
+            self._articles = {}
+            self._ordered = []
+            self.version += 1
+            self.updated_at = None
+
+
+class NewsIngestor:
+    """Polls `feeds` every `interval` seconds in a background thread"""
+
+    def __init__(self, store: NewsStore, feeds=None, interval: float = 300.0, per_feed_limit: int = 40):
+        self.store = store
+        self.feeds = feeds if feeds is not None else NEWS_FEEDS
+        self.interval = interval
+        self.per_feed_limit = per_feed_limit
+        self._validators = {}  # url -> {"etag": ..., "modified": ...}
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        with self._lock:
+            if self.running:
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="news-ingestor", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        while True:
+            try:
+                self.poll_once()
+            except Exception:
+                log.exception("news poll failed")
+            if self._stop.wait(self.interval):
+                return
+
+    def _fetch(self, feed) -> list:
+        url = feed["url"]
+        validators = self._validators.get(url, {})
+        parsed = feedparser.parse(url, etag=validators.get("etag"), modified=validators.get("modified"))
+        if parsed.get("status") == 304:
+            return []  # not modified since the last poll
+        if parsed.get("bozo") and not parsed.entries:
+            log.warning("news feed %s failed: %s", url, parsed.get("bozo_exception"))
+            return []
+        self._validators[url] = {"etag": parsed.get("etag"), "modified": parsed.get("modified")}
+        return [normalize_entry(feed["source"], e) for e in parsed.entries[:self.per_feed_limit]]
+
+    def poll_once(self) -> int:
+        """Fetch every feed concurrently and merge into the store"""
+        if not self.feeds:
+            return 0
+        with ThreadPoolExecutor(max_workers=min(8, len(self.feeds))) as pool:
+            results = list(pool.map(self._fetch, self.feeds))
+        added = self.store.add(a for articles in results for a in articles)
+        self.store.touch()
+        return added
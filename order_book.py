@@ -0,0 +1,118 @@
+"""In-memory limit order book. Resting LMT orders are kept per ticker in two
+heaps keyed by limit price, so a tick only touches the orders it crossed."""
+import heapq
+import itertools
+import threading
+from decimal import Decimal
+
+from models import db, Order
+
+# ids can become visible out of order (Postgres: concurrent transactions commit
+# out of sequence order), so sync re-scans this many ids below the highest seen
+SYNC_LOOKBACK = 1000
+
+
+class _Book:
+    """One ticker: buys in a max-heap on limit, sells in a min-heap"""
+
+    def __init__(self):
+        self.bids = []  # (-limit, seq, order_id)
+        self.asks = []  # (limit, seq, order_id)
+
+
+class OrderBook:
+    """Price-indexed view of every PENDING LMT order.
+
+    The DB is still the source of truth. Entries can go stale (orders
+    cancelled or deleted elsewhere) so callers re-check the status of whatever
+    `pop_crossed` hands back."""
+
+    def __init__(self, lookback: int = SYNC_LOOKBACK):
+        self.lookback = lookback
+        self._books = {}  # ticker_id -> _Book
+        self._live = set()  # order ids currently resting in a heap
+        self._seq = itertools.count()
+        self._last_seen_id = 0
+        self._lock = threading.Lock()
+        self.loaded = False
+
+    def __len__(self) -> int:
+        return len(self._live)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._books.clear()
+            self._live.clear()
+            self._last_seen_id = 0
+            self.loaded = False
+
+    def load(self) -> None:
+        """Rebuild from the DB (at startup, or after a reset)"""
+        self.clear()
+        self.sync()
+        self.loaded = True
+
+    def sync(self) -> None:
+        """Pick up LMT orders placed since the last sync, including ones
+        placed by other processes. Scans ids above the highest one seen, minus
+        `lookback` for orders that committed after a higher id did."""
+        since = max(0, self._last_seen_id - self.lookback)
+        rows = (
+            db.session.query(Order.id, Order.ticker_id, Order.side, Order.limit_price)
+            .filter(Order.id > since,
+                    Order.status == 'PENDING', Order.order_type == 'LMT')
+            .order_by(Order.id)
+            .all()
+        )
+        for order_id, ticker_id, side, limit_price in rows:
+            self.add(order_id, ticker_id, side, limit_price)  # skips the ones already resting
+
+    def add(self, order_id: int, ticker_id: int, side: str, limit_price: Decimal) -> None:
+        if limit_price is None:
+            return
+        with self._lock:
+            self._last_seen_id = max(self._last_seen_id, order_id)
+            if order_id in self._live:
+                return
+            book = self._books.setdefault(ticker_id, _Book())
+            if side == 'BUY':
+                heapq.heappush(book.bids, (-limit_price, next(self._seq), order_id))
+            else:
+                heapq.heappush(book.asks, (limit_price, next(self._seq), order_id))
+            self._live.add(order_id)
+
+    def restore(self, order_ids) -> None:
+        """Put popped orders back if they're still PENDING (their fill failed)"""
+        order_ids = list(order_ids)
+        rows = (
+            db.session.query(Order.id, Order.ticker_id, Order.side, Order.limit_price)
+            .filter(Order.id.in_(order_ids), Order.status == 'PENDING', Order.order_type == 'LMT')
+            .all()
+        )
+        for order_id, ticker_id, side, limit_price in rows:
+            self.add(order_id, ticker_id, side, limit_price)
+
+    def discard(self, order_ids) -> None:
+        """Forget orders (cancelled/deleted). The heap entries are dropped lazily."""
+        with self._lock:
+            self._live.difference_update(order_ids)
+
+    def pop_crossed(self, ticker_id: int, price: Decimal) -> list:
+        """Remove and return the ids of every order this price crosses:
+        buys with limit >= price and sells with limit <= price."""
+        book = self._books.get(ticker_id)
+        if book is None:
+            return []
+        crossed = []
+        with self._lock:
+            while book.bids and -book.bids[0][0] >= price:
+                _, _, order_id = heapq.heappop(book.bids)
+                if order_id in self._live:
+                    self._live.remove(order_id)
+                    crossed.append(order_id)
+            while book.asks and book.asks[0][0] <= price:
+                _, _, order_id = heapq.heappop(book.asks)
+                if order_id in self._live:
+                    self._live.remove(order_id)
+                    crossed.append(order_id)
+        return crossed
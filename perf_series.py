@@ -0,0 +1,185 @@
+"""Per-user PnL time series for the performance chart. Points are persisted
+and appended after each fill, replaying only the trades newer than the
+user's checkpoint (instead of every trade on every page load)."""
+import base64
+import io
+import json
+import threading
+from collections import OrderedDict
+from decimal import Decimal
+
+import matplotlib
+matplotlib.use("Agg")  # non-GUI backend
+import matplotlib.pyplot as plt
+
+from sqlalchemy import insert
+
+from fills import with_retry
+from models import db, Order, Trade, PnlPoint, PnlCheckpoint
+from pnl import START_EQUITY
+
+
+def update_series(user_ids) -> int:
+    """Append points for every trade newer than each user's checkpoint.
+    A few bulk queries and one commit for any number of users.
+    Returns how many points were added."""
+    user_ids = set(user_ids)
+    if not user_ids:
+        return 0
+    # checkpoints are versioned: if another request replayed the same trades
+    # first, this attempt rolls back and finds nothing left to do
+    return with_retry(lambda: _append_points(user_ids))
+
+
+def _append_points(user_ids) -> int:
+    checkpoints = {
+        cp.user_id: cp
+        for cp in PnlCheckpoint.query.filter(PnlCheckpoint.user_id.in_(user_ids))
+    }
+    since = min((checkpoints[uid].last_trade_id if uid in checkpoints else 0) for uid in user_ids)
+
+    rows = (
+        db.session.query(Trade.id, Trade.price, Trade.qty, Order.user_id, Order.ticker_id, Order.side)
+        .join(Order, Trade.order_id == Order.id)
+        .filter(Order.user_id.in_(user_ids), Trade.id > since)
+        .order_by(Trade.id)
+        .all()
+    )
+    if not rows:
+        return 0
+
+    state = {}  # user_id -> [checkpoint, holdings dict]
+    points = []
+    for trade_id, price, qty, user_id, ticker_id, side in rows:
+        if user_id not in state:
+            cp = checkpoints.get(user_id)
+            if cp is None:
+                cp = PnlCheckpoint(user_id=user_id, last_trade_id=0, seq=0, cash=START_EQUITY, holdings="{}")
+                db.session.add(cp)
+            holdings = {int(tid): [q, Decimal(p)] for tid, (q, p) in json.loads(cp.holdings).items()}
+            state[user_id] = [cp, holdings]
+        cp, holdings = state[user_id]
+        if trade_id <= cp.last_trade_id:
+            continue
+
+        price = Decimal(price)
+        held = holdings.setdefault(ticker_id, [0, price])
+        if side == "BUY":
+            cp.cash = Decimal(cp.cash) - price * qty
+            held[0] += qty
+        elif side == "SELL":
+            cp.cash = Decimal(cp.cash) + price * qty
+            held[0] -= qty
+        held[1] = price
+
+        equity = Decimal(cp.cash) + sum(q * p for q, p in holdings.values())
+        cp.seq += 1
+        cp.last_trade_id = trade_id
+        points.append({"user_id": user_id, "seq": cp.seq, "trade_id": trade_id,
+                       "pnl": (equity - START_EQUITY).quantize(Decimal("0.01"))})
+
+    for cp, holdings in state.values():
+        cp.holdings = json.dumps({tid: [q, str(p)] for tid, (q, p) in holdings.items()})
+    if points:
+        db.session.execute(insert(PnlPoint), points)
+    db.session.commit()
+    return len(points)
+
+
+def catch_up_series(chunk: int = 500) -> int:
+    """update_series for every user with trades their series hasn't seen
+    (at startup: trades from before the series existed, or from a process
+    that died between the fill and its update_series)"""
+    behind = [
+        uid for (uid,) in db.session.query(Order.user_id)
+        .join(Trade, Trade.order_id == Order.id)
+        .outerjoin(PnlCheckpoint, PnlCheckpoint.user_id == Order.user_id)
+        .filter(Trade.id > db.func.coalesce(PnlCheckpoint.last_trade_id, 0))
+        .distinct()
+    ]
+    return sum(update_series(behind[i:i + chunk]) for i in range(0, len(behind), chunk))
+
+
+def load_series(user_id: int):
+    """(last_trade_id, [(seq, pnl), ...]) for the chart. Read-only: points are
+    appended where the trades are written (update_series after each fill)."""
+    rows = (
+        db.session.query(PnlPoint.seq, PnlPoint.pnl, PnlPoint.trade_id)
+        .filter_by(user_id=user_id)
+        .order_by(PnlPoint.seq)
+        .all()
+    )
+    last_trade_id = rows[-1][2] if rows else 0
+    return last_trade_id, [(seq, pnl) for seq, pnl, _ in rows]
+
+
+def delete_series(user_ids) -> None:
+    """Drop points + checkpoints (portfolio reset). Caller commits."""
+    user_ids = list(user_ids)
+    PnlPoint.query.filter(PnlPoint.user_id.in_(user_ids)).delete(synchronize_session=False)
+    PnlCheckpoint.query.filter(PnlCheckpoint.user_id.in_(user_ids)).delete(synchronize_session=False)
+    chart_cache.invalidate(user_ids)
+
+
+class ChartCache:
+    """Small LRU of rendered PNGs keyed by (user_id, last_trade_id)"""
+
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = maxsize
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._items:
+                return None
+            self._items.move_to_end(key)
+            return self._items[key]
+
+    def put(self, key, value) -> None:
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def invalidate(self, user_ids) -> None:
+        user_ids = set(user_ids)
+        with self._lock:
+            for key in [k for k in self._items if k[0] in user_ids]:
+                del self._items[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+
+
+chart_cache = ChartCache()
+
+
+def chart_png_b64(user_id: int, last_trade_id: int, points) -> str:
+    """Base64 PNG of the series, rendered at most once per new trade"""
+    key = (user_id, last_trade_id)
+    cached = chart_cache.get(key)
+    if cached is not None:
+        return cached
+
+    xs = [seq for seq, _ in points]
+    ys = [float(pnl) for _, pnl in points]
+
+    # Build matplotlib figure into PNG in memory
+    fig, ax = plt.subplots(figsize=(6, 3))
+    ax.plot(xs, ys, marker="o", linewidth=1.5)
+    ax.axhline(0, linewidth=0.8)
+    ax.set_title("Portfolio PnL vs Trades")
+    ax.set_xlabel("Trade # (t)")
+    ax.set_ylabel("PnL ($)")
+    fig.tight_layout()
+
+    buf = io.BytesIO()
+    fig.savefig(buf, format="png")
+    plt.close(fig)
+
+    img_b64 = base64.b64encode(buf.getvalue()).decode("ascii")
+    chart_cache.put(key, img_b64)
+    return img_b64
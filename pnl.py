@@ -0,0 +1,45 @@
+"""Set-based PnL. Equity (cash + SUM(qty * price)) for one user or many in a
+single SQL statement, instead of walking positions and lazy-loading tickers."""
+from decimal import Decimal
+
+from sqlalchemy import func, select, type_coerce
+
+from models import db, Account, Position, Ticker
+
+START_EQUITY = Decimal("100000.00")
+
+MONEY = db.Numeric(14, 2)
+
+
+def equity_statement(user_ids=None):
+    """SELECT user_id, cash + marked-to-market holdings, one row per account"""
+    holdings = (
+        select(
+            Position.user_id.label("user_id"),
+            func.sum(Position.qty * Ticker.price).label("value"),
+        )
+        .join(Ticker, Ticker.id == Position.ticker_id)
+        .group_by(Position.user_id)
+    )
+    if user_ids is not None:
+        holdings = holdings.where(Position.user_id.in_(user_ids))
+    holdings = holdings.subquery()
+
+    equity = type_coerce(Account.cash + func.coalesce(holdings.c.value, 0), MONEY)
+    stmt = (
+        select(Account.user_id, equity.label("equity"))
+        .outerjoin(holdings, holdings.c.user_id == Account.user_id)
+    )
+    if user_ids is not None:
+        stmt = stmt.where(Account.user_id.in_(user_ids))
+    return stmt
+
+
+def compute_equities(user_ids=None) -> dict:
+    """{user_id: equity} for the given users (everyone with an account if None)"""
+    return {uid: Decimal(eq) for uid, eq in db.session.execute(equity_statement(user_ids))}
+
+
+def compute_pnls(user_ids=None) -> dict:
+    """{user_id: PnL vs the starting cash}"""
+    return {uid: eq - START_EQUITY for uid, eq in compute_equities(user_ids).items()}
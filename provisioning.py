@@ -0,0 +1,251 @@
+"""Bulk user provisioning (classes, competitions): thousands of users + their
+starting accounts from a CSV or JSON file in one go.
+
+Password hashing is the slow part (werkzeug's default is deliberately
+expensive), so it's spread over a process pool. Users and Accounts are then
+inserted with executemany batches, all in one transaction. Usernames that
+already exist are skipped, so re-running an import is safe; existing users
+that never got an Account get one.
+
+Imports through the admin API run as ImportJobs in a background thread, so
+a big file doesn't hold a request open for minutes."""
+import csv
+import io
+import json
+import logging
+import multiprocessing
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from decimal import Decimal, InvalidOperation
+
+from sqlalchemy import insert, select
+from werkzeug.security import generate_password_hash
+
+from models import db, User, Account
+from pnl import START_EQUITY
+
+log = logging.getLogger(__name__)
+
+# below this many passwords a pool costs more than it saves
+POOL_MIN = 16
+
+
+class ProvisioningError(ValueError):
+    """The input can't be imported (bad format / missing fields)"""
+
+
+@dataclass
+class ProvisionReport:
+    created: list = field(default_factory=list)  # (user_id, username, cash) per new user
+    skipped: int = 0       # already there, or repeated in the input
+    accounts_added: int = 0  # existing users that had no Account yet
+    hash_seconds: float = 0.0
+    seconds: float = 0.0
+
+    @property
+    def users_per_sec(self) -> float:
+        return len(self.created) / self.seconds if self.seconds > 0 else 0.0
+
+
+def read_users(data, fmt: str = None) -> list:
+    """[{'username', 'password', 'cash'?}] from CSV (with a header row) or JSON
+    (a list, or {"users": [...]}). data: text, bytes or a file object."""
+    if hasattr(data, "read"):
+        data = data.read()
+    if isinstance(data, bytes):
+        data = data.decode("utf-8-sig")
+    if fmt is None:
+        fmt = "json" if data.lstrip()[:1] in ("[", "{") else "csv"
+
+    if fmt == "json":
+        try:
+            rows = json.loads(data)
+        except ValueError as exc:
+            raise ProvisioningError(f"invalid JSON: {exc}") from exc
+        if isinstance(rows, dict):
+            rows = rows.get("users")
+        if not isinstance(rows, list) or not all(isinstance(r, dict) for r in rows):
+            raise ProvisioningError('expected a list of {"username", "password"} objects')
+    elif fmt == "csv":
+        reader = csv.DictReader(io.StringIO(data))
+        if not reader.fieldnames or not {"username", "password"} <= {f.strip() for f in reader.fieldnames}:
+            raise ProvisioningError("CSV needs a header row with username and password columns")
+        rows = [{(k or "").strip(): v for k, v in row.items()} for row in reader]
+    else:
+        raise ProvisioningError(f"unknown format {fmt!r}")
+
+    users = []
+    for n, row in enumerate(rows, start=1):
+        username = str(row.get("username") or "").strip()
+        password = str(row.get("password") or "").strip()
+        if not username or not password:
+            raise ProvisioningError(f"row {n}: username and password are required")
+        try:
+            cash = Decimal(str(row["cash"])).quantize(Decimal("0.01")) if row.get("cash") not in (None, "") else START_EQUITY
+        except InvalidOperation as exc:
+            raise ProvisioningError(f"row {n}: bad cash {row['cash']!r}") from exc
+        users.append({"username": username, "password": password, "cash": cash})
+    return users
+
+
+def hash_passwords(passwords, workers: int = None, progress=None) -> list:
+    """generate_password_hash for each, in order, on `workers` processes"""
+    passwords = list(passwords)
+    total = len(passwords)
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1 or total < POOL_MIN:
+        hashes = []
+        for pw in passwords:
+            hashes.append(generate_password_hash(pw))
+            if progress and len(hashes) % 100 == 0:
+                progress("hashed", len(hashes), total)
+    else:
+        chunksize = max(1, min(64, total // (workers * 4)))
+        # spawn, not fork: the web process has the clock / news threads running
+        ctx = multiprocessing.get_context("spawn")
+        hashes = []
+        with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+            for h in pool.map(generate_password_hash, passwords, chunksize=chunksize):
+                hashes.append(h)
+                if progress and len(hashes) % 100 == 0:
+                    progress("hashed", len(hashes), total)
+    if progress:
+        progress("hashed", total, total)
+    return hashes
+
+
+def _existing(usernames, chunk: int = 500) -> dict:
+    """{username: (user_id, has_account)} for the ones already in the DB"""
+    found = {}
+    usernames = list(usernames)
+    for i in range(0, len(usernames), chunk):
+        rows = db.session.execute(
+            select(User.id, User.username, Account.id)
+            .outerjoin(Account, Account.user_id == User.id)
+            .where(User.username.in_(usernames[i:i + chunk]))
+        )
+        for uid, name, account_id in rows:
+            found[name] = (uid, account_id is not None)
+    return found
+
+
+def provision(users, workers: int = None, batch_size: int = 1000, progress=None) -> ProvisionReport:
+    """Create the users from read_users() that don't exist yet, with their
+    Accounts, in one transaction. progress(stage, done, total) is called as
+    it goes. Raises (and rolls back) on a conflicting concurrent insert,
+    running it again then picks up where it left off."""
+    started = time.perf_counter()
+    report = ProvisionReport()
+
+    unique = {}
+    for user in users:
+        if user["username"] in unique:
+            report.skipped += 1
+        else:
+            unique[user["username"]] = user
+    existing = _existing(unique)
+
+    missing_accounts = [
+        {"user_id": uid, "cash": unique[name]["cash"]}
+        for name, (uid, has_account) in existing.items() if not has_account
+    ]
+    new = [u for name, u in unique.items() if name not in existing]
+    report.skipped += len(existing)
+
+    hash_started = time.perf_counter()
+    hashes = hash_passwords((u["password"] for u in new), workers=workers, progress=progress)
+    report.hash_seconds = time.perf_counter() - hash_started
+
+    try:
+        for i in range(0, len(new), batch_size):
+            batch = new[i:i + batch_size]
+            ids = db.session.scalars(
+                insert(User).returning(User.id, sort_by_parameter_order=True),
+                [{"username": u["username"], "password_hash": h}
+                 for u, h in zip(batch, hashes[i:i + batch_size])],
+            ).all()
+            db.session.execute(insert(Account), [
+                {"user_id": uid, "cash": u["cash"]} for uid, u in zip(ids, batch)
+            ])
+            report.created.extend((uid, u["username"], u["cash"]) for uid, u in zip(ids, batch))
+            if progress:
+                progress("inserted", len(report.created), len(new))
+        if missing_accounts:
+            db.session.execute(insert(Account), missing_accounts)
+            report.accounts_added = len(missing_accounts)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    report.seconds = time.perf_counter() - started
+    return report
+
+
+@dataclass
+class ImportJob:
+    id: str
+    total: int
+    state: str = "queued"   # queued / running / done / failed
+    stage: str = None       # "hashed" / "inserted", from provision's progress
+    done: int = 0
+    report: ProvisionReport = None
+    error: str = None
+
+    def to_dict(self) -> dict:
+        out = {"id": self.id, "state": self.state, "total": self.total, "stage": self.stage, "done": self.done}
+        if self.report is not None:
+            out.update(created=len(self.report.created), skipped=self.report.skipped,
+                       accounts_added=self.report.accounts_added, seconds=round(self.report.seconds, 3))
+        if self.error is not None:
+            out["error"] = self.error
+        return out
+
+
+class ImportJobs:
+    """provision() in a background thread per import, with its progress kept
+    in memory for a status endpoint. Per process: ask the worker that took
+    the upload (or use `flask provision-users` for big files)."""
+
+    def __init__(self, keep: int = 50):
+        self.keep = keep
+        self._jobs = OrderedDict()  # id -> ImportJob, oldest first
+        self._lock = threading.Lock()
+
+    def start(self, app, users, workers: int = None, on_done=None) -> ImportJob:
+        """on_done(report) runs in the job's thread after the commit"""
+        job = ImportJob(secrets.token_hex(8), total=len(users))
+        with self._lock:
+            self._jobs[job.id] = job
+            while len(self._jobs) > self.keep:
+                self._jobs.popitem(last=False)
+        threading.Thread(target=self._run, args=(app, job, users, workers, on_done),
+                         name=f"import-{job.id}", daemon=True).start()
+        return job
+
+    def get(self, job_id: str):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    @staticmethod
+    def _run(app, job, users, workers, on_done) -> None:
+        def progress(stage, done, total):
+            job.stage, job.done = stage, done
+
+        job.state = "running"
+        try:
+            with app.app_context():
+                job.report = provision(users, workers=workers, progress=progress)
+                db.session.remove()
+            if on_done:
+                on_done(job.report)
+            job.state = "done"
+        except Exception as exc:
+            log.exception("import %s failed", job.id)
+            job.error = str(exc)
+            job.state = "failed"
@@ -0,0 +1,21 @@
+"""Date-driven jobs. A DailyJob runs its function at most once per calendar
+day; the market clock checks it on every tick, which is just a date compare."""
+import threading
+from datetime import date
+
+
+class DailyJob:
+    def __init__(self, fn):
+        self.fn = fn
+        self.last_run = None
+        self._lock = threading.Lock()
+
+    def run_if_due(self, today: date = None) -> bool:
+        """Run fn(today) if it hasn't run yet today (day rollover / startup catch-up)"""
+        today = today or date.today()
+        with self._lock:
+            if self.last_run == today:
+                return False
+            self.fn(today)
+            self.last_run = today
+            return True
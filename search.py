@@ -0,0 +1,99 @@
+"""Ticker search for the dashboard's search box (one request per keystroke).
+
+Symbols and the words of each company name sit in sorted lists, so a query is
+a bisect plus a walk over the matching range, stopping once `limit` results
+are in. Ranked: exact symbol, then symbols starting with the query, then
+names with a word starting with every word of the query ("app" -> Apple Inc.,
+"micro dev" -> Advanced Micro Devices). Case-insensitive."""
+import re
+import threading
+from bisect import bisect_left
+
+_WORD = re.compile(r"[A-Z0-9]+")
+
+
+def _words(text) -> list:
+    return _WORD.findall((text or "").upper())
+
+
+class SearchIndex:
+    """Immutable index over a set of quotes (anything with id/symbol/name)"""
+
+    def __init__(self, quotes):
+        pairs = sorted((q.symbol.upper(), q.id) for q in quotes)
+        self._symbols = [s for s, _ in pairs]
+        self._symbol_ids = [i for _, i in pairs]
+
+        name_words = {q.id: set(_words(q.name)) for q in quotes}
+        # " APPLE INC": "does a word start with X" is then a C-level `" X" in text`
+        self._name_text = {i: " " + " ".join(words) for i, words in name_words.items()}
+        postings = sorted((w, i) for i, words in name_words.items() for w in words)
+        self._words = [w for w, _ in postings]
+        self._word_ids = [i for _, i in postings]
+
+    def __len__(self) -> int:
+        return len(self._symbols)
+
+    def search(self, query: str, limit: int = 20) -> list:
+        """Ids of the best `limit` matches, best first"""
+        query = (query or "").strip().upper()
+        if not query or limit <= 0:
+            return []
+        found, seen = [], set()
+
+        # exact symbol sorts first in its own prefix range
+        for k in range(bisect_left(self._symbols, query), len(self._symbols)):
+            if len(found) >= limit or not self._symbols[k].startswith(query):
+                break
+            found.append(self._symbol_ids[k])
+            seen.add(self._symbol_ids[k])
+
+        words = sorted(set(_words(query)), key=len, reverse=True)
+        if not words:
+            return found
+        # walk the most selective (longest) word's range, check the others per name
+        first = words[0]
+        needles = [" " + w for w in words[1:]]
+        for k in range(bisect_left(self._words, first), len(self._words)):
+            if len(found) >= limit or not self._words[k].startswith(first):
+                break
+            i = self._word_ids[k]
+            if i in seen:
+                continue
+            text = self._name_text[i]
+            for needle in needles:
+                if needle not in text:
+                    break
+            else:
+                found.append(i)
+                seen.add(i)
+        return found
+
+
+class TickerSearch:
+    """Search over the market clock's tickers. The index is rebuilt only when
+    tickers are added or removed; prices come from the current snapshot."""
+
+    def __init__(self, clock, limit: int = 20):
+        self.clock = clock
+        self.limit = limit
+        self._index = None
+        self._universe = None
+        self._lock = threading.Lock()
+
+    def search(self, query: str, limit: int = None) -> list:
+        """Quotes for the best matches, best first"""
+        snap = self.clock.snapshot()
+        universe = snap.universe
+        index = self._index
+        if index is None or self._universe != universe:
+            with self._lock:
+                if self._index is None or self._universe != universe:
+                    self._index = SearchIndex(snap.tickers)
+                    self._universe = universe
+                index = self._index
+        ids = index.search(query, self.limit if limit is None else limit)
+        return [snap.by_id[i] for i in ids if i in snap.by_id]
+
+    def clear(self) -> None:
+        self._index = None
@@ -0,0 +1,67 @@
+"""Database engine selection. DATABASE_URL picks the backend (SQLite file by
+default, or Postgres), and each backend gets its own pool / connection
+settings. SQLite runs in WAL mode so readers don't block the clock's writes."""
+import os
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+DEFAULT_URL = "sqlite:///paper.db"
+
+
+def database_url(environ=os.environ) -> str:
+    url = environ.get("DATABASE_URL") or DEFAULT_URL
+    if url.startswith("postgres://"):  # the old scheme some hosts still hand out
+        url = "postgresql://" + url[len("postgres://"):]
+    return url
+
+
+def _is_sqlite_file(url) -> bool:
+    url = make_url(url)
+    return url.get_backend_name() == "sqlite" and url.database not in (None, "", ":memory:")
+
+
+def engine_options(url, pool_size: int = 5, busy_timeout_ms: int = 5000) -> dict:
+    """SQLALCHEMY_ENGINE_OPTIONS for `url` (pool sizes are per worker process)"""
+    backend = make_url(url).get_backend_name()
+    if _is_sqlite_file(url):
+        return {
+            # sqlite3's own wait for a locked DB, PRAGMA busy_timeout covers the rest
+            "connect_args": {"timeout": busy_timeout_ms / 1000, "check_same_thread": False},
+            # one writer at a time anyway, a few connections per worker is plenty
+            "pool_size": pool_size,
+            "max_overflow": 5,
+            "pool_timeout": 30,
+        }
+    if backend == "postgresql":
+        return {
+            "pool_size": pool_size,
+            "max_overflow": 10,
+            "pool_pre_ping": True,  # survive server restarts / idle timeouts
+            "pool_recycle": 1800,
+        }
+    return {}
+
+
+def _sqlite_pragmas(busy_timeout_ms: int):
+    def on_connect(dbapi_conn, _record):
+        cursor = dbapi_conn.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute(f"PRAGMA busy_timeout={int(busy_timeout_ms)}")
+        cursor.execute("PRAGMA synchronous=NORMAL")  # safe with WAL, far fewer fsyncs
+        cursor.close()
+    return on_connect
+
+
+def init_app(app, db) -> None:
+    """db.init_app with the engine options for the configured backend.
+    Reads SQLALCHEMY_DATABASE_URI, DB_POOL_SIZE and SQLITE_BUSY_TIMEOUT_MS."""
+    url = app.config.setdefault("SQLALCHEMY_DATABASE_URI", database_url())
+    busy_timeout_ms = app.config.setdefault("SQLITE_BUSY_TIMEOUT_MS", 5000)
+    options = engine_options(url, pool_size=app.config.setdefault("DB_POOL_SIZE", 5),
+                             busy_timeout_ms=busy_timeout_ms)
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {**options, **app.config.get("SQLALCHEMY_ENGINE_OPTIONS", {})}
+    db.init_app(app)
+    if _is_sqlite_file(url):
+        with app.app_context():
+            event.listen(db.engine, "connect", _sqlite_pragmas(busy_timeout_ms))
@@ -1,25 +1,43 @@
 # tests/conftest.py
+import atexit
 import os
+import shutil
 import sys
+import tempfile
 import pytest
+from sqlalchemy import event
 
 # Make sure project root is on sys.path
 PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 if PROJECT_ROOT not in sys.path:
     sys.path.insert(0, PROJECT_ROOT)
 
-from app import app, db
+# the engine is built when app is imported, so point it at a throwaway DB first
+# (otherwise the suite runs, and drop_all()s, on the developer's paper.db)
+_db_dir = tempfile.mkdtemp(prefix="papertrader-tests-")
+atexit.register(shutil.rmtree, _db_dir, True)
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_db_dir, 'test.db')}"
+
+from app import app, db, market_clock, order_book, rankings, alert_engine, fragment_cache, ticker_search
 from models import User, Account
+from perf_series import chart_cache
 
 
 @pytest.fixture()
 def client():
     app.config["TESTING"] = True
-    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///:memory:"
 
     with app.app_context():
         db.create_all()
+        market_clock.reset()
+        order_book.clear()
+        rankings.clear()
+        chart_cache.clear()
+        alert_engine.clear()
+        fragment_cache.clear()
+        ticker_search.clear()
         yield app.test_client()
+        rankings.stop()
         db.session.remove()
         db.drop_all()
 
@@ -47,3 +65,31 @@ def auth_user(client):
     client.post("/login", data={"username": "tom", "password": "pass"})
 
     return user_id
+
+
+@pytest.fixture()
+def query_budget(client):
+    """query_budget(path, budget, method="get", **kw) requests `path` and fails
+    if it ran more than `budget` SQL statements (catches per-row lazy loads).
+    Returns the response."""
+    with app.app_context():
+        engine = db.engine
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    def check(path, budget, method="get", **kw):
+        del statements[:]
+        event.listen(engine, "before_cursor_execute", record)
+        try:
+            resp = getattr(client, method)(path, **kw)
+        finally:
+            event.remove(engine, "before_cursor_execute", record)
+        assert len(statements) <= budget, (
+            f"{method.upper()} {path} ran {len(statements)} queries (budget {budget}):\n"
+            + "\n".join(statements)
+        )
+        return resp
+
+    return check
@@ -0,0 +1,147 @@
+# tests/test_alerts.py
+from decimal import Decimal
+
+import pytest
+
+from alerts import AlertEngine
+from app import app, db, market_clock, alert_engine
+from market import PriceSnapshot, Quote
+from models import Ticker, PriceAlert
+
+
+def _snap(version, price, ticker_id=1):
+    return PriceSnapshot.build(version, [Quote(ticker_id, "AAPL", "Apple", Decimal(price))])
+
+
+def _set_price(price):
+    with app.app_context():
+        Ticker.query.filter_by(symbol="AAPL").one().price = Decimal(price)
+        db.session.commit()
+
+
+def test_only_crossed_thresholds_fire(client, auth_user):
+    with app.app_context():
+        db.session.add(Ticker(symbol="AAPL", price=Decimal("100.00")))
+        db.session.commit()
+    for direction, value, mode in [("ABOVE", "105", "price"), ("ABOVE", "110", "price"),
+                                   ("BELOW", "10", "pct"), ("BELOW", "50", "price")]:
+        client.post("/alerts", data={"symbol": "AAPL", "direction": direction, "value": value, "mode": mode})
+    assert len(alert_engine) == 4
+
+    with app.app_context():
+        assert alert_engine.on_tick(_snap(1, "104.99")) == set()
+        assert alert_engine.on_tick(_snap(2, "107.00")) == {auth_user}   # crosses 105 only
+        assert alert_engine.on_tick(_snap(3, "89.50")) == {auth_user}    # crosses 90 (-10%) only
+        assert PriceAlert.query.filter_by(status="TRIGGERED").count() == 2
+
+    r = client.get("/price_alerts")
+    assert b"above $105.00" in r.data and b"below $90.00" in r.data
+    assert b"price-alert" not in client.get("/price_alerts").data  # drained
+    assert len(alert_engine) == 2
+
+
+def test_tick_fires_and_deleted_alerts_do_not(client, auth_user):
+    with app.app_context():
+        db.session.add(Ticker(symbol="AAPL", price=Decimal("100.00")))
+        db.session.commit()
+    market_clock.refresh()
+    client.post("/alerts", data={"symbol": "AAPL", "direction": "BELOW", "value": "60", "mode": "price"})
+    client.post("/alerts", data={"symbol": "AAPL", "direction": "BELOW", "value": "70", "mode": "price"})
+    with app.app_context():
+        gone = PriceAlert.query.filter_by(threshold=Decimal("70")).one().id
+        # deleted by another process, this one's engine still has it
+        PriceAlert.query.filter_by(id=gone).delete()
+        db.session.commit()
+
+    _set_price("50.00")
+    market_clock.tick()
+
+    with app.app_context():
+        alerts = alert_engine.drain(auth_user)
+    assert [a["threshold"] for a in alerts] == [60.0]
+
+
+def test_threshold_already_met_is_rejected(client, auth_user):
+    with app.app_context():
+        db.session.add(Ticker(symbol="AAPL", price=Decimal("100.00")))
+        db.session.commit()
+    client.post("/alerts", data={"symbol": "AAPL", "direction": "ABOVE", "value": "90", "mode": "price"})
+    with app.app_context():
+        assert PriceAlert.query.count() == 0
+
+
+def test_sync_picks_up_an_alert_committed_after_a_higher_id(client, auth_user):
+    engine = AlertEngine(lookback=5)
+    with app.app_context():
+        db.session.add(Ticker(symbol="AAPL", price=Decimal("100.00")))
+        db.session.add(PriceAlert(id=11, user_id=auth_user, ticker_id=1, direction="ABOVE", threshold=Decimal("110")))
+        db.session.commit()
+        engine.load()
+        db.session.add(PriceAlert(id=10, user_id=auth_user, ticker_id=1, direction="ABOVE", threshold=Decimal("105")))
+        db.session.commit()
+        engine.sync()
+    assert len(engine) == 2
+
+
+def _clock_process_engine(auth_user):
+    """an AlertEngine like the one in a separate `flask market-clock` process"""
+    with app.app_context():
+        db.session.add(Ticker(symbol="AAPL", price=Decimal("100.00")))
+        db.session.commit()
+    engine = AlertEngine()
+    with app.app_context():
+        db.session.add(PriceAlert(user_id=auth_user, ticker_id=1, direction="ABOVE", threshold=Decimal("105")))
+        db.session.commit()
+        engine.load()
+        engine.on_tick(_snap(1, "100.00"))
+    return engine
+
+
+def test_alerts_fired_by_another_process_are_delivered_once(client, auth_user):
+    clock_engine = _clock_process_engine(auth_user)
+    with app.app_context():
+        assert clock_engine.on_tick(_snap(2, "107.00")) == {auth_user}
+
+    r = client.get("/price_alerts")
+    assert b"above $105.00" in r.data and b"now $107.00" in r.data
+    assert b"price-alert" not in client.get("/price_alerts").data
+    with app.app_context():
+        assert PriceAlert.query.one().status == "DELIVERED"
+        assert clock_engine.drain(auth_user) == []  # the clock's own copy was delivered elsewhere
+
+
+def test_stream_delivers_alerts_fired_by_another_process(client, auth_user):
+    clock_engine = _clock_process_engine(auth_user)
+    market_clock.tick_seconds = 0.05
+    r = client.get("/stream?page=dashboard", buffered=False)
+    try:
+        chunks = iter(r.response)
+        assert "price-alert" not in next(chunks).decode()
+        with app.app_context():
+            clock_engine.on_tick(_snap(2, "107.00"))  # no ALERTS event in this process
+        _set_price("107.00")
+        for _ in range(40):  # a few ticks
+            update = next(chunks).decode()
+            if "price-alert" in update:
+                break
+        assert "above $105.00" in update
+    finally:
+        r.close()
+        market_clock.tick_seconds = app.config["MARKET_TICK_SECONDS"]
+
+
+def test_failed_trigger_puts_alerts_back(client, auth_user, monkeypatch):
+    engine = _clock_process_engine(auth_user)
+
+    def boom():
+        raise RuntimeError("disk full")
+
+    with app.app_context():
+        monkeypatch.setattr(db.session, "commit", boom)
+        with pytest.raises(RuntimeError):
+            engine.on_tick(_snap(2, "107.00"))
+        monkeypatch.undo()
+        assert len(engine) == 1 and PriceAlert.query.one().status == "ACTIVE"
+        # the price stays above the threshold: the next tick still fires it
+        assert engine.on_tick(_snap(3, "107.00")) == {auth_user}
+        assert PriceAlert.query.one().status == "TRIGGERED"
@@ -0,0 +1,58 @@
+# tests/test_benchmarks.py
+import os
+
+import pytest
+
+from benchmarks.bench_load import main, summarize
+from benchmarks.seed import make_app, seed
+from models import Order, Trade, WatchlistItem, Position
+
+
+def test_seed_is_reproducible_and_sized():
+    counts = []
+    for _ in range(2):
+        bench_app = make_app()
+        try:
+            with bench_app.app_context():
+                seed(10, n_tickers=5, positions_per_user=2, trades_per_user=3,
+                     open_orders_per_user=1, watchlist_per_user=2)
+                counts.append((
+                    Order.query.filter_by(status="FILLED").count(),
+                    Order.query.filter_by(status="PENDING").count(),
+                    Trade.query.count(),
+                    WatchlistItem.query.count(),
+                    sorted((p.user_id, p.ticker_id, p.qty) for p in Position.query),
+                ))
+        finally:
+            os.remove(bench_app.config["BENCH_DB_PATH"])
+    assert counts[0][:4] == (30, 10, 30, 20)
+    assert counts[0] == counts[1]
+
+
+def test_summarize_percentiles_and_rates():
+    samples = {"/positions": [(i / 1000, 2) for i in range(1, 101)]}
+    r = summarize(samples, seconds=2.0)["endpoints"]["/positions"]
+    assert r["requests"] == 100
+    assert r["p50_ms"] == 50.5
+    assert r["p99_ms"] == 99.01
+    assert r["queries_per_req"] == 2
+    assert r["rps"] == 50.0
+
+
+def test_summarize_skips_routes_without_samples():
+    report = summarize({"/positions": [(0.001, 2)], "/leaderboard": []}, seconds=1.0)
+    assert list(report["endpoints"]) == ["/positions"]
+    assert report["total"]["requests"] == 1
+
+
+def test_every_must_be_positive():
+    with pytest.raises(SystemExit):
+        main(["--every", "0"])
+
+
+def test_load_bench_refuses_an_app_bound_to_another_db(monkeypatch):
+    import app  # already imported (and bound) by the test session, like any caller that imported it first
+
+    monkeypatch.setenv("DATABASE_URL", "")  # run() sets it, put it back afterwards
+    with pytest.raises(SystemExit, match="throwaway DB"):
+        main(["--users", "1", "--rounds", "1"])
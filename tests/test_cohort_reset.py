@@ -0,0 +1,112 @@
+# tests/test_cohort_reset.py
+from decimal import Decimal
+
+from sqlalchemy import insert
+
+from app import app, db, order_book, rankings
+from cohorts import Cohort, reset_cohort
+from models import (User, Ticker, Account, Order, Trade, Position, PnlPoint, PnlCheckpoint,
+                    OrderArchive, TradeArchive, PositionArchive, AccountArchive)
+from perf_series import chart_cache
+
+
+def _seed(usernames):
+    """each user: $50k, one filled MKT buy (+ trade, position, chart point), one resting LMT"""
+    with app.app_context():
+        db.session.add(Ticker(symbol="AAPL", price=Decimal("100.00")))
+        ids = db.session.scalars(insert(User).returning(User.id, sort_by_parameter_order=True),
+                                 [{"username": u, "password_hash": "x"} for u in usernames]).all()
+        db.session.execute(insert(Account), [{"user_id": uid, "cash": Decimal("50000.00")} for uid in ids])
+        for uid in ids:
+            filled = Order(user_id=uid, ticker_id=1, side="BUY", order_type="MKT", qty=5, status="FILLED")
+            db.session.add_all([filled, Order(user_id=uid, ticker_id=1, side="BUY", order_type="LMT", qty=1,
+                                              limit_price=Decimal("90.00"), status="PENDING")])
+            db.session.flush()
+            trade = Trade(order_id=filled.id, price=Decimal("100.00"), qty=5)
+            db.session.add_all([trade, Position(user_id=uid, ticker_id=1, qty=5, avg_price=Decimal("100.00"))])
+            db.session.flush()
+            db.session.add_all([PnlPoint(user_id=uid, seq=1, trade_id=trade.id, pnl=Decimal("0")),
+                                PnlCheckpoint(user_id=uid, last_trade_id=trade.id, seq=1, cash=Decimal("49500"))])
+        db.session.commit()
+        return dict(zip(usernames, ids))
+
+
+def test_prefix_cohort_with_archive(client):
+    ids = _seed(["cls-ann", "cls-bob", "cls_cy", "dan"])
+    with app.app_context():
+        rankings.load()
+        versions = dict(db.session.query(Account.user_id, Account.version))
+
+        report = reset_cohort(Cohort(username_prefix="cls-"), Decimal("25000.00"), archive_label="round-1")
+        assert (report.accounts, report.orders, report.trades, report.positions) == (2, 4, 2, 2)
+        assert set(report.user_ids) == {ids["cls-ann"], ids["cls-bob"]}
+
+        reset, kept = {ids["cls-ann"], ids["cls-bob"]}, {ids["cls_cy"], ids["dan"]}  # "_" is not a wildcard
+        assert {o.user_id for o in Order.query} == kept
+        assert {p.user_id for p in Position.query} == kept
+        assert {db.session.get(Order, t.order_id).user_id for t in Trade.query} == kept
+        assert {p.user_id for p in PnlPoint.query} == kept
+        assert {c.user_id for c in PnlCheckpoint.query} == kept
+        for account in Account.query:
+            if account.user_id in reset:
+                assert account.cash == Decimal("25000.00")
+                assert account.version == versions[account.user_id] + 1
+            else:
+                assert account.cash == Decimal("50000.00")
+                assert account.version == versions[account.user_id]
+
+        assert {(a.user_id, a.cash) for a in AccountArchive.query} == {(uid, Decimal("50000.00")) for uid in reset}
+        assert OrderArchive.query.filter_by(label="round-1").count() == 4
+        assert {t.user_id for t in TradeArchive.query} == reset
+        assert {(p.user_id, p.qty) for p in PositionArchive.query} == {(uid, 5) for uid in reset}
+
+
+def test_everyone_without_archive(client):
+    _seed(["a", "b", "c"])
+    with app.app_context():
+        report = reset_cohort(Cohort())
+        assert (report.accounts, report.orders, report.trades, report.positions) == (3, 6, 3, 3)
+        assert report.user_ids is None
+        assert Order.query.count() == Trade.query.count() == PnlPoint.query.count() == 0
+        assert {a.cash for a in Account.query} == {Decimal("100000.00")}
+        assert OrderArchive.query.count() == 0
+
+
+def test_admin_route_resets_caches(client, auth_user, monkeypatch):
+    ids = _seed(["cls-ann", "dan"])
+    monkeypatch.setitem(app.config, "ADMIN_USERNAMES", set())
+    assert client.post("/admin/reset", json={"scope": "all"}).status_code == 403
+
+    monkeypatch.setitem(app.config, "ADMIN_USERNAMES", {"tom"})
+    with app.app_context():
+        rankings.load()
+        order_book.load()
+    assert len(order_book) == 2
+    chart_cache.put((ids["cls-ann"], 1), "png")
+    chart_cache.put((ids["dan"], 1), "png")
+
+    assert client.post("/admin/reset", json={}).status_code == 400
+    assert client.post("/admin/reset", json={"prefix": "cls-", "cash": "nope"}).status_code == 400
+    r = client.post("/admin/reset", data={"usernames": "cls-ann, nobody", "archive": "r1"})
+    assert r.status_code == 200
+    assert r.json["accounts"] == 1 and r.json["orders"] == 2 and r.json["archive"] == "r1"
+
+    assert len(order_book) == 1
+    assert chart_cache.get((ids["cls-ann"], 1)) is None and chart_cache.get((ids["dan"], 1)) == "png"
+    assert rankings.rank_of(ids["cls-ann"])["pnl"] == 0
+
+    r = client.post("/admin/reset", json={"scope": "all", "cash": 1000})
+    assert r.json["accounts"] == 3 and len(order_book) == 0
+    assert chart_cache.get((ids["dan"], 1)) is None
+    assert rankings.rank_of(ids["dan"])["pnl"] == Decimal("-99000.00")
+
+
+def test_cli(client):
+    _seed(["cls-ann", "dan"])
+    runner = app.test_cli_runner()
+    assert runner.invoke(args=["reset-cohort"]).exit_code != 0
+    result = runner.invoke(args=["reset-cohort", "--users", "dan", "--archive", "r2"])
+    assert result.exit_code == 0, result.output
+    assert "reset 1 accounts: deleted 2 orders, 1 trades, 1 positions (archived as r2)" in result.output
+    with app.app_context():
+        assert Order.query.count() == 2
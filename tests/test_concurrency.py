@@ -0,0 +1,77 @@
+# tests/test_concurrency.py
+import threading
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import update
+from sqlalchemy.orm.exc import StaleDataError
+
+from app import app, db
+from fills import _update_account, _versioned, with_retry
+from models import Account, Ticker, Position, Trade
+
+
+def test_stale_account_update_is_rejected_and_retried(client, auth_user):
+    with app.app_context():
+        account = Account.query.filter_by(user_id=auth_user).one()
+        # someone else moves the balance after we read it
+        db.session.execute(update(Account).where(Account.id == account.id)
+                           .values(cash=Account.cash - 50, version=Account.version + 1)
+                           .execution_options(synchronize_session=False))
+        account.cash = account.cash - 10
+        with pytest.raises(StaleDataError):
+            db.session.commit()
+        db.session.rollback()
+
+        def spend():
+            acct = Account.query.filter_by(user_id=auth_user).one()
+            acct.cash = acct.cash - 10
+            db.session.commit()
+
+        with_retry(spend)
+        assert Account.query.filter_by(user_id=auth_user).one().cash == Decimal("99990.00")
+
+
+def test_bulk_fill_updates_check_the_version(client, auth_user):
+    with app.app_context():
+        account = Account.query.filter_by(user_id=auth_user).one()
+        row = {"b_id": account.id, "b_cash": Decimal("5.00")}
+        with pytest.raises(StaleDataError):
+            _versioned(_update_account, [{**row, "b_version": account.version + 1}])
+        _versioned(_update_account, [{**row, "b_version": account.version}])
+        db.session.commit()
+        assert Account.query.filter_by(user_id=auth_user).one().cash == Decimal("5.00")
+
+
+def test_concurrent_market_buys_never_overdraw(client, auth_user):
+    with app.app_context():
+        db.session.add(Ticker(symbol="AAPL", price=Decimal("100.00")))
+        Account.query.filter_by(user_id=auth_user).one().cash = Decimal("1000.00")
+        db.session.commit()
+
+    threads, per_thread = 8, 5
+    statuses = []
+    start = threading.Barrier(threads)
+
+    def trader():
+        c = app.test_client()
+        c.post("/login", data={"username": "tom", "password": "pass"})
+        start.wait()
+        for _ in range(per_thread):
+            r = c.post("/order", data={"side": "BUY", "order_type": "MKT", "symbol": "AAPL", "qty": "1"})
+            statuses.append(r.status_code)
+
+    workers = [threading.Thread(target=trader) for _ in range(threads)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+
+    assert statuses == [200] * threads * per_thread
+    with app.app_context():
+        cash = Account.query.filter_by(user_id=auth_user).one().cash
+        bought = Trade.query.count()
+        assert cash >= 0
+        assert bought == 10
+        assert cash == Decimal("1000.00") - 100 * bought
+        assert Position.query.filter_by(user_id=auth_user).one().qty == bought
@@ -0,0 +1,115 @@
+# tests/test_delta.py
+import re
+from decimal import Decimal
+
+import app as app_module
+from app import app, db, market_clock
+from models import Ticker, WatchlistItem
+
+
+def _marker(r):
+    m = re.search(rb'data-since="([^"]+)" data-watch="([^"]+)"', r.data)
+    return {"since": m.group(1).decode(), "watch": m.group(2).decode()}
+
+
+def _setup(user_id):
+    with app.app_context():
+        for i, symbol in enumerate(["AAPL", "AMZN", "GOOG", "MSFT", "TSLA"]):
+            db.session.add(Ticker(symbol=symbol, price=Decimal(100 + i)))
+        db.session.commit()
+        aapl = Ticker.query.filter_by(symbol="AAPL").one()
+        db.session.add(WatchlistItem(user_id=user_id, symbol="AAPL", ticker_id=aapl.id))
+        db.session.commit()
+    market_clock.refresh()
+
+
+def _move(symbol, price):
+    with app.app_context():
+        Ticker.query.filter_by(symbol=symbol).one().price = Decimal(price)
+        db.session.commit()
+    market_clock.refresh()
+
+
+def test_dash_tick_sends_only_changed_rows(client, auth_user):
+    _setup(auth_user)
+    full = client.get("/dash_tick")
+    assert b'id="prices" hx-swap-oob="innerHTML"' in full.data
+    assert b"GOOG" in full.data
+
+    _move("AAPL", "123.45")
+    r = client.get("/dash_tick", query_string=_marker(full))
+    assert r.status_code == 200
+    assert b'id="prices"' not in r.data  # no whole table
+    assert b"123.45" in r.data
+    assert r.data.count(b'hx-swap-oob="true"') == 3  # price row, watchlist cell, marker
+    assert b"GOOG" not in r.data
+
+    # caught up: nothing but the marker
+    again = client.get("/dash_tick", query_string=_marker(r))
+    assert b"<tr" not in again.data and b"<td" not in again.data
+
+
+def test_dash_tick_falls_back_to_full(client, auth_user):
+    _setup(auth_user)
+    marker = _marker(client.get("/dash_tick"))
+
+    # token from another process / a restarted one
+    r = client.get("/dash_tick", query_string={**marker, "since": "beef." + marker["since"].split(".")[1]})
+    assert b'id="prices" hx-swap-oob="innerHTML"' in r.data
+
+    # older than the history kept
+    for n in range(market_clock._history.maxlen + 1):
+        _move("AAPL", str(110 + n))
+    r = client.get("/dash_tick", query_string=marker)
+    assert b'id="prices" hx-swap-oob="innerHTML"' in r.data
+
+    # watchlist changed: its table comes in full
+    marker = _marker(r)
+    with app.app_context():
+        db.session.add(WatchlistItem(user_id=auth_user, symbol="MSFT"))
+        db.session.commit()
+    r = client.get("/dash_tick", query_string=marker)
+    assert b'id="watchlist" hx-swap-oob="innerHTML"' in r.data
+
+
+def test_changes_since_tracks_versions(client):
+    with app.app_context():
+        for symbol in ("AAPL", "MSFT"):
+            db.session.add(Ticker(symbol=symbol, price=Decimal("10.00")))
+        db.session.commit()
+    snap = market_clock.refresh()
+    token = market_clock.version_token(snap)
+    assert market_clock.changes_since(token) == frozenset()
+
+    _move("MSFT", "11.00")
+    _move("MSFT", "12.00")
+    assert market_clock.changes_since(token) == {snap.by_symbol["MSFT"].id}
+
+    # new ticker: the row set changed, start over
+    with app.app_context():
+        db.session.add(Ticker(symbol="TSLA", price=Decimal("10.00")))
+        db.session.commit()
+    assert market_clock.changes_since(token) is None
+    assert market_clock.changes_since("garbage") is None
+
+
+def test_delta_pays_off_under_the_default_random_walk(client, auth_user, monkeypatch):
+    with app.app_context():
+        db.session.add_all([Ticker(symbol=f"SIM{i:03d}", price=Decimal("100.00")) for i in range(200)])
+        db.session.commit()
+    market_clock.refresh()
+    assert app.config["MARKET_MODEL"] == "walk"
+
+    marker = _marker(client.get("/dash_tick"))
+    market_clock.tick()
+    assert len(market_clock.changes_since(marker["since"])) > 150  # about everything moved
+
+    delta = client.get("/dash_tick", query_string=marker)
+    full = client.get("/dash_tick")
+    assert b'id="prices"' not in delta.data
+    assert len(delta.data) < 0.8 * len(full.data)
+
+    # a full table that happened to be smaller would win
+    monkeypatch.setattr(app_module, "prices_fragment", lambda snapshot: "<table></table>")
+    r = client.get("/dash_tick", query_string=marker)
+    assert b'id="prices" hx-swap-oob="innerHTML"' in r.data
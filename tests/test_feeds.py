@@ -0,0 +1,132 @@
+# tests/test_feeds.py
+import re
+from decimal import Decimal
+
+from sqlalchemy import insert
+
+from app import app, db, market_clock
+from models import Ticker, Order, Trade
+
+
+def _seed_trades(user_id, n, pending=0):
+    with app.app_context():
+        db.session.add_all([Ticker(symbol="AAPL", price=Decimal("100.00")),
+                            Ticker(symbol="MSFT", price=Decimal("200.00"))])
+        db.session.commit()
+        orders = [{"user_id": user_id, "ticker_id": 1 + i % 2, "side": "BUY", "order_type": "MKT",
+                   "qty": 1, "status": "FILLED"} for i in range(n)]
+        orders += [{"user_id": user_id, "ticker_id": 1, "side": "BUY", "order_type": "LMT", "qty": 1,
+                    "limit_price": Decimal("1.00"), "status": "PENDING"} for _ in range(pending)]
+        if n:
+            db.session.execute(insert(Order), orders[:n])
+        if pending:
+            db.session.execute(insert(Order), orders[n:])
+        filled = [o.id for o in Order.query.filter_by(status="FILLED").order_by(Order.id)]
+        if filled:
+            db.session.execute(insert(Trade), [{"order_id": oid, "price": Decimal("100.00"), "qty": 1}
+                                               for oid in filled])
+        db.session.commit()
+    market_clock.refresh()
+
+
+def _row_ids(data, prefix):
+    return [int(i) for i in re.findall(rf'id="{prefix}-(\d+)"'.encode(), data)]
+
+
+def test_transactions_are_paged_by_id(client, auth_user):
+    _seed_trades(auth_user, 120)
+
+    first = client.get("/transactions")
+    ids = _row_ids(first.data, "trade")
+    assert len(ids) == 50 and ids == sorted(ids, reverse=True) and ids[0] == 120
+    before = re.search(rb"before=(\d+)", first.data).group(1).decode()
+    assert before == str(ids[-1])
+
+    second = client.get(f"/transactions?before={before}")
+    assert b"<table" not in second.data  # rows only, swapped in for the "Load more" row
+    assert _row_ids(second.data, "trade") == list(range(70, 20, -1))
+    last = client.get("/transactions?before=21")
+    assert _row_ids(last.data, "trade") == list(range(20, 0, -1))
+    assert b"Load more" not in last.data
+
+
+def test_transactions_newer_than(client, auth_user):
+    _seed_trades(auth_user, 3)
+    assert client.get("/transactions?after=3").data.strip() == b""
+
+    client.post("/order", data={"side": "BUY", "order_type": "MKT", "symbol": "AAPL", "qty": "1"})
+    r = client.get("/transactions?after=3")
+    assert _row_ids(r.data, "trade") == [4] and b"<table" not in r.data
+
+    # reset deleted what the client has: whole table instead
+    client.post("/reset")
+    r = client.get("/transactions?after=4")
+    assert r.headers["HX-Retarget"] == "#transactions-table"
+    assert b"No trades yet" in r.data
+
+
+def test_feeds_do_not_lazy_load_per_row(client, auth_user, query_budget):
+    _seed_trades(auth_user, 40, pending=40)
+    query_budget("/transactions", 2)
+    query_budget("/open_orders", 2)
+
+
+def test_open_orders_paged(client, auth_user):
+    app.config["FEED_PAGE_SIZE"] = 10
+    try:
+        _seed_trades(auth_user, 0, pending=15)
+        first = client.get("/open_orders")
+        assert len(_row_ids(first.data, "order")) == 10
+        rest = client.get("/open_orders?before=6")
+        assert _row_ids(rest.data, "order") == [5, 4, 3, 2, 1]
+    finally:
+        app.config["FEED_PAGE_SIZE"] = 50
+
+
+def test_stream_prepends_new_trades(client, auth_user):
+    _seed_trades(auth_user, 2)
+    market_clock.tick_seconds = 0.05
+    r = client.get("/stream?page=portfolio", buffered=False)
+    try:
+        chunks = iter(r.response)
+        first = next(chunks).decode()
+        assert 'id="transactions-table" hx-swap-oob="innerHTML"' in first
+
+        client.post("/order", data={"side": "BUY", "order_type": "MKT", "symbol": "MSFT", "qty": "1"})
+        update = next(chunks).decode()
+        while "transactions-rows" not in update:
+            update = next(chunks).decode()
+        assert 'id="transactions-rows" hx-swap-oob="afterbegin"' in update
+        assert _row_ids(update.encode(), "trade") == [3]
+        assert 'id="transactions-table"' not in update
+    finally:
+        r.close()
+        market_clock.tick_seconds = app.config["MARKET_TICK_SECONDS"]
+
+
+def test_stream_shows_fills_made_by_another_process(client, auth_user):
+    """a separate clock process fills the order: no ACCOUNT event here, only a price change"""
+    _seed_trades(auth_user, 0, pending=1)
+    market_clock.tick_seconds = 0.05
+    r = client.get("/stream?page=portfolio", buffered=False)
+    try:
+        chunks = iter(r.response)
+        first = next(chunks).decode()
+        assert _row_ids(first.encode(), "order") == [1]
+
+        with app.app_context():
+            order = db.session.get(Order, 1)
+            order.status = "FILLED"
+            db.session.add(Trade(order_id=1, price=Decimal("1.00"), qty=1))
+            db.session.get(Ticker, 1).price = Decimal("1.00")
+            db.session.commit()
+
+        for _ in range(40):  # a few ticks
+            update = next(chunks).decode()
+            if "transactions-table" in update:
+                break
+        assert 'id="open-orders"' in update and _row_ids(update.encode(), "order") == []
+        assert _row_ids(update.encode(), "trade") == [1]
+    finally:
+        r.close()
+        market_clock.tick_seconds = app.config["MARKET_TICK_SECONDS"]
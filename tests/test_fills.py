@@ -0,0 +1,132 @@
+# tests/test_fills.py
+from decimal import Decimal
+
+from app import app, db
+from fills import execute_fills, stats
+from models import Ticker, Account, Order, Position, Trade
+
+
+def _order(user_id, ticker_id, side, qty):
+    order = Order(user_id=user_id, ticker_id=ticker_id, side=side,
+                  order_type="LMT", qty=qty, status="PENDING", limit_price=Decimal("1.00"))
+    db.session.add(order)
+    return order
+
+
+def test_batch_applies_fills_in_order_with_one_commit(client, auth_user):
+    with app.app_context():
+        ticker = Ticker(symbol="AAPL", price=Decimal("100.00"))
+        db.session.add(ticker)
+        db.session.commit()
+
+        buy1 = _order(auth_user, ticker.id, "BUY", 10)
+        buy2 = _order(auth_user, ticker.id, "BUY", 10)
+        sell = _order(auth_user, ticker.id, "SELL", 5)
+        too_big = _order(auth_user, ticker.id, "BUY", 100000)
+        db.session.commit()
+
+        commits = []
+        on_commit = lambda s: commits.append(1)
+        db.event.listen(db.session, "after_commit", on_commit)
+        try:
+            report = execute_fills([
+                (buy1, Decimal("100.00")),
+                (buy2, Decimal("110.00")),
+                (sell, Decimal("120.00")),
+                (too_big, Decimal("100.00")),
+            ])
+        finally:
+            db.event.remove(db.session, "after_commit", on_commit)
+
+        assert len(commits) == 1
+        assert (report.filled, report.cancelled) == (3, 1)
+        assert report.fills_per_sec > 0
+        assert stats.last is report
+
+        pos = Position.query.filter_by(user_id=auth_user).one()
+        assert pos.qty == 15
+        assert float(pos.avg_price) == 105.00
+
+        acct = Account.query.filter_by(user_id=auth_user).one()
+        assert float(acct.cash) == 100000 - 1000 - 1100 + 600
+
+        assert [o.status for o in Order.query.order_by(Order.id)] == ["FILLED", "FILLED", "FILLED", "CANCELLED"]
+        assert Trade.query.count() == 3
+
+
+def test_selling_out_then_buying_back_in_one_batch(client, auth_user):
+    with app.app_context():
+        ticker = Ticker(symbol="AAPL", price=Decimal("50.00"))
+        db.session.add(ticker)
+        db.session.commit()
+        db.session.add(Position(user_id=auth_user, ticker_id=ticker.id, qty=5, avg_price=Decimal("40.00")))
+        sell = _order(auth_user, ticker.id, "SELL", 5)
+        buy = _order(auth_user, ticker.id, "BUY", 2)
+        db.session.commit()
+
+        execute_fills([(sell, Decimal("50.00")), (buy, Decimal("60.00"))])
+
+        pos = Position.query.filter_by(user_id=auth_user).one()
+        assert pos.qty == 2
+        assert float(pos.avg_price) == 60.00
+
+
+def test_cancelled_buy_leaves_no_empty_position(client, auth_user):
+    with app.app_context():
+        ticker = Ticker(symbol="AAPL", price=Decimal("100.00"))
+        db.session.add(ticker)
+        db.session.commit()
+        too_big = _order(auth_user, ticker.id, "BUY", 100000)
+        db.session.commit()
+
+        report = execute_fills([(too_big, Decimal("100.00"))])
+
+        assert (report.filled, report.cancelled) == (0, 1)
+        assert Position.query.count() == 0
+    assert b"AAPL" not in client.get("/positions").data
+
+
+def test_sell_with_nothing_held_is_cancelled(client, auth_user):
+    with app.app_context():
+        ticker = Ticker(symbol="AAPL", price=Decimal("100.00"))
+        db.session.add(ticker)
+        db.session.commit()
+        sell = _order(auth_user, ticker.id, "SELL", 5)
+        db.session.commit()
+
+        report = execute_fills([(sell, Decimal("100.00"))])
+
+        assert (report.filled, report.cancelled) == (0, 1)
+        assert sell.status == "CANCELLED"
+        assert Trade.query.count() == 0 and Position.query.count() == 0
+        assert Account.query.filter_by(user_id=auth_user).one().cash == Decimal("100000.00")
+
+
+def test_batch_is_a_fixed_number_of_statements(client, auth_user):
+    with app.app_context():
+        tickers = [Ticker(symbol=f"T{i}", price=Decimal("10.00")) for i in range(20)]
+        db.session.add_all(tickers)
+        db.session.commit()
+        db.session.add(Position(user_id=auth_user, ticker_id=tickers[0].id, qty=5, avg_price=Decimal("8.00")))
+        db.session.add(Position(user_id=auth_user, ticker_id=tickers[1].id, qty=5, avg_price=Decimal("8.00")))
+        for t in tickers[1:]:
+            _order(auth_user, t.id, "BUY", 1)
+        _order(auth_user, tickers[0].id, "SELL", 5)
+        db.session.commit()
+        orders = Order.query.order_by(Order.id).all()  # loaded, like the clock's fill_crossed does
+
+        statements = []
+        listener = lambda *args: statements.append(args[2].split()[0])
+        db.event.listen(db.engine, "before_cursor_execute", listener)
+        try:
+            report = execute_fills([(order, Decimal("10.00")) for order in orders])
+        finally:
+            db.event.remove(db.engine, "before_cursor_execute", listener)
+
+        assert report.filled == 20
+        assert report.cash == {auth_user: Decimal("100000.00") - 190 + 50}
+        assert report.positions[(auth_user, tickers[0].id)] == 0
+        assert report.positions[(auth_user, tickers[1].id)] == 6
+        # 2 SELECTs, orders, trades, new positions, updated, emptied, account; nothing reloaded after the commit
+        assert len(statements) <= 8, statements
+        assert Position.query.count() == 19 and Trade.query.count() == 20
@@ -0,0 +1,80 @@
+# tests/test_fragments.py
+import threading
+import time
+from decimal import Decimal
+
+from app import app, db, market_clock, fragment_cache
+from fragments import FragmentCache
+from models import Ticker
+
+
+def _add_ticker():
+    with app.app_context():
+        db.session.add(Ticker(symbol="AAPL", price=Decimal("100.00")))
+        db.session.commit()
+
+
+def test_prices_render_once_per_tick(client, auth_user):
+    _add_ticker()
+    for _ in range(20):
+        assert b"100.00" in client.get("/dash_tick").data
+    assert fragment_cache.misses == 1
+    assert fragment_cache.hits == 19
+
+    market_clock.tick()
+    client.get("/dash_tick")
+    assert fragment_cache.misses == 2
+
+
+def test_unchanged_fragments_get_304(client, auth_user):
+    _add_ticker()
+    first = client.get("/prices")
+    assert first.status_code == 200
+    again = client.get("/prices", headers={"If-None-Match": first.headers["ETag"]})
+    assert again.status_code == 304 and again.data == b""
+
+    tick = client.get("/dash_tick")
+    assert client.get("/dash_tick", headers={"If-None-Match": tick.headers["ETag"]}).status_code == 304
+
+    market_clock.tick()
+    assert client.get("/prices", headers={"If-None-Match": first.headers["ETag"]}).status_code == 200
+
+
+def test_concurrent_misses_render_once_and_lru_evicts():
+    cache = FragmentCache(maxsize=2)
+    renders = []
+
+    def slow_render():
+        renders.append(1)
+        time.sleep(0.05)
+        return "<table></table>"
+
+    threads = [threading.Thread(target=cache.get_or_render, args=(("p", None, 1), slow_render)) for _ in range(10)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(renders) == 1
+
+    cache.get_or_render(("p", None, 2), lambda: "v2")
+    cache.get_or_render(("p", None, 3), lambda: "v3")
+    assert len(cache) == 2
+    assert cache.get_or_render(("p", None, 1), lambda: "again") == "again"  # evicted
+
+
+def test_prices_etag_survives_a_restart_at_the_same_version(client, auth_user):
+    _add_ticker()
+    first = client.get("/prices")
+    version = market_clock.snapshot().version
+
+    # another worker / a restarted process at the same version number, other prices
+    with app.app_context():
+        Ticker.query.one().price = Decimal("123.45")
+        db.session.commit()
+    market_clock.reset()
+    market_clock._version = version - 1
+    fragment_cache.clear()
+    assert market_clock.snapshot().version == version
+
+    again = client.get("/prices", headers={"If-None-Match": first.headers["ETag"]})
+    assert again.status_code == 200 and b"123.45" in again.data
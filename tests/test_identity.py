@@ -0,0 +1,64 @@
+# tests/test_identity.py
+import pytest
+
+from app import app
+
+
+@pytest.fixture()
+def debug_app():
+    app.debug = True
+    yield app
+    app.debug = False
+    app.config["SESSION_IDENTITY"] = False
+
+
+def test_user_is_looked_up_once_per_request(client, auth_user, debug_app):
+    for path in ("/", "/dash_tick", "/positions", "/portfolio", "/account"):
+        r = client.get(path)
+        assert r.status_code == 200
+        assert r.headers["X-User-Lookups"] == "1", path
+
+
+def test_session_identity_skips_user_lookups_for_fragments(client, auth_user, debug_app):
+    app.config["SESSION_IDENTITY"] = True
+
+    for path in ("/dash_tick", "/positions", "/open_orders", "/transactions", "/price_alerts"):
+        r = client.get(path)
+        assert r.status_code == 200
+        assert r.headers["X-User-Lookups"] == "0", path
+
+
+def test_session_identity_still_requires_login(client, debug_app):
+    app.config["SESSION_IDENTITY"] = True
+    r = client.get("/positions")
+    assert r.status_code == 302
+
+
+def test_rename_updates_session_identity(client, auth_user):
+    client.post("/watchlist/name", data={"name": "Tech"})
+    with client.session_transaction() as sess:
+        assert sess["username"] == "tom"
+        assert sess["watchlist_name"] == "Tech"
+
+
+def test_watchlist_header_reads_the_session(client, auth_user, debug_app):
+    app.config["SESSION_IDENTITY"] = True
+
+    r = client.post("/watchlist/name", data={"name": "Tech"})
+    assert r.status_code == 200
+    assert r.headers["X-User-Lookups"] == "0"
+    assert b"Tech" in r.data
+
+    # the full page still looks the user up once (base.html shows the cash)
+    r = client.get("/")
+    assert b"Tech" in r.data and r.headers["X-User-Lookups"] == "1"
+
+
+def test_session_from_before_watchlist_name_was_stored(client, auth_user, debug_app):
+    client.post("/watchlist/name", data={"name": "Tech"})
+    with client.session_transaction() as sess:
+        del sess["watchlist_name"]
+
+    assert b"Tech" in client.get("/").data
+    with client.session_transaction() as sess:
+        assert sess["watchlist_name"] == "Tech"
@@ -0,0 +1,127 @@
+# tests/test_leaderboard.py
+import time
+from decimal import Decimal
+
+from app import app, db, market_clock, rankings, compute_user_pnl
+from leaderboard import Leaderboard
+from models import User, Account, Ticker
+
+
+def _make_user(name):
+    user = User(username=name)
+    user.set_password("pw")
+    db.session.add(user)
+    db.session.commit()
+    db.session.add(Account(user_id=user.id))
+    db.session.commit()
+    return user.id
+
+
+def _buy(client, symbol, qty):
+    client.post("/order", data={"side": "BUY", "order_type": "MKT", "symbol": symbol, "qty": str(qty)})
+
+
+def test_incremental_updates_match_a_full_recompute(client, auth_user):
+    with app.app_context():
+        db.session.add(Ticker(symbol="AAPL", price=Decimal("100.00")))
+        db.session.add(Ticker(symbol="MSFT", price=Decimal("50.00")))
+        db.session.commit()
+        ann = _make_user("ann")
+
+    rankings.ensure_loaded()
+    _buy(client, "AAPL", 10)
+    _buy(client, "MSFT", 4)
+    for _ in range(5):
+        market_clock.tick()
+
+    with app.app_context():
+        expected = {u.username: compute_user_pnl(u) for u in User.query.all()}
+    incremental = {row["username"]: row["pnl"] for row in rankings.top(10)}
+    assert incremental == expected
+
+    rankings.load()
+    assert {row["username"]: row["pnl"] for row in rankings.top(10)} == expected
+    assert rankings.rank_of(ann)["username"] == "ann"
+
+
+def test_rank_of_and_top_k(client):
+    board = Leaderboard()
+    with app.app_context():
+        board.load()  # empty DB
+    for uid, cash in enumerate(["100000", "150000", "90000", "120000"], start=1):
+        board.add_user(uid, f"u{uid}", Decimal(cash))
+
+    assert [row["username"] for row in board.top(2)] == ["u2", "u4"]
+    assert board.rank_of(3)["rank"] == 4
+    board.set_cash(3, Decimal("200000"))
+    assert board.rank_of(3)["rank"] == 1
+    assert board.rank_of(2)["rank"] == 2
+
+
+def test_leaderboard_page_shows_my_rank_outside_the_top(client, auth_user):
+    with app.app_context():
+        for name in ("a", "b", "c"):
+            uid = _make_user(name)
+            Account.query.filter_by(user_id=uid).one().cash = Decimal("200000.00")
+        Account.query.filter_by(user_id=auth_user).one().cash = Decimal("1.00")
+        db.session.commit()
+
+    app.config["LEADERBOARD_SIZE"] = 2
+    try:
+        r = client.get("/leaderboard")
+    finally:
+        app.config["LEADERBOARD_SIZE"] = 100
+    assert r.status_code == 200
+    assert b"#4" in r.data
+    assert b"tom" in r.data
+    assert b"4 traders" in r.data
+
+
+def test_ties_rank_by_user_id(client):
+    board = Leaderboard()
+    with app.app_context():
+        board.load()
+    for uid in (5, 3, 9, 1):
+        board.add_user(uid, f"u{uid}", Decimal("100000" if uid != 9 else "200000"))
+
+    assert [row["user_id"] for row in board.top(4)] == [9, 1, 3, 5]
+    assert [row["user_id"] for row in board.top(2)] == [9, 1]
+    assert [board.rank_of(uid)["rank"] for uid in (9, 1, 3, 5)] == [1, 2, 3, 4]
+    assert board.rank_of(42) is None
+
+
+def test_updates_during_a_load_are_replayed(client, auth_user, monkeypatch):
+    board = Leaderboard()
+    build = board._build
+
+    def slow_build():
+        state = build()
+        board.set_cash(auth_user, Decimal("5.00"))  # a fill lands while the load runs
+        return state
+
+    monkeypatch.setattr(board, "_build", slow_build)
+    with app.app_context():
+        board.load()
+    assert board.rank_of(auth_user)["pnl"] == Decimal("5.00") - Decimal("100000.00")
+
+
+def test_resync_runs_in_the_background_not_in_requests(client, auth_user, query_budget):
+    query_budget("/leaderboard", 6)  # first use loads it
+    rankings.loaded_at -= 3600       # "stale"
+    query_budget("/leaderboard", 2)  # but the page doesn't reload it
+    rankings.stop()
+
+    with app.app_context():
+        Account.query.filter_by(user_id=auth_user).one().cash = Decimal("1.00")
+        db.session.commit()
+    rankings.resync_seconds = 0.01
+    try:
+        rankings.start(app)
+        for _ in range(200):
+            if rankings.rank_of(auth_user)["pnl"] == Decimal("1.00") - Decimal("100000.00"):
+                break
+            time.sleep(0.01)
+        assert rankings.rank_of(auth_user)["pnl"] == Decimal("1.00") - Decimal("100000.00")
+    finally:
+        rankings.stop()
+        rankings.resync_seconds = 60.0
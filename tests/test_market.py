@@ -0,0 +1,70 @@
+# tests/test_market.py
+from decimal import Decimal
+
+from app import app, db, market_clock
+from models import Ticker, Order, Position
+
+
+def test_dash_tick_does_not_move_prices(client, auth_user):
+    with app.app_context():
+        db.session.add(Ticker(symbol="AAPL", price=Decimal("100.00")))
+        db.session.commit()
+    market_clock.refresh()
+
+    for _ in range(3):
+        r = client.get("/dash_tick")
+        assert r.status_code == 200
+        assert b"100.00" in r.data
+
+    with app.app_context():
+        assert Ticker.query.first().price == Decimal("100.00")
+
+
+def test_tick_moves_prices_once_and_bumps_version(client):
+    with app.app_context():
+        db.session.add(Ticker(symbol="AAPL", price=Decimal("100.00")))
+        db.session.commit()
+    before = market_clock.refresh()
+
+    snap = market_clock.tick()
+    assert snap.version > before.version
+    assert market_clock.snapshot() is snap
+
+    with app.app_context():
+        price = Ticker.query.first().price
+    assert price == snap.by_symbol["AAPL"].price
+    assert abs(price - Decimal("100.00")) <= Decimal("0.50")
+
+
+def test_tick_fills_crossed_limit_orders(client, auth_user):
+    with app.app_context():
+        db.session.add(Ticker(symbol="AAPL", price=Decimal("150.00")))
+        db.session.commit()
+
+    client.post("/order", data={
+        "side": "BUY",
+        "order_type": "LMT",
+        "symbol": "AAPL",
+        "qty": "10",
+        "limit_price": "200",
+    })
+    # limit above the market fills right away, so place one that can't fill yet
+    client.post("/order", data={
+        "side": "BUY",
+        "order_type": "LMT",
+        "symbol": "AAPL",
+        "qty": "5",
+        "limit_price": "140",
+    })
+
+    with app.app_context():
+        ticker = Ticker.query.first()
+        ticker.price = Decimal("100.00")
+        db.session.commit()
+
+    market_clock.tick()
+
+    with app.app_context():
+        assert Order.query.filter_by(status="PENDING").count() == 0
+        pos = Position.query.filter_by(user_id=auth_user).first()
+        assert pos.qty == 15
@@ -0,0 +1,71 @@
+# tests/test_metrics.py
+import os
+import time
+
+from flask import Flask, render_template_string
+from sqlalchemy import text
+
+import storage
+from app import app, db, metrics
+from instrumentation import Instrumentation
+
+
+def test_requests_are_timed_and_slow_ones_profiled(tmp_path):
+    mini = Flask("metrics-test")
+    mini.config.update(SQLALCHEMY_DATABASE_URI=f"sqlite:///{tmp_path / 'm.db'}", METRICS_ENABLED=True,
+                       PROFILE_SLOW_MS="20", PROFILE_INTERVAL_MS="1", PROFILE_DIR=str(tmp_path / "profiles"))
+    storage.init_app(mini, db)
+    inst = Instrumentation()
+    inst.init_app(mini, db)
+
+    @mini.route("/busy")
+    def busy():
+        for _ in range(3):
+            db.session.execute(text("SELECT 1"))
+        time.sleep(0.03)
+        return render_template_string("{{ n }} rows", n=3)
+
+    @mini.route("/quick")
+    def quick():
+        return "ok"
+
+    try:
+        client = mini.test_client()
+        r = client.get("/busy")
+        client.get("/quick")
+    finally:
+        with mini.app_context():
+            db.engine.dispose()
+
+    assert 'db;dur=' in r.headers["Server-Timing"]
+    assert 'desc="3 queries"' in r.headers["Server-Timing"]
+    stats = inst.snapshot()
+    assert stats["busy"]["requests"] == 1 and stats["busy"]["queries"] == 3
+    assert stats["busy"]["render"] > 0
+    assert stats["quick"]["queries"] == 0
+
+    # only the slow request was dumped, as folded stacks
+    (dump,) = os.listdir(tmp_path / "profiles")
+    assert "-busy-" in dump
+    lines = (tmp_path / "profiles" / dump).read_text().splitlines()
+    assert any("busy (test_metrics.py" in line for line in lines)
+
+    exposition = inst.prometheus()
+    assert 'papertrader_sql_queries_total{endpoint="busy"} 3' in exposition
+    assert 'papertrader_request_seconds_count{endpoint="quick"} 1' in exposition
+
+
+def test_metrics_endpoint_is_admin_only(client, auth_user, monkeypatch):
+    monkeypatch.setattr(metrics, "enabled", True)
+    monkeypatch.setitem(app.config, "ADMIN_USERNAMES", set())
+    assert client.get("/metrics").status_code == 403
+
+    monkeypatch.setitem(app.config, "ADMIN_USERNAMES", {"tom"})
+    r = client.get("/metrics")
+    assert r.status_code == 200
+    assert "# TYPE papertrader_fills_total counter" in r.get_data(as_text=True)
+    assert "# TYPE papertrader_fill_batch_fills_per_second gauge" in r.get_data(as_text=True)
+
+    monkeypatch.setitem(app.config, "METRICS_TOKEN", "s3cret")
+    scraper = app.test_client()
+    assert scraper.get("/metrics", headers={"Authorization": "Bearer s3cret"}).status_code == 200
@@ -0,0 +1,75 @@
+# tests/test_news.py
+import functools
+import threading
+import time
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+from pathlib import Path
+
+import pytest
+
+from app import news_store, news_ingestor
+from news import NewsStore, NewsIngestor
+
+FIXTURES = Path(__file__).parent / "fixtures"
+FEED = {"source": "Test", "url": (FIXTURES / "news_feed.xml").as_uri()}
+
+
+@pytest.fixture()
+def local_feed():
+    news_store.clear()
+    feeds = news_ingestor.feeds
+    news_ingestor.feeds = [FEED]
+    yield
+    news_ingestor.stop()
+    news_ingestor.feeds = feeds
+    news_store.clear()
+
+
+def test_entries_are_normalized_and_deduplicated():
+    store = NewsStore()
+    ingestor = NewsIngestor(store, feeds=[FEED, FEED])
+
+    assert ingestor.poll_once() == 2
+    assert [a["title"] for a in store.articles()] == ["Bonds slip", "Stocks rally"]
+    assert store.articles()[1]["summary"] == "Stocks rallied today."
+
+    version = store.version
+    assert ingestor.poll_once() == 0
+    assert store.version == version
+
+
+def test_conditional_get_skips_unchanged_feed():
+    handler = functools.partial(SimpleHTTPRequestHandler, directory=str(FIXTURES))
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        url = f"http://127.0.0.1:{server.server_port}/news_feed.xml"
+        ingestor = NewsIngestor(NewsStore(), feeds=[{"source": "Test", "url": url}])
+        assert len(ingestor._fetch(ingestor.feeds[0])) == 3
+        assert ingestor._validators[url]["modified"]
+        # second poll sends If-Modified-Since and gets a 304
+        assert ingestor._fetch(ingestor.feeds[0]) == []
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_tiles_are_served_from_the_store(client, auth_user, local_feed):
+    # cold start: a placeholder right away, the background thread does the first poll
+    r = client.get("/news/tiles")
+    assert r.status_code == 200
+    assert b"Loading" in r.data and r.headers["Cache-Control"] == "no-store"
+    assert news_ingestor.running
+    for _ in range(200):
+        if news_store.updated_at is not None:
+            break
+        time.sleep(0.01)
+
+    r = client.get("/news/tiles")
+    assert r.status_code == 200
+    assert b"Stocks rally" in r.data
+    assert "max-age=" in r.headers["Cache-Control"]
+    assert news_ingestor.running
+
+    again = client.get("/news/tiles", headers={"If-None-Match": r.headers["ETag"]})
+    assert again.status_code == 304
@@ -0,0 +1,124 @@
+# tests/test_order_book.py
+from decimal import Decimal
+
+from app import app, db, market_clock, order_book
+from models import Ticker, Order
+from order_book import OrderBook
+
+
+def test_pop_crossed_only_returns_crossed_orders():
+    book = OrderBook()
+    book.add(1, 7, "BUY", Decimal("100.00"))
+    book.add(2, 7, "BUY", Decimal("90.00"))
+    book.add(3, 7, "SELL", Decimal("120.00"))
+    book.add(4, 7, "SELL", Decimal("95.00"))
+
+    assert book.pop_crossed(7, Decimal("99.00")) == [1, 4]
+    assert book.pop_crossed(7, Decimal("99.00")) == []
+    assert sorted(book.pop_crossed(7, Decimal("130.00"))) == [3]
+    assert book.pop_crossed(7, Decimal("80.00")) == [2]
+    assert len(book) == 0
+
+
+def test_discarded_orders_are_skipped():
+    book = OrderBook()
+    book.add(1, 7, "BUY", Decimal("100.00"))
+    book.add(2, 7, "BUY", Decimal("100.00"))
+    book.discard([1])
+
+    assert book.pop_crossed(7, Decimal("50.00")) == [2]
+
+
+def test_book_is_rebuilt_from_db_and_tick_leaves_uncrossed_orders(client, auth_user):
+    with app.app_context():
+        ticker = Ticker(symbol="AAPL", price=Decimal("150.00"))
+        db.session.add(ticker)
+        db.session.commit()
+        # resting orders that were never seen by this process
+        db.session.add(Order(user_id=auth_user, ticker_id=ticker.id, side="BUY",
+                             order_type="LMT", qty=1, limit_price=Decimal("10.00")))
+        db.session.add(Order(user_id=auth_user, ticker_id=ticker.id, side="BUY",
+                             order_type="LMT", qty=1, limit_price=Decimal("500.00")))
+        db.session.commit()
+
+    market_clock.tick()
+
+    assert order_book.loaded
+    assert len(order_book) == 1
+    with app.app_context():
+        statuses = [o.status for o in Order.query.order_by(Order.id)]
+    assert statuses == ["PENDING", "FILLED"]
+
+
+def test_sync_picks_up_orders_placed_after_a_reset(client, auth_user):
+    """a clock process's book only scans new ids, so deleted ids must not come back"""
+    clock_book = OrderBook()
+    with app.app_context():
+        db.session.add(Ticker(symbol="AAPL", price=Decimal("150.00")))
+        db.session.commit()
+        clock_book.load()
+    client.post("/order", data={"symbol": "AAPL", "side": "BUY", "qty": 1,
+                                "order_type": "LMT", "limit_price": "10.00"})
+    with app.app_context():
+        clock_book.sync()
+    assert len(clock_book) == 1
+
+    client.post("/reset")
+    client.post("/order", data={"symbol": "AAPL", "side": "BUY", "qty": 1,
+                                "order_type": "LMT", "limit_price": "20.00"})
+    with app.app_context():
+        clock_book.sync()
+        new_id = Order.query.one().id
+    assert new_id > 1
+    assert clock_book.pop_crossed(1, Decimal("15.00")) == [new_id]
+
+
+def test_sync_picks_up_an_order_committed_after_a_higher_id(client, auth_user):
+    """Postgres can commit id 10 after id 11 has already been synced"""
+    clock_book = OrderBook(lookback=5)
+    with app.app_context():
+        db.session.add(Ticker(symbol="AAPL", price=Decimal("150.00")))
+        db.session.add(Order(id=11, user_id=auth_user, ticker_id=1, side="BUY", order_type="LMT", qty=1,
+                             limit_price=Decimal("20.00")))
+        db.session.commit()
+        clock_book.load()
+        db.session.add(Order(id=10, user_id=auth_user, ticker_id=1, side="BUY", order_type="LMT", qty=1,
+                             limit_price=Decimal("30.00")))
+        db.session.commit()
+        clock_book.sync()
+        clock_book.sync()
+    assert len(clock_book) == 2
+    assert clock_book.pop_crossed(1, Decimal("15.00")) == [10, 11]
+
+
+def test_failed_fill_puts_orders_back_and_other_listeners_still_run(client, auth_user, monkeypatch):
+    import app as app_module
+    from sqlalchemy.orm.exc import StaleDataError
+
+    with app.app_context():
+        ticker = Ticker(symbol="AAPL", price=Decimal("150.00"))
+        db.session.add(ticker)
+        db.session.commit()
+        db.session.add(Order(user_id=auth_user, ticker_id=ticker.id, side="BUY",
+                             order_type="LMT", qty=1, limit_price=Decimal("500.00")))
+        db.session.commit()
+
+    def conflict(fills):
+        raise StaleDataError("someone else got there first")
+
+    marked = []
+    monkeypatch.setattr(app_module, "execute_fills", conflict)
+    monkeypatch.setattr(app_module.rankings, "apply_prices", lambda prices: marked.append(prices))
+    monkeypatch.setattr("fills.time.sleep", lambda s: None)  # let the retries run out fast
+
+    market_clock.tick()  # with_retry gives up: logged, not raised
+
+    assert marked  # the leaderboard listener after it still ran
+    assert len(order_book) == 1  # and the order is back in the book
+    with app.app_context():
+        assert Order.query.one().status == "PENDING"
+
+    monkeypatch.undo()
+    market_clock.tick()
+    with app.app_context():
+        assert Order.query.one().status == "FILLED"
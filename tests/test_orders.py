@@ -56,9 +56,8 @@ def test_insufficient_cash_cancels_buy(client, auth_user):
         assert order is not None
         assert order.status == "CANCELLED"
 
-        pos = Position.query.first()
-        assert pos is not None
-        assert pos.qty == 0
+        # no empty position left behind
+        assert Position.query.first() is None
 
         acct = Account.query.filter_by(user_id=auth_user).first()
         assert float(acct.cash) == 100000.00
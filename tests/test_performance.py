@@ -0,0 +1,91 @@
+# tests/test_performance.py
+from decimal import Decimal
+
+from app import app, db
+from models import Ticker, Order, Trade, PnlPoint, PnlCheckpoint
+from perf_series import update_series, catch_up_series, chart_cache
+
+
+def _trade(client, side, qty):
+    client.post("/order", data={"side": side, "order_type": "MKT", "symbol": "AAPL", "qty": str(qty)})
+
+
+def _set_price(price):
+    with app.app_context():
+        Ticker.query.filter_by(symbol="AAPL").one().price = Decimal(price)
+        db.session.commit()
+
+
+def test_series_is_appended_per_fill(client, auth_user):
+    with app.app_context():
+        db.session.add(Ticker(symbol="AAPL", price=Decimal("100.00")))
+        db.session.commit()
+
+    _trade(client, "BUY", 10)
+    _set_price("110.00")
+    _trade(client, "BUY", 10)
+    _set_price("90.00")
+    _trade(client, "SELL", 5)
+
+    with app.app_context():
+        assert [float(p.pnl) for p in PnlPoint.query.order_by(PnlPoint.seq)] == [0.0, 100.0, -300.0]
+        assert db.session.get(PnlCheckpoint, auth_user).seq == 3
+        # already caught up, nothing to replay
+        assert update_series([auth_user]) == 0
+
+    r = client.get("/performance.json")
+    assert r.get_json() == {"last_trade_id": 3, "t": [1, 2, 3], "pnl": [0.0, 100.0, -300.0]}
+
+
+def test_png_is_cached_per_last_trade(client, auth_user):
+    with app.app_context():
+        db.session.add(Ticker(symbol="AAPL", price=Decimal("100.00")))
+        db.session.commit()
+
+    assert b"after your first trade" in client.get("/performance_chart.png").data
+
+    _trade(client, "BUY", 1)
+    first = client.get("/performance_chart.png").data
+    assert b"data:image/png;base64," in first
+    assert client.get("/performance_chart.png").data == first
+    assert len(chart_cache._items) == 1
+
+    _trade(client, "BUY", 1)
+    client.get("/performance_chart.png")
+    assert len(chart_cache._items) == 2
+
+
+def test_reset_clears_the_series(client, auth_user):
+    with app.app_context():
+        db.session.add(Ticker(symbol="AAPL", price=Decimal("100.00")))
+        db.session.commit()
+    _trade(client, "BUY", 1)
+    client.post("/reset")
+
+    assert client.get("/performance.json").get_json()["t"] == []
+
+
+def test_chart_reads_do_not_write(client, auth_user):
+    with app.app_context():
+        db.session.add(Ticker(symbol="AAPL", price=Decimal("100.00")))
+        db.session.commit()
+    _trade(client, "BUY", 10)
+    with app.app_context():
+        # a trade whose fill never updated the series (e.g. from before it existed)
+        db.session.add(Trade(order_id=Order.query.one().id, price=Decimal("100.00"), qty=1))
+        db.session.commit()
+
+    commits = []
+    on_commit = lambda s: commits.append(1)
+    db.event.listen(db.session, "after_commit", on_commit)
+    try:
+        assert client.get("/performance.json").get_json()["t"] == [1]
+        assert client.get("/portfolio").status_code == 200
+    finally:
+        db.event.remove(db.session, "after_commit", on_commit)
+    assert commits == []
+
+    with app.app_context():
+        assert catch_up_series() == 1
+        assert catch_up_series() == 0
+    assert client.get("/performance.json").get_json()["t"] == [1, 2]
@@ -0,0 +1,35 @@
+# tests/test_pnl.py
+from decimal import Decimal
+
+from app import app, db
+from models import User, Account, Position, Ticker
+from pnl import compute_equities, compute_pnls
+
+
+def test_equity_is_cash_plus_marked_positions_in_one_query(client, auth_user):
+    with app.app_context():
+        aapl = Ticker(symbol="AAPL", price=Decimal("101.25"))
+        msft = Ticker(symbol="MSFT", price=Decimal("50.10"))
+        ann = User(username="ann", password_hash="x")
+        ghost = User(username="ghost", password_hash="x")  # no account
+        db.session.add_all([aapl, msft, ann, ghost])
+        db.session.commit()
+        db.session.add(Account(user_id=ann.id, cash=Decimal("500.00")))
+        db.session.add(Position(user_id=auth_user, ticker_id=aapl.id, qty=3, avg_price=Decimal("90")))
+        db.session.add(Position(user_id=auth_user, ticker_id=msft.id, qty=10, avg_price=Decimal("40")))
+        db.session.commit()
+
+        statements = []
+        listener = lambda *args: statements.append(args[2])
+        db.event.listen(db.engine, "before_cursor_execute", listener)
+        try:
+            equities = compute_equities()
+        finally:
+            db.event.remove(db.engine, "before_cursor_execute", listener)
+
+        assert len(statements) == 1
+        assert equities == {
+            auth_user: Decimal("100000.00") + Decimal("303.75") + Decimal("501.00"),
+            ann.id: Decimal("500.00"),
+        }
+        assert compute_pnls([ann.id]) == {ann.id: Decimal("-99500.00")}
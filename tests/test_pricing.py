@@ -0,0 +1,84 @@
+# tests/test_pricing.py
+from decimal import Decimal
+
+import numpy as np
+import pytest
+
+from app import app, db
+from market import MarketClock
+from models import Ticker
+from pricing import MODELS, PriceEngine
+
+
+def _engine(model, seed=7, n=1000, **kw):
+    engine = PriceEngine(model, seed=seed, **kw)
+    engine.load(np.arange(1, n + 1), np.full(n, 10_000))
+    return engine
+
+
+@pytest.mark.parametrize("model", MODELS)
+def test_same_seed_same_path(model):
+    a, b = _engine(model), _engine(model)
+    for _ in range(5):
+        assert np.array_equal(a.step(), b.step())
+    assert np.array_equal(a.cents, b.cents)
+    c = _engine(model, seed=8)
+    for _ in range(5):
+        c.step()
+    assert not np.array_equal(a.cents, c.cents)
+
+
+def test_walk_is_bounded_and_floored():
+    engine = _engine("walk")
+    before = engine.cents.copy()
+    engine.step()
+    assert np.abs(engine.cents - before).max() <= 50
+
+    engine.load([1, 2], [120, 100_000])
+    for _ in range(50):
+        engine.step()
+    assert engine.cents.min() >= 100
+
+
+def test_sector_shocks_are_correlated():
+    engine = _engine("sector", n=2000, sectors=2, sector_corr=0.9, vol=0.01)
+    moves = []
+    for _ in range(200):
+        before = engine.cents.astype(float)
+        engine.step()
+        moves.append(np.log(engine.cents / before))
+    moves = np.array(moves)
+    same = np.corrcoef(moves[:, 0], moves[:, 2])[0, 1]    # ids 1 and 3: same sector
+    other = np.corrcoef(moves[:, 0], moves[:, 1])[0, 1]   # ids 1 and 2: different sectors
+    assert same > 0.6 and abs(other) < 0.4
+
+
+def test_sync_keeps_parameters_for_the_same_universe():
+    engine = PriceEngine("gbm")
+    engine.load([1, 2], [100, 200], vol=[0.0, 0.5])
+    engine.sync([1, 2], [300, 400])
+    assert list(engine.cents) == [300, 400] and list(engine.vol) == [0.0, 0.5]
+    engine.sync([1, 2, 3], [1, 2, 3])
+    assert list(engine.vol) == [engine.default_vol] * 3
+
+
+def test_unknown_model():
+    with pytest.raises(ValueError):
+        PriceEngine("moon")
+
+
+def test_tick_flushes_only_changed_prices(client):
+    with app.app_context():
+        db.session.add_all([Ticker(symbol="AAPL", price=Decimal("100.00")),
+                            Ticker(symbol="MSFT", price=Decimal("250.55"))])
+        db.session.commit()
+    engine = PriceEngine("gbm", seed=1, vol=0.0)
+    clock = MarketClock(app, engine=engine)
+    engine.load([1, 2], [10_000, 25_055], vol=[0.05, 0.0])
+
+    snap = clock.tick()
+    with app.app_context():
+        prices = {t.symbol: t.price for t in Ticker.query}
+    assert prices["MSFT"] == Decimal("250.55")
+    assert prices["AAPL"] != Decimal("100.00")
+    assert prices["AAPL"] == snap.by_symbol["AAPL"].price == Decimal(int(engine.cents[0])) / 100
@@ -0,0 +1,87 @@
+# tests/test_provisioning.py
+import io
+import json
+import time
+from decimal import Decimal
+
+import pytest
+
+from app import app, db, rankings
+from models import User, Account
+from provisioning import ProvisioningError, provision, read_users
+
+
+def test_read_csv_and_json():
+    csv_rows = read_users("username,password,cash\n ann ,pw1,\nbob,pw2,500\n")
+    assert [(u["username"], u["cash"]) for u in csv_rows] == [("ann", Decimal("100000.00")),
+                                                              ("bob", Decimal("500.00"))]
+    json_rows = read_users(json.dumps({"users": [{"username": "cy", "password": "pw"}]}).encode())
+    assert json_rows[0]["username"] == "cy"
+
+    with pytest.raises(ProvisioningError):
+        read_users("name,pw\nann,x\n")
+    with pytest.raises(ProvisioningError):
+        read_users('[{"username": "ann"}]')
+
+
+def test_provision_is_idempotent(client):
+    users = read_users("username,password\n" + "".join(f"u{i},pw{i}\n" for i in range(20)) + "u0,again\n")
+    with app.app_context():
+        # created by an old two-commit signup that died before the account
+        db.session.add(User(username="u3", password_hash="x"))
+        db.session.commit()
+
+        stages = []
+        report = provision(users, workers=2, batch_size=7, progress=lambda *a: stages.append(a))
+        assert len(report.created) == 19
+        assert report.skipped == 2  # u0 repeated, u3 already there
+        assert report.accounts_added == 1
+        assert ("inserted", 19, 19) in stages and ("hashed", 19, 19) in stages
+        assert User.query.count() == 20 and Account.query.count() == 20
+        assert User.query.filter_by(username="u7").one().check_password("pw7")
+
+        again = provision(users, workers=1)
+        assert again.created == [] and again.accounts_added == 0
+        assert User.query.count() == 20 and Account.query.count() == 20
+
+
+def _wait_for(client, r):
+    assert r.status_code == 202 and r.headers["Location"] == r.json["status_url"]
+    for _ in range(200):
+        job = client.get(r.json["status_url"]).json
+        if job["state"] in ("done", "failed"):
+            return job
+        time.sleep(0.05)
+    raise AssertionError("import did not finish")
+
+
+def test_import_endpoint_is_admin_only(client, auth_user, monkeypatch):
+    body = json.dumps([{"username": "zed", "password": "pw", "cash": "2500"}])
+    monkeypatch.setitem(app.config, "ADMIN_USERNAMES", set())
+    assert client.post("/admin/users/import", data=body).status_code == 403
+    assert client.get("/admin/users/import/abc").status_code == 403
+
+    monkeypatch.setitem(app.config, "ADMIN_USERNAMES", {"tom"})
+    rankings.clear()
+    r = client.post("/admin/users/import", data={"file": (io.BytesIO(b"username,password,cash\nzed,pw,2500\n"), "u.csv")})
+    assert r.json["state"] in ("queued", "running", "done") and r.json["total"] == 1
+    job = _wait_for(client, r)
+    assert job["state"] == "done" and job["created"] == 1 and job["done"] == 1
+    job = _wait_for(client, client.post("/admin/users/import", data=body))
+    assert (job["created"], job["skipped"], job["accounts_added"]) == (0, 1, 0)
+    with app.app_context():
+        zed = User.query.filter_by(username="zed").one()
+        assert Account.query.filter_by(user_id=zed.id).one().cash == Decimal("2500.00")
+
+    assert client.post("/admin/users/import", data="nope").status_code == 400
+    assert client.get("/admin/users/import/nope").status_code == 404
+
+
+def test_cli(client, tmp_path):
+    path = tmp_path / "class.json"
+    path.write_text(json.dumps([{"username": "s1", "password": "a"}, {"username": "s2", "password": "b"}]))
+    result = app.test_cli_runner().invoke(args=["provision-users", str(path), "--workers", "1"])
+    assert result.exit_code == 0, result.output
+    assert "created 2, skipped 0" in result.output
+    with app.app_context():
+        assert User.query.filter(User.username.in_(["s1", "s2"])).count() == 2
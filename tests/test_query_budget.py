@@ -0,0 +1,67 @@
+# tests/test_query_budget.py
+"""Every list view loads its rows (and what the template walks: pos.ticker,
+trade.order.ticker, order.ticker, alert.ticker) in a fixed number of queries,
+however many rows there are. Budgets include the logged-in user lookup."""
+from datetime import date, timedelta
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import insert
+
+from app import app, db, market_clock
+from models import Ticker, Order, Trade, Position, WatchlistItem, PriceAlert, ScheduledTransaction
+
+ROWS = 30
+
+BUDGETS = [
+    ("/", 3),
+    ("/positions", 2),
+    ("/portfolio", 2),
+    ("/open_orders", 2),
+    ("/transactions", 2),
+    ("/watchlist", 3),
+    ("/watchlist_partial", 2),
+    ("/dash_tick", 2),
+    ("/account", 6),
+    ("/leaderboard", 6),  # the first request loads the in-memory ranking (4 set-based queries)
+    ("/search?q=t", 1),
+]
+
+
+@pytest.fixture()
+def busy_account(client, auth_user):
+    with app.app_context():
+        db.session.execute(insert(Ticker), [
+            {"id": i, "symbol": f"T{i:03d}", "name": f"Ticker {i}", "price": Decimal("50.00")}
+            for i in range(1, ROWS + 1)])
+        db.session.execute(insert(Position), [
+            {"user_id": auth_user, "ticker_id": i, "qty": 5, "avg_price": Decimal("40.00")}
+            for i in range(1, ROWS + 1)])
+        db.session.execute(insert(Order), [
+            {"id": i, "user_id": auth_user, "ticker_id": i, "side": "BUY", "order_type": "MKT",
+             "qty": 5, "status": "FILLED"} for i in range(1, ROWS + 1)])
+        db.session.execute(insert(Order), [
+            {"user_id": auth_user, "ticker_id": i, "side": "BUY", "order_type": "LMT", "qty": 1,
+             "limit_price": Decimal("1.00"), "status": "PENDING"} for i in range(1, ROWS + 1)])
+        db.session.execute(insert(Trade), [
+            {"order_id": i, "price": Decimal("40.00"), "qty": 5} for i in range(1, ROWS + 1)])
+        db.session.execute(insert(WatchlistItem), [
+            {"user_id": auth_user, "symbol": f"T{i:03d}", "ticker_id": i} for i in range(1, ROWS + 1)])
+        db.session.execute(insert(PriceAlert), [
+            {"user_id": auth_user, "ticker_id": i, "direction": "ABOVE", "threshold": Decimal("99.00")}
+            for i in range(1, ROWS + 1)])
+        db.session.execute(insert(ScheduledTransaction), [
+            {"user_id": auth_user, "tx_type": "DEPOSIT", "amount": Decimal("10.00"),
+             "scheduled_date": date.today() + timedelta(days=i), "status": "PENDING"}
+            for i in range(1, ROWS + 1)])
+        db.session.commit()
+    market_clock.refresh()
+    return auth_user
+
+
+@pytest.mark.parametrize("path,budget", BUDGETS)
+def test_list_views_stay_within_query_budget(busy_account, query_budget, path, budget):
+    resp = query_budget(path, budget)
+    assert resp.status_code == 200
+    if path in ("/positions", "/portfolio", "/transactions", "/open_orders", "/watchlist"):
+        assert b"T030" in resp.data  # the rows (and their tickers) really were rendered
@@ -0,0 +1,55 @@
+# tests/test_scheduled.py
+from datetime import date, timedelta
+from decimal import Decimal
+
+from app import app, db, process_due_scheduled_transactions
+from models import User, Account, ScheduledTransaction
+from scheduler import DailyJob
+
+
+def _schedule(user_id, tx_type, amount, when):
+    db.session.add(ScheduledTransaction(user_id=user_id, tx_type=tx_type, amount=Decimal(amount),
+                                        scheduled_date=when, status="PENDING"))
+
+
+def test_due_transactions_are_applied_for_all_users_in_bulk(client, auth_user):
+    today = date.today()
+    with app.app_context():
+        other = User(username="ann")
+        other.set_password("pw")
+        db.session.add(other)
+        db.session.commit()
+        db.session.add(Account(user_id=other.id))
+        _schedule(auth_user, "DEPOSIT", "500.00", today)
+        _schedule(auth_user, "WITHDRAW", "100.00", today - timedelta(days=3))
+        _schedule(other.id, "DEPOSIT", "1.00", today)
+        _schedule(other.id, "DEPOSIT", "9.00", today + timedelta(days=1))
+        db.session.commit()
+
+        assert process_due_scheduled_transactions(today=today) == 3
+
+        assert float(Account.query.filter_by(user_id=auth_user).one().cash) == 100400.00
+        assert float(Account.query.filter_by(user_id=other.id).one().cash) == 100001.00
+        assert ScheduledTransaction.query.filter_by(status="PENDING").count() == 1
+
+
+def test_requests_no_longer_process_scheduled_transactions(client, auth_user):
+    with app.app_context():
+        _schedule(auth_user, "DEPOSIT", "500.00", date.today())
+        db.session.commit()
+
+    client.get("/positions")
+
+    with app.app_context():
+        assert ScheduledTransaction.query.filter_by(status="PENDING").count() == 1
+
+
+def test_daily_job_runs_once_per_day():
+    runs = []
+    job = DailyJob(runs.append)
+    today = date.today()
+
+    assert job.run_if_due(today)
+    assert not job.run_if_due(today)
+    assert job.run_if_due(today + timedelta(days=1))
+    assert runs == [today, today + timedelta(days=1)]
@@ -0,0 +1,87 @@
+# tests/test_schema.py
+from datetime import date
+
+import pytest
+from sqlalchemy import create_engine, inspect, text, select
+
+from app import app, db
+import migrations
+from models import Order, Trade, Position, WatchlistItem, ScheduledTransaction
+
+
+def _plan(stmt) -> str:
+    compiled = stmt.compile(db.engine)
+    params = tuple(compiled.params[name] for name in compiled.positiontup)
+    rows = db.session.connection().exec_driver_sql("EXPLAIN QUERY PLAN " + str(compiled), params)
+    return " | ".join(row[-1] for row in rows)
+
+
+HOT_QUERIES = [
+    (select(Order).where(Order.user_id == 1, Order.status == "PENDING"), "ix_order_user_status"),
+    (select(Order.id).where(Order.status == "PENDING", Order.order_type == "LMT", Order.ticker_id == 3),
+     "ix_order_status_type_ticker"),
+    (select(Trade).where(Trade.order_id == 1), "ix_trade_order_id"),
+    (select(Position).where(Position.user_id == 1), "sqlite_autoindex_position_1"),  # uix_user_ticker
+    (select(WatchlistItem).where(WatchlistItem.user_id == 1, WatchlistItem.symbol == "AAPL"),
+     "ix_watch_user_symbol"),
+    (select(ScheduledTransaction).where(ScheduledTransaction.user_id == 1,
+                                        ScheduledTransaction.status == "PENDING",
+                                        ScheduledTransaction.scheduled_date <= date.today()),
+     "ix_sched_user_status_date"),
+]
+
+
+@pytest.mark.parametrize("stmt, index", HOT_QUERIES)
+def test_hot_queries_use_an_index(client, stmt, index):
+    with app.app_context():
+        plan = _plan(stmt)
+    assert index in plan, plan
+
+
+def test_upgrade_migrates_an_old_database(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE ticker (id INTEGER PRIMARY KEY, symbol VARCHAR(12) UNIQUE NOT NULL, "
+                          "name VARCHAR(64), price NUMERIC(12, 2) NOT NULL)"))
+        conn.execute(text("CREATE TABLE watchlist_item (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, "
+                          "symbol VARCHAR(64) NOT NULL, last_notified_price FLOAT)"))
+        conn.execute(text("INSERT INTO ticker (id, symbol, price) VALUES (1, 'AAPL', 100)"))
+        conn.execute(text("INSERT INTO watchlist_item (user_id, symbol) VALUES "
+                          "(1, 'AAPL'), (1, 'AAPL'), (1, 'ZZZZ'), (2, 'AAPL')"))
+    # the rest of the (old) schema
+    db.metadata.create_all(engine, tables=[t for t in db.metadata.sorted_tables
+                                           if t.name not in ("ticker", "watchlist_item")])
+
+    migrations.upgrade(engine)
+    migrations.upgrade(engine)  # re-running is a no-op
+
+    with engine.connect() as conn:
+        rows = conn.execute(text("SELECT user_id, symbol, ticker_id FROM watchlist_item ORDER BY id")).all()
+    assert rows == [(1, "AAPL", 1), (1, "ZZZZ", None), (2, "AAPL", 1)]
+    indexes = {ix["name"] for ix in inspect(engine).get_indexes("watchlist_item")}
+    assert {"uix_watch_user_ticker", "ix_watch_user_symbol"} <= indexes
+    engine.dispose()
+
+
+def test_upgrade_makes_order_ids_autoincrement(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with engine.begin() as conn:
+        conn.execute(text('CREATE TABLE "order" (id INTEGER NOT NULL PRIMARY KEY, user_id INTEGER NOT NULL, '
+                          "ticker_id INTEGER NOT NULL, side VARCHAR(4) NOT NULL, order_type VARCHAR(3) NOT NULL, "
+                          "qty INTEGER NOT NULL, limit_price NUMERIC(12, 2), status VARCHAR(12) NOT NULL)"))
+        conn.execute(text('INSERT INTO "order" (user_id, ticker_id, side, order_type, qty, status) VALUES '
+                          "(1, 1, 'BUY', 'MKT', 1, 'FILLED'), (1, 1, 'BUY', 'MKT', 2, 'FILLED')"))
+    db.metadata.create_all(engine, tables=[t for t in db.metadata.sorted_tables if t.name != "order"])
+
+    migrations.upgrade(engine)
+    migrations.upgrade(engine)
+
+    with engine.begin() as conn:
+        assert conn.execute(text('SELECT id, qty FROM "order" ORDER BY id')).all() == [(1, 1), (2, 2)]
+        conn.execute(text('DELETE FROM "order" WHERE id = 2'))
+        conn.execute(text('INSERT INTO "order" (user_id, ticker_id, side, order_type, qty, status) '
+                          "VALUES (1, 1, 'BUY', 'MKT', 3, 'FILLED')"))
+        assert conn.execute(text('SELECT max(id) FROM "order"')).scalar() == 3
+    indexes = {ix["name"] for ix in inspect(engine).get_indexes("order")}
+    assert {"ix_order_user_status", "ix_order_status_type_ticker"} <= indexes
+    engine.dispose()
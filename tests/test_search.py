@@ -0,0 +1,52 @@
+# tests/test_search.py
+from decimal import Decimal
+
+from app import app, db, market_clock, ticker_search
+from market import Quote
+from models import Ticker
+from search import SearchIndex
+
+QUOTES = [Quote(i, s, n, Decimal("1")) for i, (s, n) in enumerate([
+    ("AMD", "Advanced Micro Devices"),
+    ("AAPL", "Apple Inc."),
+    ("APP", "AppLovin Corp."),
+    ("MSFT", "Microsoft Corp."),
+    ("AM", "Antero Midstream"),
+    ("PAPL", "Pineapple Energy"),
+], start=1)]
+
+
+def _symbols(ids):
+    by_id = {q.id: q.symbol for q in QUOTES}
+    return [by_id[i] for i in ids]
+
+
+def test_ranked_exact_then_prefix_then_name_word():
+    index = SearchIndex(QUOTES)
+    assert _symbols(index.search("am")) == ["AM", "AMD"]
+    # APP exact, then no other symbol prefix, then names with a word starting APP
+    assert _symbols(index.search("app")) == ["APP", "AAPL"]
+    assert _symbols(index.search("micro dev")) == ["AMD"]
+    assert _symbols(index.search("corp")) == ["APP", "MSFT"]
+    assert index.search("apple inc zzz") == []
+    assert index.search("   ") == []
+
+
+def test_limit():
+    index = SearchIndex(QUOTES)
+    assert _symbols(index.search("a", limit=2)) == ["AAPL", "AM"]
+
+
+def test_search_route_follows_new_tickers(client, auth_user):
+    with app.app_context():
+        db.session.add(Ticker(symbol="AAPL", name="Apple Inc.", price=Decimal("100.00")))
+        db.session.commit()
+    market_clock.refresh()
+    r = client.get("/search", query_string={"q": "apple"})
+    assert b"AAPL" in r.data and b"100.00" in r.data
+
+    with app.app_context():
+        db.session.add(Ticker(symbol="APLE", name="Apple Hospitality", price=Decimal("15.00")))
+        db.session.commit()
+    assert [q.symbol for q in ticker_search.search("apple")] == ["AAPL", "APLE"]
+    assert b"No results" in client.get("/search", query_string={"q": "zzz"}).data
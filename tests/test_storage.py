@@ -0,0 +1,74 @@
+# tests/test_storage.py
+import os
+from decimal import Decimal
+
+import pytest
+from flask import Flask
+from sqlalchemy import text
+
+import storage
+from app import app, db
+from fills import execute_fills
+from models import User, Account, Ticker, Order, Position
+
+
+def test_database_url_from_environment():
+    assert storage.database_url({}) == "sqlite:///paper.db"
+    assert storage.database_url({"DATABASE_URL": "postgres://u:p@db/paper"}) == "postgresql://u:p@db/paper"
+
+
+def test_app_sqlite_connections_use_wal(client):
+    with app.app_context():
+        assert db.engine.url.database == os.environ["DATABASE_URL"][len("sqlite:///"):]  # conftest's, not paper.db
+        assert db.session.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        assert db.session.execute(text("PRAGMA synchronous")).scalar() == 1  # NORMAL
+        assert db.session.execute(text("PRAGMA busy_timeout")).scalar() == app.config["SQLITE_BUSY_TIMEOUT_MS"]
+        assert db.engine.pool.size() == app.config["DB_POOL_SIZE"]
+
+
+def _profile_url(profile, tmp_path):
+    if profile == "sqlite":
+        return f"sqlite:///{tmp_path / 'profile.db'}"
+    url = os.environ.get("TEST_POSTGRES_URL")
+    if not url:
+        pytest.skip("set TEST_POSTGRES_URL (e.g. a local postgres container) to run the Postgres profile")
+    pytest.importorskip("psycopg2")
+    return url
+
+
+@pytest.mark.parametrize("profile", ["sqlite", "postgresql"])
+def test_fill_round_trip_on_each_profile(profile, tmp_path):
+    profile_app = Flask("profile-test")
+    profile_app.config["SQLALCHEMY_DATABASE_URI"] = _profile_url(profile, tmp_path)
+    storage.init_app(profile_app, db)
+
+    with profile_app.app_context():
+        db.drop_all()
+        db.create_all()
+        try:
+            user = User(username="pat", password_hash="x")
+            ticker = Ticker(symbol="AAPL", price=Decimal("100.00"))
+            db.session.add_all([user, ticker])
+            db.session.commit()
+            db.session.add(Account(user_id=user.id))
+            order = Order(user_id=user.id, ticker_id=ticker.id, side="BUY", order_type="MKT", qty=3, status="PENDING")
+            db.session.add(order)
+            db.session.commit()
+
+            statements = []
+            listener = lambda *args: statements.append(args[2])
+            db.event.listen(db.engine, "before_cursor_execute", listener)
+            try:
+                report = execute_fills([(order, Decimal("100.00"))])
+            finally:
+                db.event.remove(db.engine, "before_cursor_execute", listener)
+
+            assert report.filled == 1
+            assert Position.query.one().qty == 3
+            assert db.session.get(Account, 1).cash == Decimal("99700.00")
+            locked = any("FOR UPDATE" in s for s in statements)
+            assert locked == (profile == "postgresql")  # SQLite has no row locks
+        finally:
+            db.session.remove()
+            db.drop_all()
+            db.engine.dispose()
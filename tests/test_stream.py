@@ -0,0 +1,46 @@
+# tests/test_stream.py
+from decimal import Decimal
+
+from app import app, db, market_clock, broker
+from models import Ticker
+
+
+def _next_event(chunks):
+    return next(chunks).decode()
+
+
+def test_stream_sends_fragments_then_only_what_changed(client, auth_user):
+    with app.app_context():
+        db.session.add(Ticker(symbol="AAPL", price=Decimal("100.00")))
+        db.session.commit()
+    market_clock.tick_seconds = 0.05
+
+    r = client.get("/stream?page=dashboard", buffered=False)
+    try:
+        assert r.mimetype == "text/event-stream"
+        chunks = iter(r.response)
+
+        first = _next_event(chunks)
+        assert first.startswith("data: ")
+        assert 'id="prices" hx-swap-oob="innerHTML"' in first
+        assert 'id="watchlist"' in first
+        assert 'id="positions"' in first
+        assert broker.subscriber_count() == 1
+
+        # nothing happened: keepalive only, no re-render sent
+        assert _next_event(chunks) == ": keepalive\n\n"
+
+        # buy something: positions change, prices don't
+        client.post("/order", data={"side": "BUY", "order_type": "MKT", "symbol": "AAPL", "qty": "3"})
+        update = _next_event(chunks)
+        assert 'id="positions"' in update
+        assert 'id="prices"' not in update
+    finally:
+        r.close()
+        market_clock.tick_seconds = app.config["MARKET_TICK_SECONDS"]
+
+    assert broker.subscriber_count() == 0
+
+
+def test_stream_rejects_unknown_page(client, auth_user):
+    assert client.get("/stream?page=nope").status_code == 400
@@ -34,3 +34,41 @@ def test_remove_watchlist_item(client, auth_user):
 
     with app.app_context():
         assert WatchlistItem.query.count() == 0
+
+
+def test_watchlist_prices_come_from_the_symbol_index(client, auth_user):
+    with app.app_context():
+        for i, symbol in enumerate(["AAPL", "MSFT", "GOOG"]):
+            db.session.add(Ticker(symbol=symbol, price=Decimal(100 + i)))
+            db.session.add(WatchlistItem(user_id=auth_user, symbol=symbol))
+        db.session.add(WatchlistItem(user_id=auth_user, symbol="ZZZZ"))  # no such ticker
+        db.session.commit()
+
+    def ticker_queries():
+        statements = []
+        listener = lambda *args: statements.append(args[2])
+        db.event.listen(db.engine, "before_cursor_execute", listener)
+        try:
+            r = client.get("/watchlist_partial")
+        finally:
+            db.event.remove(db.engine, "before_cursor_execute", listener)
+        assert b"101.00" in r.data and b"N/A" in r.data
+        return [s for s in statements if "FROM ticker" in s]
+
+    # first render loads the snapshot and looks up ZZZZ once (one IN query)
+    assert len(ticker_queries()) == 2
+    # after that it's dict lookups only
+    assert ticker_queries() == []
+
+
+def test_watching_twice_keeps_one_row(client, auth_user):
+    with app.app_context():
+        db.session.add(Ticker(symbol="AAPL", price=Decimal("100.00")))
+        db.session.commit()
+
+    client.post("/add_watchlist_item", data={"symbol": "aapl"})
+    client.post("/add_watchlist_item", data={"symbol": "AAPL"})
+
+    with app.app_context():
+        items = WatchlistItem.query.all()
+        assert [(i.symbol, i.ticker.symbol) for i in items] == [("AAPL", "AAPL")]